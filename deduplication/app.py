@@ -1,8 +1,15 @@
 import streamlit as st
+import os
+from datetime import datetime
 from logs import login
-from files import get_files, get_data, remove_duplicates
-from clustering import cluster
-from search import exact_search
+from files import get_files, get_data, get_changes, remove_duplicates
+from extraction import TEXT_EXTENSIONS
+from cache import clear_cache
+from hashing import HASH_ALGORITHMS
+from features import FEATURE_BACKENDS, corpus_digest
+from simhash import MAX_DISTANCE as SIMHASH_MAX_DISTANCE
+from clustering import cluster, similar_document_search, overlap_report
+from search import exact_search, batch_search, folder_comparison, fuzzy_search, get_search_index, get_trigram_index
 
 
 st.set_page_config(
@@ -41,18 +48,70 @@ the most similar documents at a glance.
 with app:
     st.markdown('---')
     directory = st.text_input('Folder path', help="Root folder where all subfolders and documents to be analyzed are.")
-    tab1, tab2, tab3, tab4 = st.tabs(['Duplicates', 'Similar documents', 'Visualizer', 'Search'])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(['Duplicates', 'Similar documents', 'Visualizer', 'Search', 'Find similar', 'Compare folders', 'Partial overlaps'])
     visualizer = tab2.container()
 
     if 'log_data' not in st.session_state:
         st.session_state['log_data'] = {}
         st.session_state['log_data']['timer'] = [0,0,0]
 
-    files = get_files(directory)
+    text_extensions = TEXT_EXTENSIONS
+    with st.sidebar.expander('Extraction settings'):
+        st.caption('Number of processes used to extract each file format. 0 extracts the files in the app process, unless there is a time limit: a stuck file can only be stopped in a worker process, so each format then gets at least one.')
+        workers = {
+            ext: st.number_input(f'{ext.upper()} files', min_value=0, max_value=os.cpu_count(), value=0, step=1)
+            for ext in text_extensions
+        }
+        incremental = st.checkbox('Incremental rescan', True, help="Compare the folder with the previous scan and only process what was added, modified or deleted since then.")
+        algorithm = st.selectbox('Hash algorithm', HASH_ALGORITHMS, help="Algorithm used to find identical files. BLAKE2 is faster than MD5 on most machines.")
+        timeout = st.number_input('Time limit per file (s)', min_value=0, value=300, step=10, help="Documents that take longer to extract are skipped: their text is not compared, only their contents byte for byte. 0 means no limit and lets formats with 0 processes be extracted in the app process.")
+        col1, col2 = st.columns(2)
+        max_pages = col1.number_input('Max PDF pages', min_value=0, value=0, step=10, help="Only the first pages of longer PDFs are extracted. 0 means no limit.")
+        max_mb = col2.number_input('Max text file size (MB)', min_value=0.0, value=0.0, step=1.0, help="The text of larger documents is not extracted. 0 means no limit.")
+        if st.button('Clear extraction cache', use_container_width=True, help="Extracted text and hashes are cached in a '.ddc' folder inside the scanned folder so unchanged files are not read again. Clearing it forces every file to be extracted again."):
+            clear_cache(directory)
+            get_data.clear()
+
+    with st.sidebar.expander('Scan filters'):
+        include = st.text_input('Include patterns', help="Comma separated glob patterns, e.g. `*.pdf, reports/*`. If given, only matching files are analyzed.")
+        exclude = st.text_input('Exclude patterns', help="Comma separated glob patterns. Matching files and folders are skipped.")
+        col1, col2 = st.columns(2)
+        min_size = col1.number_input('Min size (MB)', min_value=0.0, value=0.0, step=1.0)
+        max_size = col2.number_input('Max size (MB)', min_value=0.0, value=0.0, step=1.0, help="0 means no limit.")
+        skip_hidden = st.checkbox('Skip hidden files', True)
+        skip_temp = st.checkbox('Skip temporary files', True, help="Office lock and temporary files such as `~$report.docx`.")
+        walker_threads = st.number_input('Folder walking threads', min_value=1, max_value=64, value=1, step=1, help="Folders are listed in parallel, which helps on network shares.")
+
+    with st.sidebar.expander('Similarity features'):
+        backend = st.selectbox('Feature space', FEATURE_BACKENDS, format_func=lambda backend: {'vocabulary': 'Exact n-grams', 'hashed': 'Hashed n-grams'}[backend], help="Exact n-grams keep a vocabulary of every n-gram of the folder, which takes a lot of memory on large folders. Hashed n-grams count them in a fixed number of columns instead, with nearly the same results.")
+        hash_bits = st.slider('Hashed columns (power of 2)', min_value=16, max_value=24, value=20, disabled=backend != 'hashed', help="More columns mean fewer n-grams counted together, at the cost of memory.")
+        sublinear_tf = st.checkbox('Dampen repeated n-grams', False, help="Count n-grams as 1 + log(count), so a few repeated passages weigh less in the similarity.")
+    features = {'backend': backend, 'n_features': 2 ** hash_bits, 'sublinear_tf': sublinear_tf}
+    limits = {
+        'timeout': timeout or None,
+        'max_pages': max_pages or None,
+        'max_bytes': int(max_mb * 1024**2) if max_mb > 0 else None
+    }
+    filters = {
+        'include': [pattern.strip() for pattern in include.split(',') if pattern.strip()],
+        'exclude': [pattern.strip() for pattern in exclude.split(',') if pattern.strip()],
+        'min_size': int(min_size * 1024**2) if min_size > 0 else None,
+        'max_size': int(max_size * 1024**2) if max_size > 0 else None,
+        'skip_hidden': skip_hidden,
+        'skip_temp': skip_temp
+    }
+
+    files = get_files(directory, filters, walker_threads)
 
-    text_extensions = ["pdf", "docx", "msg", "txt", "pptx"]
     with tab1:
-        text_data, image_data, generic_data, files_analyzed, time = get_data(files, directory, text_extensions)
+        if incremental:
+            changes = get_changes(files, directory)
+            if changes is not None and changes['scanned_at'] is not None:
+                scanned_at = datetime.fromtimestamp(changes['scanned_at']).strftime("%Y-%m-%d %H:%M")
+                st.info(f"Since the last scan ({scanned_at}): {len(changes['added'])} added, "
+                        f"{len(changes['modified'])} modified and {len(changes['deleted'])} deleted files.")
+
+        text_data, texts, image_data, generic_data, files_analyzed, time = get_data(files, directory, text_extensions, workers, algorithm, limits)
         
         duplicate_filenames = []
         text_data, duplicate_filenames = remove_duplicates(text_data, directory)
@@ -67,12 +126,12 @@ with app:
     st.session_state['log_data']['timer'][1] = time
     st.session_state['log_data']['root_directory'] = directory[-255:]
 
-    form_args = {}
+    form_args = {'incremental': incremental, 'features': features}
 
 with st.sidebar:
     st.subheader('Settings')
     algo_option = st.selectbox('Which task do you want to perform?',
-                                ('Select a task', 'Similarity clustering', 'Topic clustering'))
+                                ('Select a task', 'Similarity clustering', 'MinHash clustering', 'SimHash clustering', 'Topic clustering'))
     
     if algo_option == 'Select a task':
         st.warning('Please select a task')
@@ -87,6 +146,18 @@ with st.sidebar:
             form_args["n_gram_length"] = n_gram_length
             submit_button = st.form_submit_button('Submit', use_container_width=True)
     
+    elif algo_option == 'MinHash clustering':
+        with st.form('Form'):
+            sensitivity = st.slider('Sensitivity', min_value=0, max_value=100, value=50, step=5, help="Documents are grouped when they share at least (100 - sensitivity)% of their 5-word passages. Faster than 'Similarity clustering' on large folders, but only finds near-duplicates.")
+            form_args["sensitivity"] = sensitivity/100
+            submit_button = st.form_submit_button('Submit', use_container_width=True)
+
+    elif algo_option == 'SimHash clustering':
+        with st.form('Form'):
+            max_distance = st.slider('Max differing bits', min_value=0, max_value=SIMHASH_MAX_DISTANCE, value=6, step=1, help="Documents are grouped when their 64-bit SimHash fingerprints differ in at most this many bits. The fastest task on large folders, but it only finds near-duplicates.")
+            form_args["max_distance"] = max_distance
+            submit_button = st.form_submit_button('Submit', use_container_width=True)
+
     elif algo_option == 'Topic clustering':
         with st.form('Form'):
             n_features = st.slider('No. of Features', min_value=1000, max_value=15000, value=10000, step=500, help="This controls the number of features")
@@ -99,14 +170,51 @@ with st.sidebar:
             
 
 with app:
-    if algo_option == 'Topic clustering' or algo_option == 'Similarity clustering':
-        cluster(directory, tab2, tab3, visualizer, form_args, algo_option, submit_button, text_extensions, text_data, generic_data)
+    with tab5:
+        similar_document_search(text_data, texts, directory, text_extensions, features)
+
+    with tab6:
+        comparison_settings = {
+            'filters': filters,
+            'walker_threads': walker_threads,
+            'text_extensions': text_extensions,
+            'workers': workers,
+            'algorithm': algorithm,
+            'limits': limits,
+            'features': features
+        }
+        folder_comparison(text_data, texts, [image_data, generic_data], directory, comparison_settings)
+
+    with tab7:
+        overlap_report(text_data, texts, directory)
+
+    if algo_option in ['Similarity clustering', 'MinHash clustering', 'SimHash clustering', 'Topic clustering']:
+        cluster(directory, tab2, tab3, visualizer, form_args, algo_option, submit_button, text_extensions, text_data, texts, generic_data)
 
     with tab4:
-        query = st.text_area('Query')
-            
-        t1, t2 = st.columns((1,3))
-        exact_word = t1.checkbox('Word matching', True)
-        case_sensitive = t2.checkbox('Case sensitive', True)
-        if query == "": st.stop()
-        exact_search(text_data, query, directory, case_sensitive, exact_word)
\ No newline at end of file
+        search_mode = st.radio('Search for', ['A query', 'An approximate query', 'A list of terms'], horizontal=True)
+        if search_mode != 'A list of terms':
+            query = st.text_area('Query')
+        else:
+            terms = st.text_area('Terms', help="One term per line, e.g. project codes or names. All the terms are searched in a single pass over each document.")
+            terms_file = st.file_uploader('Or a text file with one term per line', type=['txt', 'csv'])
+            if terms_file is not None:
+                terms += '\n' + terms_file.getvalue().decode('utf-8', errors='replace')
+            terms = [term.strip() for term in terms.splitlines() if term.strip()]
+
+        if search_mode == 'An approximate query':
+            max_distance = st.slider('Max edits per word', min_value=1, max_value=3, value=1, help="Number of characters that can be inserted, deleted or replaced in each word of the query, to find misspelled words and OCR errors. Case and punctuation are ignored.")
+        else:
+            t1, t2 = st.columns((1,3))
+            exact_word = t1.checkbox('Word matching', True)
+            case_sensitive = t2.checkbox('Case sensitive', True)
+        if (query == "" if search_mode != 'A list of terms' else not terms): st.stop()
+        search_index = get_search_index(corpus_digest(text_data), directory, text_data, texts) if not text_data.empty else None
+        if search_mode == 'A query':
+            exact_search(text_data, texts, query, directory, case_sensitive, exact_word, search_index)
+        elif search_mode == 'An approximate query':
+            if search_index is None: st.stop()
+            trigram_index = get_trigram_index(corpus_digest(text_data), search_index)
+            fuzzy_search(text_data, texts, query, directory, max_distance, search_index, trigram_index)
+        else:
+            batch_search(text_data, texts, terms, directory, case_sensitive, exact_word, search_index)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import os
+import json
+import zlib
+import shutil
+import sqlite3
+from time import time
+
+CACHE_DIR = '.ddc'
+CACHE_FILE = 'cache.sqlite'
+CACHE_MAX_BYTES = 1024 ** 3
+SCHEMA_VERSION = 5
+
+
+def open_cache(directory: str):
+    """
+    This function opens (and creates if needed) the extraction cache of a \
+    scanned root folder. The cache is an SQLite database stored in a '.ddc' \
+    folder inside the root folder and survives app restarts.
+
+    Parameters:
+    -----------
+    - directory: str
+        The root folder being scanned.
+
+    Returns:
+    --------
+    - connection: sqlite3.Connection or None
+        A connection to the cache database, or None if the cache cannot be \
+        created (e.g. the folder is read-only), in which case files are \
+        simply extracted every time.
+    """
+    try:
+        cache_dir = os.path.join(directory, CACHE_DIR)
+        os.makedirs(cache_dir, exist_ok=True)
+        connection = sqlite3.connect(os.path.join(cache_dir, CACHE_FILE), timeout=30)
+        if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            # Records written by another version of the app cannot be trusted
+            connection.execute('DROP TABLE IF EXISTS files')
+            connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                algorithm TEXT,
+                kind TEXT,
+                record BLOB,
+                nbytes INTEGER,
+                accessed REAL
+            )""")
+        connection.commit()
+    except (OSError, sqlite3.Error):
+        return None
+    return connection
+
+
+def get_cached(connection: sqlite3.Connection, entry, algorithm: str):
+    """
+    This function looks up the extracted data of a file in the cache. A \
+    cached entry is only used if the size, modification time and inode of \
+    the file are the same as when it was extracted, and its hashes were \
+    calculated with the same algorithm.
+
+    Parameters:
+    -----------
+    - connection: sqlite3.Connection
+        A connection returned by 'open_cache'.
+    - entry: walker.FileEntry
+        The file, with its current stat information.
+    - algorithm: str
+        The name of the hash algorithm used for the scan.
+
+    Returns:
+    --------
+    - cached: tuple or None
+        A (kind, record) tuple, where kind is 'text', 'image' or 'generic', \
+        or None if the file is not cached or changed since it was cached.
+    """
+    if connection is None:
+        return None
+    row = connection.execute(
+        'SELECT kind, record FROM files WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ? AND algorithm = ?',
+        (entry.path, entry.size, entry.mtime_ns, entry.inode, algorithm)).fetchone()
+    if row is None:
+        return None
+    connection.execute('UPDATE files SET accessed = ? WHERE path = ?', (time(), entry.path))
+    kind, record = row
+    return kind, json.loads(zlib.decompress(record))
+
+
+def put_cached(connection: sqlite3.Connection, entry, algorithm: str, kind: str, record: dict):
+    """
+    This function stores the extracted data of a file in the cache, replacing \
+    any previous entry for the same path.
+    """
+    if connection is None:
+        return
+    blob = zlib.compress(json.dumps(record).encode('utf-8'))
+    connection.execute(
+        'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (entry.path, entry.size, entry.mtime_ns, entry.inode, algorithm, kind, blob, len(blob), time()))
+
+
+def evict(connection: sqlite3.Connection, max_bytes: int=CACHE_MAX_BYTES):
+    """
+    This function removes the least recently used entries from the cache \
+    until the stored records take at most 'max_bytes' bytes, and commits \
+    pending changes.
+    """
+    if connection is None:
+        return
+    total = connection.execute('SELECT COALESCE(SUM(nbytes), 0) FROM files').fetchone()[0]
+    if total > max_bytes:
+        evicted = []
+        for path, nbytes in connection.execute('SELECT path, nbytes FROM files ORDER BY accessed'):
+            if total <= max_bytes:
+                break
+            evicted.append((path,))
+            total -= nbytes
+        connection.executemany('DELETE FROM files WHERE path = ?', evicted)
+    connection.commit()
+
+
+def clear_cache(directory: str):
+    """
+    This function deletes the extraction cache of a scanned root folder.
+    """
+    cache_dir = os.path.join(directory, CACHE_DIR)
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
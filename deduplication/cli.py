@@ -0,0 +1,304 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from cache import open_cache
+from compare import compare_folders
+from extraction import TEXT_EXTENSIONS, drop_duplicates, drop_skipped, extract_data, extract_text, find_duplicates, get_extension, update_manifest
+from features import FEATURE_BACKENDS, corpus_digest, describe_features, load_document_vectors
+from graph import cluster_similar_documents, similarity_threshold
+from hashing import HASH_ALGORITHMS
+from minhash import cluster_near_duplicates
+from neighbors import NeighborIndex
+from simhash import MAX_DISTANCE as SIMHASH_MAX_DISTANCE, cluster_by_simhash
+from walker import walk_files
+
+
+def parse_args(argv: list[str]=None):
+    parser = argparse.ArgumentParser(
+        description='Find duplicate and similar documents in a folder without the web interface.')
+    parser.add_argument('directory', help='Root folder where all subfolders and documents to be analyzed are.')
+    parser.add_argument('-o', '--output', default='-', help="File the results are written to. Default is '-', the standard output.")
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], help="Format of the results. Default is guessed from the output file extension, or 'json'.")
+
+    scan = parser.add_argument_group('scan filters')
+    scan.add_argument('--include', action='append', default=[], help="Glob pattern of the files to analyze, e.g. '*.pdf'. Can be repeated.")
+    scan.add_argument('--exclude', action='append', default=[], help='Glob pattern of the files and folders to skip. Can be repeated.')
+    scan.add_argument('--min-size', type=float, help='Files smaller than this number of MB are skipped.')
+    scan.add_argument('--max-size', type=float, help='Files larger than this number of MB are skipped.')
+    scan.add_argument('--include-hidden', action='store_true', help='Analyze hidden files and folders.')
+    scan.add_argument('--include-temp', action='store_true', help='Analyze Office lock and temporary files.')
+    scan.add_argument('--walker-threads', type=int, default=1, help='Number of threads listing folders in parallel. Default is 1.')
+
+    extraction = parser.add_argument_group('extraction')
+    extraction.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes extracting text. 0 extracts in this process, but only with --timeout 0: a time limit needs at least one process. Default is the number of CPUs.')
+    extraction.add_argument('--algorithm', choices=HASH_ALGORITHMS, default='md5', help="Hash algorithm used to find identical files. Default is 'md5'.")
+    extraction.add_argument('--timeout', type=float, default=300, help='Seconds allowed to extract a single document. 0 means no limit. Default is 300.')
+    extraction.add_argument('--max-pages', type=int, default=0, help='Only the first pages of longer PDFs are extracted. 0 means no limit.')
+    extraction.add_argument('--max-text-size', type=float, default=0, help='The text of documents larger than this number of MB is not extracted. 0 means no limit.')
+    extraction.add_argument('--no-incremental', dest='incremental', action='store_false', help='Do not compare with the previous scan or reuse its similarity graph.')
+
+    similarity = parser.add_argument_group('similarity')
+    similarity.add_argument('--sensitivity', type=float, default=50, help='Similarity sensitivity from 0 to 100, like the slider of the app. Default is 50.')
+    similarity.add_argument('--method', choices=['ngram', 'minhash', 'simhash'], default='ngram', help="'ngram' compares the n-gram counts of every document like 'Similarity clustering', 'minhash' and 'simhash' find near-duplicates from the signatures computed at extraction like 'MinHash clustering' and 'SimHash clustering'. Default is 'ngram'.")
+    similarity.add_argument('--max-bits', type=int, default=6, choices=range(SIMHASH_MAX_DISTANCE + 1), metavar=f'0-{SIMHASH_MAX_DISTANCE}', help="Largest number of differing SimHash bits with '--method simhash'. Default is 6.")
+    similarity.add_argument('--features', choices=FEATURE_BACKENDS, default='vocabulary', help="'vocabulary' counts every n-gram of the folder, 'hashed' counts them in a fixed number of columns with bounded memory. Default is 'vocabulary'.")
+    similarity.add_argument('--hash-bits', type=int, default=20, help='The hashed feature space has 2 to the power of this number of columns. Default is 20.')
+    similarity.add_argument('--sublinear-tf', action='store_true', help='Count n-grams as 1 + log(count).')
+    similarity.add_argument('--no-similarity', dest='similarity', action='store_false', help='Only look for identical files.')
+    similarity.add_argument('--similar-to', metavar='PATH', help='Also list the documents of the folder most similar to this document, which can be outside of the folder.')
+    similarity.add_argument('--compare-to', metavar='REFERENCE', help='Only compare the files of the folder with the files of this reference folder, e.g. an incoming folder with the archive. Identical and similar files are reported per pair.')
+    similarity.add_argument('--top-k', type=int, default=10, help="Number of documents listed with '--similar-to'. Default is 10.")
+    return parser.parse_args(argv)
+
+
+def run_scan(args: argparse.Namespace, progress=None):
+    """
+    This function runs a whole scan of a folder: it lists the files, \
+    extracts their text, finds identical files and clusters similar \
+    documents, timing each step.
+
+    Parameters:
+    -----------
+    - args: argparse.Namespace
+        The options returned by 'parse_args'.
+    - progress: callable, optional
+        A function called as 'progress(fraction, text)' while files are extracted.
+
+    Returns:
+    --------
+    - results: dict
+        A dictionary with the 'duplicates' and 'similar' groups of file names, \
+        the 'nearest' documents to '--similar-to' if given, the 'failed' and \
+        'incomplete' documents, the 'changes' since the previous scan and \
+        the 'timings' of each step in seconds.
+    """
+    directory = args.directory
+    timings = {}
+    results = {'directory': directory}
+
+    start_time = perf_counter()
+    files = list_files(args, directory)
+    results['files_found'] = len(files)
+    timings['walk'] = perf_counter() - start_time
+
+    if args.incremental:
+        results['changes'] = update_manifest(files, directory)
+
+    start_time = perf_counter()
+    text_data, texts, image_data, generic_data, failed = extract(args, files, directory, progress)
+    results['failed'] = [{'filename': file, 'error': repr(error)} for file, error in failed]
+    timings['extraction'] = perf_counter() - start_time
+
+    start_time = perf_counter()
+    results['duplicates'] = []
+    for data in [text_data, image_data, generic_data]:
+        results['duplicates'] += find_duplicates(data)
+    timings['duplicates'] = perf_counter() - start_time
+
+    results['incomplete'] = []
+    if not text_data.empty and 'status' in text_data:
+        status = text_data['status'].fillna('ok')
+        results['incomplete'] = [
+            {'filename': filename, 'status': state}
+            for filename, state in zip(text_data['filename'], status) if state != 'ok']
+    # In the same order as the app, so both leave out the same files
+    text_data = drop_skipped(drop_duplicates(text_data))
+
+    features = get_features(args)
+    digest = corpus_digest(text_data, features) if not text_data.empty else None
+    vector = None
+    results['similar'] = []
+    if args.similarity and args.method in ['minhash', 'simhash'] and len(text_data.index) > 1:
+        start_time = perf_counter()
+        if args.method == 'minhash':
+            nodes = cluster_near_duplicates(text_data['minhash'], args.sensitivity / 100)
+        else:
+            nodes = cluster_by_simhash(text_data['simhash'], args.max_bits)
+        results['similar'] = group_files(nodes, text_data['filename'].tolist())
+        timings['clustering'] = perf_counter() - start_time
+    elif args.similarity and len(text_data.index) > 1:
+        start_time = perf_counter()
+        vector, vocabulary = load_document_vectors(directory, text_data, texts, features, digest)
+        timings['vectorizing'] = perf_counter() - start_time
+
+        start_time = perf_counter()
+        sensitivity = max(args.sensitivity / 100, 0.001)
+        connection = open_cache(directory) if args.incremental else None
+        nodes = cluster_similar_documents(vector, text_data, sensitivity, connection, describe_features(features))
+        if connection is not None:
+            connection.close()
+        results['similar'] = group_files(nodes, text_data['filename'].tolist())
+        timings['clustering'] = perf_counter() - start_time
+
+    if args.similar_to and not text_data.empty:
+        start_time = perf_counter()
+        if vector is None:
+            vector, vocabulary = load_document_vectors(directory, text_data, texts, features, digest)
+        index = NeighborIndex(vector, text_data['filename'], features, vocabulary)
+        text = extract_text(args.similar_to, get_extension(args.similar_to), args.similar_to)[0]
+        query = os.path.normpath(os.path.abspath(args.similar_to))
+        exclude = next((filename for filename in text_data['filename'] if os.path.normpath(os.path.abspath(filename)) == query), None)
+        neighbors = index.query(text, args.top_k, exclude)
+        results['nearest'] = [
+            {'filename': filename, 'similarity': float(similarity)}
+            for filename, similarity in zip(neighbors['filename'], neighbors['similarity'])]
+        timings['nearest'] = perf_counter() - start_time
+
+    texts.close()
+    results['timings'] = timings
+    return results
+
+
+def run_comparison(args: argparse.Namespace, progress=None):
+    """
+    This function compares the scanned folder with the reference folder of \
+    '--compare-to'. Both folders are extracted with their own cache, and \
+    only the pairs of a scanned file and a reference file are compared.
+
+    Returns:
+    --------
+    - results: dict
+        A dictionary with the 'matches' of each scanned file in the reference \
+        folder, the 'failed' documents of both folders and the 'timings' of \
+        each step in seconds.
+    """
+    timings = {}
+    results = {'directory': args.directory, 'reference': args.compare_to, 'failed': []}
+    extracted = []
+    for prefix, directory in [('reference_', args.compare_to), ('', args.directory)]:
+        start_time = perf_counter()
+        files = list_files(args, directory)
+        results[f'{prefix}files_found'] = len(files)
+        text_data, texts, image_data, generic_data, failed = extract(args, files, directory, progress)
+        results['failed'] += [{'filename': file, 'error': repr(error)} for file, error in failed]
+        extracted.append((drop_skipped(text_data), texts, pd.concat([text_data, image_data, generic_data], ignore_index=True)))
+        timings[f'{prefix}extraction'] = perf_counter() - start_time
+
+    start_time = perf_counter()
+    (reference_data, reference_texts, reference_files), (text_data, texts, files) = extracted
+    features = get_features(args)
+    index = None
+    if args.similarity and not reference_data.empty:
+        digest = corpus_digest(reference_data, features)
+        vector, vocabulary = load_document_vectors(args.compare_to, reference_data, reference_texts, features, digest)
+        index = NeighborIndex(vector, reference_data['filename'], features, vocabulary)
+    timings['reference_index'] = perf_counter() - start_time
+
+    start_time = perf_counter()
+    sensitivity = max(args.sensitivity / 100, 0.001)
+    matches = compare_folders(files, reference_files, text_data, texts, index, similarity_threshold(sensitivity), args.algorithm)
+    results['matches'] = matches.to_dict('records')
+    timings['comparison'] = perf_counter() - start_time
+
+    texts.close()
+    reference_texts.close()
+    results['timings'] = timings
+    return results
+
+
+def list_files(args: argparse.Namespace, directory: str):
+    return sorted(walk_files(
+        directory,
+        include=args.include,
+        exclude=args.exclude,
+        min_size=int(args.min_size * 1024**2) if args.min_size else None,
+        max_size=int(args.max_size * 1024**2) if args.max_size else None,
+        skip_hidden=not args.include_hidden,
+        skip_temp=not args.include_temp,
+        workers=args.walker_threads))
+
+
+def extract(args: argparse.Namespace, files: list, directory: str, progress=None):
+    limits = {
+        'timeout': args.timeout or None,
+        'max_pages': args.max_pages or None,
+        'max_bytes': int(args.max_text_size * 1024**2) if args.max_text_size else None
+    }
+    workers = {'default': args.workers}
+    return extract_data(files, directory, TEXT_EXTENSIONS, workers, args.algorithm, limits, progress)
+
+
+def get_features(args: argparse.Namespace):
+    return {'backend': args.features, 'n_features': 2 ** args.hash_bits, 'sublinear_tf': args.sublinear_tf}
+
+
+def group_files(nodes, filenames: list[str]):
+    return [[filenames[i] for i in np.flatnonzero(nodes == label)] for label in sorted(set(nodes) - {-1})]
+
+
+def write_json(results: dict, output):
+    json.dump(results, output, indent=2)
+    output.write('\n')
+
+
+def write_csv(results: dict, output):
+    """
+    This function writes one row per file of each group of duplicates or \
+    similar documents, and per document that could not be fully extracted.
+    """
+    writer = csv.writer(output)
+    if 'matches' in results:
+        writer.writerow(['kind', 'filename', 'reference', 'similarity'])
+        for match in results['matches']:
+            writer.writerow([match['match'], match['filename'], match['reference'], f"{match['similarity']:.4f}"])
+        for document in results['failed']:
+            writer.writerow(['failed', document['filename'], '', document['error']])
+        return
+    writer.writerow(['kind', 'group', 'filename', 'detail'])
+    for kind in ['duplicates', 'similar']:
+        for group, filenames in enumerate(results[kind]):
+            for filename in filenames:
+                writer.writerow([kind, group + 1, filename, ''])
+    for document in results.get('nearest', []):
+        writer.writerow(['nearest', '', document['filename'], f"{document['similarity']:.4f}"])
+    for document in results['incomplete']:
+        writer.writerow(['incomplete', '', document['filename'], document['status']])
+    for document in results['failed']:
+        writer.writerow(['failed', '', document['filename'], document['error']])
+
+
+def main(argv: list[str]=None):
+    args = parse_args(argv)
+    if not os.path.isdir(args.directory):
+        print(f'Specified folder does not exist: {args.directory}', file=sys.stderr)
+        return 2
+
+    def progress(fraction, text):
+        if sys.stderr.isatty():
+            print(f'\r{fraction:6.1%}', end='', file=sys.stderr, flush=True)
+
+    if args.compare_to and not os.path.isdir(args.compare_to):
+        print(f'Specified folder does not exist: {args.compare_to}', file=sys.stderr)
+        return 2
+
+    results = run_comparison(args, progress) if args.compare_to else run_scan(args, progress)
+    if sys.stderr.isatty():
+        print('\r', end='', file=sys.stderr)
+
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'json')
+    write = write_csv if output_format == 'csv' else write_json
+    if args.output == '-':
+        write(results, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='', encoding='utf-8') as output:
+            write(results, output)
+
+    if args.compare_to:
+        matched = {match['filename'] for match in results['matches']}
+        print(f"{results['files_found']} files, {len(matched)} found in the "
+              f"{results['reference_files_found']} reference files", file=sys.stderr)
+    else:
+        print(f"{results['files_found']} files, {len(results['duplicates'])} groups of duplicates, "
+              f"{len(results['similar'])} groups of similar documents", file=sys.stderr)
+    for step, seconds in results['timings'].items():
+        print(f'{step}: {seconds:.2f}s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
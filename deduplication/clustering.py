@@ -1,33 +1,49 @@
 import streamlit as st
+import io
+import os
 import pandas as pd
 import ktrain
 import scipy
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.cluster import DBSCAN
 import numpy as np
 from sklearn.preprocessing import normalize
 from time import perf_counter
-from sklearn.feature_extraction.text import CountVectorizer
 from plot import get_plot
 from logs import add_log
 from files import open_file_with_default_app, open_file_with_explorer
-
-vectorizer = CountVectorizer(ngram_range=(1, 5))
-
-def cluster_documents(vector: scipy.sparse._csr.csr_matrix, args: dict, data: pd.DataFrame, directory: str, algo:str):
+from extraction import drop_skipped, extract_text, get_extension
+from cache import open_cache
+from graph import similarity_graph, label_components, similarity_threshold, cluster_similarities
+from features import vectorize_documents, describe_features, corpus_digest, load_document_vectors
+from minhash import cluster_near_duplicates
+from simhash import cluster_by_simhash
+from neighbors import NeighborIndex
+from passages import PassageIndex, shared_passages
+from strings import common_passages
+from textstore import TextStore
+
+def cluster_documents(vector: scipy.sparse._csr.csr_matrix, args: dict, data: pd.DataFrame, texts: TextStore, directory: str, algo:str):
     """
-    This function performs clustering on a given sparse matrix of document vectors using the \
-    DBSCAN algorithm. It then sorts the resulting clusters by their average similarity and \
+    This function performs clustering on a given sparse matrix of document vectors, linking \
+    documents whose similarity is above the sensitivity like DBSCAN would (see \
+    'graph.similarity_graph'). It then sorts the resulting clusters by their average similarity and \
     visualizes each cluster by calling the 'visualize_cluster' function.
 
     Parameters:
     -----------
     - vector: scipy.sparse._csr.csr_matrix
-        A sparse matrix of document vectors to be clustered.
+        A sparse matrix of document vectors to be clustered. MinHash and SimHash clustering \
+        use the signatures in the 'minhash' or 'simhash' column of 'data' instead, and only \
+        vectorize the documents they cluster, so they take None.
     - args: dict
-        A dict parameter for the clustering algorithm that controls hyperparameters based on algorithm selected.
+        A dict parameter for the clustering algorithm that controls hyperparameters based on algorithm selected. \
+        'features' holds the settings of 'features.vectorize_documents', and 'digest' \
+        the 'features.corpus_digest' of 'data' the similarity graph is cached by. \
+        With 'incremental' set, similarity clustering reuses the similarity graph persisted by the previous \
+        scan and only compares new or changed documents (see 'graph.update_similarity_graph').
     - data: pd.DataFrame
         A DataFrame containing the file names and vectors.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'data'.
     - directory: str
         The root directory path where the files are located.
     - algo: str
@@ -40,30 +56,48 @@ def cluster_documents(vector: scipy.sparse._csr.csr_matrix, args: dict, data: pd
     """
 
     if algo == 'Similarity clustering':
-        # Run DBSCAN clustering algorithm
+        # Link documents that are closer than the sensitivity, like DBSCAN's eps
         sensitivity = args["sensitivity"]
 
         if sensitivity == 0:
             sensitivity = 0.001
 
-        dbscan = DBSCAN(eps=sensitivity, min_samples=2)
-        nodes = dbscan.fit_predict(vector.toarray())
+        # The graph is only built once per corpus, moving the slider only cuts it again
+        first, second, similarities = get_similarity_graph(
+            args['digest'], directory, args.get('incremental'), vector, data, describe_features(args.get('features')))
+        nodes = label_components(len(data), first, second, similarities, similarity_threshold(sensitivity))
         cluster_labels = list(set(nodes))
     
+    if algo in ['MinHash clustering', 'SimHash clustering']:
+        with st.spinner('Finding near-duplicates...'):
+            if algo == 'MinHash clustering':
+                nodes = cluster_near_duplicates(data['minhash'], args['sensitivity'])
+            else:
+                nodes = cluster_by_simhash(data['simhash'], args['max_distance'])
+        # Only the clustered documents are vectorized, to show how similar they are
+        clustered = np.flatnonzero(nodes != -1)
+        if len(clustered) == 0:
+            return pd.DataFrame()
+        data = data.iloc[clustered].reset_index(drop=True)
+        nodes = nodes[clustered]
+        vector = normalize(vectorize_documents(data, texts, args.get('features'))[0])
+        cluster_labels = list(set(nodes))
+
     if algo == 'Topic clustering':
         # Run Topic Modeling using LDA algorithm
-        data, nodes, cluster_labels = topic_modeling(data, args)
+        data, nodes, cluster_labels = topic_modeling(data, texts, args)
         return data
 
     # Calculate info for each path and cluster
-    cluster_info = get_cluster_info(nodes, cluster_labels, vector, data)
+    memo = get_cluster_memo(args['digest']) if algo == 'Similarity clustering' else None
+    cluster_info = get_cluster_info(nodes, cluster_labels, vector, data, memo)
 
     # Get information for each document
     document_info = create_document_dataframe(cluster_info, data, directory)
 
     return document_info
 
-def topic_modeling(data, args):
+def topic_modeling(data, texts, args):
     """
     This function takes in a data and hyper-parameters to perform topic modeling using LDA, 
     short for Latent Dirichlet Allocation.
@@ -72,6 +106,8 @@ def topic_modeling(data, args):
     -----------
     - data: DataFrame
         A DataFrame containing the file names and vectors.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'data'.
     - args: dict 
         A dictionary containing hyperparameters - n_features, alpha and cut_off.
 
@@ -86,7 +122,7 @@ def topic_modeling(data, args):
     """
     with st.spinner('Modeling Topics...'):
         # Get text data corresponding to each document from the dataframe
-        doc_list = data.text.values.tolist()
+        doc_list = list(texts.texts(data['doc_id']))
 
         # Initialize topic modeling by specifying different hyperparameters
         tm = ktrain.text.get_topic_model(texts=doc_list, n_features=args['n_features'], hyperparam_kwargs={'alpha':args['alpha']})
@@ -112,14 +148,16 @@ def topic_modeling(data, args):
         # Map topic IDs to topic labels in the document dataframe
         document_df['topic_label'] = document_df['topic_id'].map(topic_label_dict)
 
-        # Join the two dataframes to get topic labels in the original dataframe
-        data = pd.merge(data, document_df[['text', 'topic_label']], on="text")
+        # Join the two dataframes to get topic labels in the original dataframe.
+        # The topic model's doc_id is the position of the document in doc_list
+        data = data.iloc[document_df['doc_id']].reset_index(drop=True)
+        data['topic_label'] = document_df['topic_label'].values
         cluster = np.array(data.topic_label.tolist())
         labels = data.topic_label.unique().tolist()
 
     return data, cluster, labels
 
-def get_cluster_info(nodes: np.ndarray, cluster_labels: list[str], vector: scipy.sparse._csr.csr_matrix, data: pd.DataFrame):
+def get_cluster_info(nodes: np.ndarray, cluster_labels: list[str], vector: scipy.sparse._csr.csr_matrix, data: pd.DataFrame, memo: dict=None):
     """
     This function takes in three inputs: a numpy array of node labels, a list of \
     cluster labels, and a sparse matrix of vector representations of the nodes. It \
@@ -132,50 +170,49 @@ def get_cluster_info(nodes: np.ndarray, cluster_labels: list[str], vector: scipy
     - cluster_labels: list[str]
         A list of cluster labels.
     - vector: scipy.sparse._csr.csr_matrix
-        A sparse matrix of vector representations of the nodes.
+        A sparse matrix of normalized vector representations of the nodes.
+    - memo: dict, optional
+        A dictionary where the similarities of each cluster are kept, so a \
+        cluster found again at another sensitivity is not computed again. It \
+        must only be reused with the same 'vector'.
 
     Returns:
     --------
     - cluster_info: list[tuple]
         A list of tuples containing information about each cluster. Each tuple contains \
-        four elements: a numpy array of the indices of the nodes in the cluster, the \
-        average cosine similarity between all pairs of nodes in the cluster, a numpy array \
-        of the vector representations of the nodes in the cluster, and the cluster labels.
+        five elements: a numpy array of the indices of the nodes in the cluster, the \
+        average cosine similarity between all pairs of nodes in the cluster, a dictionary \
+        mapping each path to its average similarity with the rest of the cluster (sorted \
+        from most to least similar), a sparse matrix of the vector representations of the \
+        nodes in the cluster, and the cluster label.
+
+    Notes:
+    ------
+    - The similarities within a cluster are a single sparse product of its \
+    rows (see 'graph.cluster_similarities').
     """
     cluster_info = []
-    for i, cluster in enumerate(cluster_labels):
-        if cluster == -1:
-            continue
+    clusters = [cluster for cluster in cluster_labels if cluster != -1]
+    progress = st.empty()
+    for n, cluster in enumerate(clusters):
         indices = np.where(nodes == cluster)[0]
-        similarities = []
-        vectors = []
-        path_average_similarities = {}
-        progress1 = st.empty()
-        if len(indices) > 1:
-            for i, index1 in enumerate(indices):
-                path = data['filename'].iloc[index1]
-                progress1.progress((i + 1) / len(indices), f'Calculating similarities for {path}')
-                progress2 = st.empty()
-                path_similarities = []
-                for i, index2 in enumerate(indices):
-                    if index1 == index2:
-                        continue
-                    similarity = cosine_similarity(vector[index1], vector[index2])
-                    similarities.append(similarity)
-                    path_similarities.append(similarity)
-                    progress2.progress((i + 1)/ len(indices), f'{(i + 1)}/{len(indices)}')
-                vectors.append(vector[index1])
-                progress2.empty()
-                path_average_similarity = sum(path_similarities) / len(path_similarities)
-                path_average_similarities[path] = path_average_similarity
-            progress1.empty()
-            path_average_similarities = dict(sorted(path_average_similarities.items(), key=lambda x: x[1], reverse=True))
-        
-            if len(similarities) > 0:
-                average_similarity = sum(similarities) / len(similarities)
-            else:
-                average_similarity = 0
-            cluster_info.append((indices, average_similarity, path_average_similarities, np.array(vectors), cluster))
+        if len(indices) < 2:
+            continue
+        vectors = vector[indices]
+        key = indices.tobytes()
+        if memo is not None and key in memo:
+            path_similarities, average_similarity = memo[key]
+        else:
+            progress.progress(n / len(clusters), f'Calculating similarities for cluster {n + 1} of {len(clusters)}')
+            path_similarities, average_similarity = cluster_similarities(vectors)
+            if memo is not None:
+                memo[key] = path_similarities, average_similarity
+
+        paths = data['filename'].iloc[indices]
+        order = np.argsort(-path_similarities, kind='stable')
+        path_average_similarities = {paths.iloc[i]: float(path_similarities[i]) for i in order}
+        cluster_info.append((indices, average_similarity, path_average_similarities, vectors, cluster))
+    progress.empty()
 
     return cluster_info
 
@@ -209,8 +246,8 @@ def create_document_dataframe(cluster_info, document_data, directory):
             path = full_path.replace(directory, '')
             data.append({
                 'path': full_path,
-                'average_similarity': average_similarity[0][0],
-                'path_average_similarities': path_average_similarities[full_path][0][0],
+                'average_similarity': average_similarity,
+                'path_average_similarities': path_average_similarities[full_path],
                 'vector': vectors[i],
                 'label': cluster})
         cluster_df = pd.DataFrame().from_records(data)
@@ -227,6 +264,7 @@ def cluster(directory:str,
             submit_button: bool,
             text_extensions: list,
             text_data: pd.DataFrame,
+            texts: TextStore,
             generic_data: pd.DataFrame):
     """
     This function clusters and visualizes documents based on their similarity \
@@ -252,6 +290,8 @@ def cluster(directory:str,
         A list of supported file extensions for text extraction.
     - text_data: pd.DataFrame
         A dataframe containing the text data of the documents.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'text_data'.
     - generic_data: pd.DataFrame
         A dataframe containing the generic data of the documents.
     """
@@ -264,16 +304,31 @@ def cluster(directory:str,
                 st.write('Supported file types:')
                 st.write(f'{" - ".join(text_extensions)}')
 
+        status = text_data.get('status', pd.Series('ok', index=text_data.index)).fillna('ok')
+        if (status != 'ok').any():
+            with st.expander("Documents with incomplete text extraction"):
+                st.caption("Partial documents hit the page limit and only their first pages are compared. "
+                           "Skipped documents failed, ran out of time or hit the size limit, and are left out of the clusters.")
+                for filename, state in zip(text_data['filename'], status):
+                    if state != 'ok':
+                        st.write(f"{filename.replace(directory, '')} ({state})")
+        text_data = drop_skipped(text_data)
+
         if text_data.empty:
             st.warning("No supported text documents were found.")
             st.stop()
 
     start_time = perf_counter()        
-    vector = get_file_vectors(text_data)
-    normalized_vectors = normalize(vector)
+    if algo_option in ['MinHash clustering', 'SimHash clustering']:
+        # Near-duplicates are found from the signatures computed at extraction
+        digest = None
+        normalized_vectors = None
+    else:
+        digest = corpus_digest(text_data, form_args.get('features'))
+        normalized_vectors, _ = get_file_vectors(digest, directory, text_data, texts, form_args.get('features'))
 
     if submit_button:
-        documents = cluster_documents(normalized_vectors, form_args, text_data, directory, algo_option)
+        documents = cluster_documents(normalized_vectors, {**form_args, 'digest': digest}, text_data, texts, directory, algo_option)
         st.session_state['documents'] = documents
         #add_log(form_args, algo_option, start_time, documents)
 
@@ -284,7 +339,7 @@ def cluster(directory:str,
     documents = st.session_state['documents']
 
     with visualizer:
-        if algo_option == 'Similarity clustering':
+        if algo_option in ['Similarity clustering', 'MinHash clustering', 'SimHash clustering']:
             if documents.empty:
                 st.success("No documents were flagged as similar with the current sensitivity.")
                 st.stop()
@@ -293,13 +348,14 @@ def cluster(directory:str,
                 st.info('Press the "Submit" button to continue.')
                 st.stop()
             cluster_list = documents['label'].unique()
+            doc_ids = dict(zip(text_data['filename'], text_data['doc_id']))
 
             #delete_folder(directory, 'similar')
 
             for i, cluster in enumerate(cluster_list):
                 rows = documents.loc[documents['label'] == cluster]
                 average_similarity = rows['average_similarity'].iloc[0]
-                with st.expander(f"{average_similarity.item() * 100:.2f}%"):
+                with st.expander(f"{average_similarity * 100:.2f}%"):
                     for row in rows.to_records():
                         path_avg_sim = row['path_average_similarities']
                         path = row['path']
@@ -316,7 +372,9 @@ def cluster(directory:str,
                         st.write("")
                         st.write("")
 
-                    st.write(f'Average similarity within cluster: <span style="color:red">{average_similarity.item() * 100:.2f}%</span>', unsafe_allow_html=True)
+                    st.write(f'Average similarity within cluster: <span style="color:red">{average_similarity * 100:.2f}%</span>', unsafe_allow_html=True)
+                    if st.checkbox('Show shared passages', key=f"passages {cluster}", help="Passages of at least 8 words found in every document of the cluster."):
+                        show_common_passages(rows['path'].tolist(), doc_ids, texts, directory)
         else:
             if documents.empty:
                 st.success("No documents were assigned similar topics")
@@ -354,7 +412,7 @@ def cluster(directory:str,
                         st.write("")
 
     with tab3:
-        if algo_option != 'Similarity clustering': st.stop()
+        if algo_option not in ['Similarity clustering', 'MinHash clustering', 'SimHash clustering']: st.stop()
         if st.checkbox('Plot documents'):
             if algo_option != 'Topic-Modeling':
                 plot_info = get_plot(cluster_list, documents, directory)
@@ -385,6 +443,193 @@ def cluster(directory:str,
                 # Render the figure using Plotly
                 st.plotly_chart(fig, use_container_width=True)
 
-@st.cache_data
-def get_file_vectors(files):
-    return vectorizer.fit_transform(files['text'])
\ No newline at end of file
+
+def show_common_passages(paths: list[str], doc_ids: dict, texts: TextStore, directory: str, max_length: int=1000):
+    """
+    This function displays the passages shared by every document of a \
+    cluster (see 'strings.common_passages').
+
+    Parameters:
+    -----------
+    - paths: list[str]
+        The file names of the documents of the cluster.
+    - doc_ids: dict
+        The 'doc_id' of each file name.
+    - texts: TextStore
+        The extracted text of the documents.
+    - directory: str
+        The scanned root folder.
+    - max_length: int, optional
+        Longer passages are cut after this number of characters. Default is 1000.
+    """
+    documents = [texts[doc_ids[path]] for path in paths]
+    base, passages = common_passages(documents)
+    if not passages:
+        st.caption("The documents of this cluster share no passage of 8 words or more.")
+        return
+    st.caption(f"Located in {paths[base].replace(directory, '')}")
+    for start, end in passages:
+        passage = documents[base][start:end]
+        st.divider()
+        st.write(passage if len(passage) <= max_length else passage[:max_length] + '(...)')
+
+
+def overlap_report(text_data: pd.DataFrame, texts: TextStore, directory: str, max_results: int=50):
+    """
+    This function displays the documents that contain part of another \
+    document, e.g. a short document pasted into a long one, as \
+    "A contains N% of B", with the passages they share.
+
+    Parameters:
+    -----------
+    - text_data: pd.DataFrame
+        A pandas DataFrame containing the text data of the documents.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'text_data'.
+    - directory: str
+        The scanned root folder.
+    - max_results: int, optional
+        The largest number of pairs displayed. Default is 50.
+
+    Notes:
+    ------
+    - The offsets of the passages are character positions in the extracted \
+    text of each document, the one shown in the excerpts.
+    """
+    min_containment = st.slider('Minimum contained share', min_value=10, max_value=100, value=50, step=5, help="A pair is shown when at least this share of the passages of a document is found in another document. Passages shorter than 8 words can be missed.")
+    text_data = drop_skipped(text_data)
+    if len(text_data.index) < 2:
+        return
+
+    index = get_passage_index(corpus_digest(text_data), text_data, texts)
+    overlaps = index.overlaps(min_containment / 100)
+    if overlaps.empty:
+        st.success("No document contains a large enough part of another document.")
+        return
+    if len(overlaps.index) > max_results:
+        st.caption(f"Showing the {max_results} largest of {len(overlaps.index)} overlaps.")
+
+    filenames = text_data['filename'].tolist()
+    doc_ids = text_data['doc_id'].tolist()
+    for overlap in overlaps.head(max_results).itertuples():
+        container, contained = filenames[overlap.container], filenames[overlap.contained]
+        with st.expander(f"{container.replace(directory, '')} contains {overlap.containment:.0%} of {contained.replace(directory, '')}"):
+            for label, filename in [('Container', container), ('Contained', contained)]:
+                col1, col2, col3 = st.columns((6,1,1))
+                col1.write(f"{label}: {filename.replace(directory, '')}")
+                if col2.button('Open', key=f"{container} {contained} {label} 9", use_container_width=True):
+                    open_file_with_default_app(filename)
+                if col3.button('Folder', key=f"{container} {contained} {label} 10", use_container_width=True):
+                    open_file_with_explorer(filename)
+            if not st.checkbox('Show shared passages', key=f"{container} {contained} passages"):
+                continue
+            container_text, contained_text = texts[doc_ids[overlap.container]], texts[doc_ids[overlap.contained]]
+            container_passages, contained_passages = shared_passages(container_text, contained_text)
+            st.caption("Characters " + ", ".join(f"{start}-{end}" for start, end in container_passages) + " of the container.")
+            for start, end in contained_passages:
+                st.divider()
+                st.caption(f"Characters {start}-{end} of the contained document")
+                excerpt = contained_text[start:end]
+                st.write(excerpt if len(excerpt) <= 1000 else excerpt[:1000] + '(...)')
+
+
+def similar_document_search(text_data: pd.DataFrame, texts: TextStore, directory: str, text_extensions: list[str], features: dict=None):
+    """
+    This function lets the user pick a document, by its path or by \
+    uploading it, and displays the documents of the folder most similar to it.
+
+    Parameters:
+    -----------
+    - text_data: pd.DataFrame
+        A pandas DataFrame containing the text data of the documents.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'text_data'.
+    - directory: str
+        The scanned root folder.
+    - text_extensions: list[str]
+        The file extensions text can be extracted from.
+    - features: dict, optional
+        The feature settings chosen on the sidebar (see 'features.vectorize_documents').
+
+    Notes:
+    ------
+    - The document is compared with the same document vectors as \
+    'Similarity clustering', so its scores are the similarities that \
+    clustering would find, and the index is built once per folder and settings.
+    """
+    source = st.radio('Document', ['File path', 'Upload'], horizontal=True)
+    if source == 'File path':
+        path = st.text_input('Document path', help="Absolute path, or path relative to the analyzed folder. It can be outside of the folder.")
+        uploaded = None
+    else:
+        uploaded = st.file_uploader('Document', type=text_extensions)
+        path = ''
+    k = st.number_input('Number of results', min_value=1, max_value=100, value=10, step=1)
+
+    text_data = drop_skipped(text_data)
+    if text_data.empty or (not path and uploaded is None):
+        return
+
+    exclude = None
+    try:
+        if uploaded is not None:
+            text = extract_text(io.BytesIO(uploaded.getvalue()), get_extension(uploaded.name), uploaded.name)[0]
+        else:
+            path = os.path.join(directory, path)
+            matches = text_data.index[text_data['filename'].map(os.path.normpath) == os.path.normpath(path)]
+            if len(matches) > 0:
+                # Documents of the folder are not extracted again
+                exclude = text_data.loc[matches[0], 'filename']
+                text = texts[text_data.loc[matches[0], 'doc_id']]
+            else:
+                text = extract_text(path, get_extension(path), path)[0]
+    except Exception as e:
+        st.error(f"Could not extract the text of the document: {e}")
+        return
+
+    digest = corpus_digest(text_data, features)
+    index = get_neighbor_index(digest, directory, text_data, texts, features)
+    neighbors = index.query(text, int(k), exclude)
+    if neighbors.empty:
+        st.info("No document of the folder shares any text with this document.")
+        return
+
+    for filename, similarity in zip(neighbors['filename'], neighbors['similarity']):
+        col1, col2, col3 = st.columns((6,1,1))
+        col1.markdown(f"{filename.replace(directory, '')} - <span style='color:green'>{similarity:.0%}</span>", unsafe_allow_html=True)
+        if col2.button('Open', key=f"{filename} 5", use_container_width=True):
+            open_file_with_default_app(filename)
+        if col3.button('Folder', key=f"{filename} 6", use_container_width=True):
+            open_file_with_explorer(filename)
+
+
+@st.cache_resource(max_entries=4, show_spinner='Building similarity graph...')
+def get_similarity_graph(digest, directory, incremental, _vector, _data, _features):
+    connection = open_cache(directory) if incremental else None
+    try:
+        return similarity_graph(_vector, _data, connection, _features)
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+@st.cache_resource(max_entries=4)
+def get_cluster_memo(digest):
+    return {}
+
+
+@st.cache_resource(max_entries=4)
+def get_file_vectors(digest, directory, _files, _texts, _settings=None):
+    # Only the digest of the corpus and settings is hashed by Streamlit
+    return load_document_vectors(directory, _files, _texts, _settings, digest)
+
+
+@st.cache_resource(max_entries=4)
+def get_neighbor_index(digest, directory, _files, _texts, _settings=None):
+    vector, vocabulary = get_file_vectors(digest, directory, _files, _texts, _settings)
+    return NeighborIndex(vector, _files['filename'], _settings, vocabulary)
+
+
+@st.cache_resource(max_entries=4, show_spinner='Fingerprinting passages...')
+def get_passage_index(digest, _files, _texts):
+    return PassageIndex(_texts.texts(_files['doc_id']))
@@ -0,0 +1,129 @@
+import os
+import pandas as pd
+from hashing import DuplicateIndex
+from neighbors import NeighborIndex
+from textstore import TextStore
+
+
+def identical_files(files: pd.DataFrame, reference_files: pd.DataFrame, algorithm: str='md5'):
+    """
+    This function finds the files of a folder that have an identical copy \
+    in a reference folder. Each folder only hashed the files that share a \
+    size with another file of the same folder, so the files of both folders \
+    go through one 'hashing.DuplicateIndex': only the files that share a \
+    size, then a partial hash, across the folders are read, and files are \
+    only matched by the hash of their whole contents.
+
+    Parameters:
+    -----------
+    - files: pd.DataFrame
+        A DataFrame with the 'filename' and, when known, the 'hash' of the \
+        files to check.
+    - reference_files: pd.DataFrame
+        A DataFrame with the 'filename' and 'hash' of the reference files.
+    - algorithm: str, optional
+        The hash algorithm the known hashes were calculated with. Default is 'md5'.
+
+    Returns:
+    --------
+    - matches: pd.DataFrame
+        The 'filename' and 'reference' file name of each identical pair. \
+        Files that cannot be read any more are left out.
+    """
+    if files.empty or reference_files.empty:
+        return pd.DataFrame(columns=['filename', 'reference'])
+    index = DuplicateIndex(algorithm)
+    for side, data in [('filename', files), ('reference', reference_files)]:
+        hashes = data['hash'] if 'hash' in data else [None] * len(data.index)
+        for filename, hash in zip(data['filename'], hashes):
+            record = {'filename': filename, 'side': side}
+            if isinstance(hash, str):
+                # Read again only if a file of the other folder has its size
+                record['full_hash'] = hash
+            try:
+                size = os.path.getsize(filename)
+            except OSError:
+                continue
+            index.add(record, size)
+
+    matches = []
+    for group in index.by_hash.values():
+        sides = {'filename': [], 'reference': []}
+        for record in group:
+            sides[record['side']].append(record['filename'])
+        matches += [(filename, reference) for filename in sides['filename'] for reference in sides['reference']]
+    return pd.DataFrame(matches, columns=['filename', 'reference'])
+
+
+def similar_files(text_data: pd.DataFrame, texts: TextStore, index: NeighborIndex, min_similarity: float):
+    """
+    This function finds the documents of a folder that are similar to \
+    documents of a reference folder. Only the new x reference pairs are \
+    compared: the reference documents are only read through their index.
+
+    Parameters:
+    -----------
+    - text_data: pd.DataFrame
+        A DataFrame with the 'filename' and 'doc_id' of the documents to check.
+    - texts: TextStore
+        The extracted text of the documents to check.
+    - index: NeighborIndex or None
+        The index of the reference documents (see 'neighbors.NeighborIndex'), \
+        None if the reference folder has no text documents.
+    - min_similarity: float
+        The smallest cosine similarity reported.
+
+    Returns:
+    --------
+    - matches: pd.DataFrame
+        The 'filename', 'reference' file name and cosine 'similarity' of \
+        each similar pair.
+    """
+    if text_data.empty or index is None or len(index) == 0:
+        return pd.DataFrame(columns=['filename', 'reference', 'similarity'])
+    first, second, similarities = index.pairs(texts.texts(text_data['doc_id']), min_similarity)
+    return pd.DataFrame({
+        'filename': text_data['filename'].to_numpy()[first],
+        'reference': [index.filenames[i] for i in second],
+        'similarity': similarities
+    })
+
+
+def compare_folders(files: pd.DataFrame, reference_files: pd.DataFrame, text_data: pd.DataFrame, texts: TextStore, index: NeighborIndex, min_similarity: float, algorithm: str='md5'):
+    """
+    This function compares an incoming folder with a reference folder, \
+    e.g. a drop folder with the main archive, without comparing the files \
+    of either folder with each other.
+
+    Parameters:
+    -----------
+    - files: pd.DataFrame
+        The 'filename' and 'hash' of every file of the incoming folder.
+    - reference_files: pd.DataFrame
+        The 'filename' and 'hash' of every file of the reference folder.
+    - text_data: pd.DataFrame
+        The text documents of the incoming folder, with their 'doc_id'.
+    - texts: TextStore
+        The extracted text of the incoming documents.
+    - index: NeighborIndex or None
+        The index of the reference documents, None to only look for identical files.
+    - min_similarity: float
+        The smallest cosine similarity reported for documents that are not identical.
+    - algorithm: str, optional
+        The hash algorithm both folders were scanned with. Default is 'md5'.
+
+    Returns:
+    --------
+    - matches: pd.DataFrame
+        One row per pair with the 'filename', the 'reference' file name, \
+        the kind of 'match' ('identical' or 'similar') and the 'similarity', \
+        sorted by file name and from the most similar. Identical files are \
+        not reported again as similar.
+    """
+    identical = identical_files(files, reference_files, algorithm).assign(match='identical', similarity=1.0)
+    similar = similar_files(text_data, texts, index, min_similarity).assign(match='similar')
+    pairs = set(zip(identical['filename'], identical['reference']))
+    similar = similar[[pair not in pairs for pair in zip(similar['filename'], similar['reference'])]]
+    matches = pd.concat([identical, similar], ignore_index=True)
+    matches = matches.sort_values(['filename', 'similarity'], ascending=[True, False], kind='stable')
+    return matches[['filename', 'reference', 'match', 'similarity']].reset_index(drop=True)
@@ -0,0 +1,357 @@
+import extract_msg
+import docx2txt
+from pptxer.presentations_text_extractor import __extract_presentation_texts_from_path__ as extract_pptx_text
+from pptxer.presentations_text_extractor import __extract_presentation_text__ as extract_presentation_text
+from pptx import Presentation
+import PyPDF2
+import pandas as pd
+import os
+import io
+from workers import run_in_pools
+from cache import open_cache, get_cached, put_cached, evict
+from hashing import DuplicateIndex, read_and_hash, hash_file
+from walker import FileEntry
+from textstore import TextStore
+from minhash import get_signature
+from simhash import get_simhash
+from manifest import load_manifest, save_manifest, diff_manifest
+
+TEXT_EXTENSIONS = ['pdf', 'docx', 'msg', 'txt', 'pptx']
+
+
+def extract_data(files: list[FileEntry],
+                 directory: str,
+                 text_extensions: list[str],
+                 workers: dict=None,
+                 algorithm: str='md5',
+                 limits: dict=None,
+                 progress=None,
+                 on_duplicates=None):
+    """
+    This function does the work of 'files.get_data' without any user \
+    interface, so it can also run headless (see 'cli.py'). It takes the same parameters, \
+    plus the following ones:
+
+    Parameters:
+    -----------
+    - progress: callable, optional
+        A function called as 'progress(fraction, text)' as files are processed.
+    - on_duplicates: callable, optional
+        A function called with the records of a new group of identical files \
+        as soon as its second file is found.
+
+    Returns:
+    --------
+    - text_data: pandas DataFrame
+        A DataFrame containing the filename, hash, 'dedup_key' (see 'hashing.DuplicateIndex.finalize'), status, MinHash signature, SimHash fingerprint and 'doc_id' of each text document.
+    - texts: TextStore
+        The extracted text of each document, looked up by its 'doc_id'.
+    - image_data: pandas DataFrame
+        A DataFrame containing the filename, hash and 'dedup_key' of each \
+        image file. The hash is missing for the files that were not read in full.
+    - generic_data: pandas DataFrame
+        A DataFrame containing the filename, hash and 'dedup_key' of the remaining files.
+    - failed: list[tuple]
+        The (file name, exception) of each text document whose extraction \
+        failed, and of each file that could not be read to be compared. \
+        The latter are left out of the results.
+    """
+    records = {}
+    failed = []
+
+    limits = {key: value for key, value in (limits or {}).items() if value is not None}
+    timeout = limits.pop('timeout', None)
+    workers = dict(workers or {})
+    if timeout is not None:
+        for ext in text_extensions:
+            workers[ext] = max(workers.get(ext, workers.get('default', 0)), 1)
+
+    texts = TextStore()
+    cache = open_cache(directory)
+    entries = {entry.path: entry for entry in files}
+    files = list(entries)
+    indexes = {kind: DuplicateIndex(algorithm) for kind in ['text', 'image', 'generic']}
+    known = {}
+
+    def collect(file, kind, record):
+        if kind == 'text':
+            # Only the id of the text is kept in memory
+            record['doc_id'] = texts.add(record.pop('text'))
+        records[file] = (kind, record)
+        if kind != 'text':
+            known[file] = dict(record)
+        duplicates = indexes[kind].add(record, entries[file].size)
+        if duplicates is not None and len(duplicates) == 2 and on_duplicates is not None:
+            on_duplicates(duplicates)
+        if progress is not None:
+            progress(len(records)/len(files), f'Loading {file}')
+
+    def pending_text_files():
+        # Files that did not change since the last scan are read from the cache,
+        # only text documents that need extracting are handed to the workers
+        for file, entry in entries.items():
+            ext = get_extension(file)
+            cached = get_cached(cache, entry, algorithm)
+            if cached is not None and cached[1].pop('limits', limits) != limits:
+                # Extracted under other limits, it may have more or less text now
+                cached = None
+            if cached is not None:
+                collect(file, *cached)
+            elif is_text_document(ext, text_extensions):
+                yield file, ext, algorithm, limits.get('max_pages'), limits.get('max_bytes')
+            elif is_image_document(ext):
+                collect(file, 'image', {'filename': file})
+            else:
+                collect(file, 'generic', {'filename': file})
+
+    results = run_in_pools(get_data_from_text_file, pending_text_files(), workers, lambda file, ext, *args: ext, timeout)
+    for job, result, error in results:
+        file = job[0]
+        if error is not None:
+            failed.append((file, error))
+            # Keep the file, hashed in full so it is still compared byte for byte with every document
+            try:
+                hash = hash_file(file, algorithm)
+            except OSError:
+                continue  # Deleted or locked, it cannot be compared at all
+            collect(file, 'text', {'filename': file, 'text': '', 'hash': hash, 'status': 'skipped', 'minhash': None, 'simhash': None})
+            continue
+        if result['status'] == 'ok':
+            put_cached(cache, entries[file], algorithm, 'text', result)
+        else:
+            put_cached(cache, entries[file], algorithm, 'text', {**result, 'limits': limits})
+        collect(file, 'text', result)
+
+    texts.finalize()
+    for kind, index in indexes.items():
+        index.finalize()
+        # Files deleted or locked since they were listed
+        for record, error in index.failed:
+            failed.append((record['filename'], error))
+            records.pop(record['filename'], None)
+
+    # Keep the partial and full hashes calculated for images and other files
+    for file, record in known.items():
+        if file not in records: continue
+        record = {key: value for key, value in records[file][1].items() if key not in ['hash', 'dedup_key']}
+        if record != known[file]:
+            put_cached(cache, entries[file], algorithm, records[file][0], record)
+
+    if cache is not None:
+        evict(cache)
+        cache.close()
+
+    # Results arrive in completion order, so rebuild the original file order
+    text_data = []
+    image_data = []
+    generic_data = []
+    for file in files:
+        if file not in records: continue
+        kind, record = records[file]
+        if kind == 'text':
+            text_data.append(record)
+        elif kind == 'image':
+            image_data.append({'filename': file, 'hash': record.get('hash'), 'dedup_key': record['dedup_key']})
+        else:
+            generic_data.append({'filename': file, 'hash': record.get('hash'), 'dedup_key': record['dedup_key']})
+
+    text_data = pd.DataFrame.from_records(text_data)
+    image_data = pd.DataFrame.from_records(image_data)
+    generic_data = pd.DataFrame.from_records(generic_data)
+
+    return text_data, texts, image_data, generic_data, failed
+
+
+def update_manifest(files: list[FileEntry], directory: str):
+    """
+    This function compares the files found by the current scan with the \
+    manifest of the previous scan of the same folder, and saves the current \
+    scan as the new manifest.
+
+    Parameters:
+    -----------
+    - files: list[FileEntry]
+        A list of files, as returned by 'get_files'.
+    - directory: str
+        The path to the directory where the files are located.
+
+    Returns:
+    --------
+    - changes: dict or None
+        A dictionary with the 'added', 'modified' and 'deleted' lists of file \
+        names, and the time of the previous scan in 'scanned_at' (None if the \
+        folder was never scanned). None if the manifest cannot be stored.
+    """
+    connection = open_cache(directory)
+    if connection is None:
+        return None
+    manifest, scanned_at = load_manifest(connection)
+    changes = diff_manifest(manifest, files)
+    save_manifest(connection, files)
+    connection.close()
+    changes['scanned_at'] = scanned_at
+    return changes
+
+
+def get_extension(file):
+    return file.split('.')[-1].lower()
+
+def is_text_document(ext, text_extensions):
+    return ext in text_extensions
+
+def is_image_document(ext):
+    return ext in ['bmp', 'png', 'jpg', 'jpeg', 'gif', 'tiff']
+
+
+def get_data_from_text_file(file: str, ext: str, algorithm: str='md5', max_pages: int=None, max_bytes: int=None):
+    """
+    This function takes in a file path and its extension as inputs. \
+    It reads the file once, calculating the hash of its contents while \
+    reading, and extracts the text data from the same in-memory copy \
+    using the 'extract_text' function. It returns a dictionary \
+    containing the file name, text data, hash and extraction status.
+
+    Parameters:
+    -----------
+    - file: str
+        The name of the file to be processed.
+    - ext: str
+        The extension of the file to be processed.
+    - algorithm: str, optional
+        The name of the hash algorithm (one of 'hashing.HASH_ALGORITHMS'). Default is 'md5'.
+    - max_pages: int, optional
+        The maximum number of PDF pages to extract. Default is None (no limit).
+    - max_bytes: int, optional
+        Files larger than this number of bytes are hashed but their text is not \
+        extracted. Default is None (no limit).
+
+    Returns:
+    --------
+    - data: dict
+        A dictionary containing the file name, text data, and hash of the file's contents, \
+        and the MinHash signature and SimHash fingerprint of the text (see \
+        'minhash.get_signature' and 'simhash.get_simhash'). \
+        Its 'status' is 'ok', 'partial' if only the first 'max_pages' pages were \
+        extracted, or 'skipped' if the file is larger than 'max_bytes'.
+    """
+    if max_bytes is not None and os.path.getsize(file) > max_bytes:
+        return {'filename': file, 'text': '', 'hash': hash_file(file, algorithm), 'status': 'skipped', 'minhash': None, 'simhash': None}
+    contents, hash = read_and_hash(file, algorithm)
+    text, complete = extract_text(contents, ext, file, max_pages)
+    return {'filename': file, 'text': text, 'hash': hash, 'status': 'ok' if complete else 'partial', 'minhash': get_signature(text), 'simhash': get_simhash(text)}
+
+
+def find_duplicates(files: pd.DataFrame):
+    """
+    This function groups the files that have the same 'dedup_key', i.e. \
+    that are byte-identical.
+
+    Parameters:
+    -----------
+    - files: pd.DataFrame
+        A DataFrame with the 'filename' and 'dedup_key' of each file, as returned by 'extract_data'.
+
+    Returns:
+    --------
+    - groups: list[list[str]]
+        The file names of each group of identical files, in the order they \
+        first appear in 'files'.
+    """
+    if files.empty:
+        return []
+    duplicates = files[files.duplicated(subset='dedup_key', keep=False)]
+    return [group.tolist() for _, group in duplicates.groupby('dedup_key', sort=False)['filename']]
+
+
+def drop_duplicates(files: pd.DataFrame):
+    """
+    This function leaves out every file that has a byte-identical copy \
+    (see 'find_duplicates'), keeping none of the copies, so the copies are \
+    only reported as duplicates and not compared again by their text.
+    """
+    if files.empty:
+        return files
+    return files.drop_duplicates(subset='dedup_key', keep=False)
+
+
+def drop_skipped(text_data: pd.DataFrame):
+    """
+    This function leaves out the documents whose text could not be \
+    extracted, which are only compared byte for byte. Every feature built \
+    from the text (clusters, document vectors) uses the remaining rows, so \
+    they share the same 'corpus_digest'.
+    """
+    if text_data.empty or 'status' not in text_data:
+        return text_data.reset_index(drop=True)
+    return text_data[text_data['status'].fillna('ok') != 'skipped'].reset_index(drop=True)
+
+
+def get_text_from_file(file, ext: str, filename: str=None):
+    """
+    This function takes in a file and its extension as inputs. It reads the \
+    file and extracts the text from it, depending on its extension. 
+
+    Parameters:
+    -----------
+    - file: str or binary file object
+        A file name, or the contents of a file (e.g. an io.BytesIO), to be processed.
+    - ext: str
+        A file extension to be processed. Only files with these extensions are currently supported.
+    - filename: str, optional
+        The name of the file when 'file' is a file object. It is only used to \
+        label the extracted presentations.
+
+    Returns:
+    --------
+    - text: str
+        A string containing the extracted text from the specified file.
+    """
+    return extract_text(file, ext, filename)[0]
+
+
+def extract_text(file, ext: str, filename: str=None, max_pages: int=None):
+    """
+    This function extracts the text from a file like 'get_text_from_file', \
+    optionally stopping after the first 'max_pages' pages of a PDF.
+
+    Returns:
+    --------
+    - text: str
+        A string containing the extracted text from the specified file.
+    - complete: bool
+        False if pages were left out because of 'max_pages'.
+    """
+    is_path = isinstance(file, str)
+    complete = True
+    if ext == 'pdf':
+        fileReader = PyPDF2.PdfReader(file)
+        pages = fileReader.pages
+        if max_pages is not None and len(pages) > max_pages:
+            pages = [pages[i] for i in range(max_pages)]
+            complete = False
+        text = '\n'.join([page.extract_text() for page in pages])
+    elif ext == 'msg':
+        msg = extract_msg.Message(file if is_path else file.getvalue())
+        text = msg.body
+    elif ext == 'docx':
+        text = docx2txt.process(file)
+    elif ext == 'txt':
+        if is_path:
+            with open(file, 'r') as f:
+                text = f.read()
+        else:
+            # Decode like open(file, 'r') would
+            text = io.TextIOWrapper(file).read()
+    elif ext == 'pptx':
+        if is_path:
+            presentation = extract_pptx_text(file, False)
+        else:
+            presentation = [extract_presentation_text({'path': filename, 'presentationObj': Presentation(file)}, False)]
+        text = ''
+        for p in presentation:
+            for info in p['slides']:
+                text += info['bodyText'] + '\n'
+    else:
+        return '', True
+
+    return text, complete
@@ -0,0 +1,237 @@
+import os
+import glob
+import hashlib
+from collections import Counter
+import numpy as np
+import pandas as pd
+import scipy
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+from textstore import TextStore
+from cache import CACHE_DIR
+
+# Lengths in words of the n-grams counted in each document
+NGRAM_RANGE = (1, 5)
+# 'vocabulary' counts the n-grams found in the corpus, 'hashed' counts them
+# in a fixed number of columns without keeping a vocabulary
+FEATURE_BACKENDS = ['vocabulary', 'hashed']
+DEFAULT_FEATURES = {'backend': 'vocabulary', 'n_features': 2 ** 20, 'sublinear_tf': False}
+# Number of saved matrices kept in the cache folder of a scanned folder
+VECTOR_FILES_KEPT = 4
+
+
+def vectorize_documents(data: pd.DataFrame, texts: TextStore, settings: dict=None):
+    """
+    This function counts the 1 to 5 word n-grams of each document.
+
+    Parameters:
+    -----------
+    - data: pd.DataFrame
+        A DataFrame with the 'doc_id' of each document.
+    - texts: TextStore
+        The extracted text of the documents.
+    - settings: dict, optional
+        A dictionary with the feature 'backend' (one of 'FEATURE_BACKENDS'), \
+        the number of columns of the hashed backend ('n_features') and \
+        whether to use 'sublinear_tf' (1 + log of the counts). Missing \
+        entries take their value from 'DEFAULT_FEATURES'.
+
+    Returns:
+    --------
+    - vector: scipy.sparse._csr.csr_matrix
+        A sparse matrix with one row of n-gram counts per row of 'data'.
+    - vocabulary: dict or None
+        The column of each n-gram with the 'vocabulary' backend, fitted on \
+        these documents only, or None with the hashed backend.
+
+    Notes:
+    ------
+    - The hashed backend needs no vocabulary, so its memory does not grow \
+    with the number of distinct n-grams, and stores float32 values. N-grams \
+    that share a column are counted together, which barely changes the \
+    similarity of documents when there are many more columns than n-grams \
+    per document.
+    """
+    settings = {**DEFAULT_FEATURES, **(settings or {})}
+    documents = texts.texts(data['doc_id'])
+    if settings['backend'] == 'hashed':
+        hasher = HashingVectorizer(ngram_range=NGRAM_RANGE, n_features=settings['n_features'],
+                                   alternate_sign=False, norm=None, dtype=np.float32)
+        vector = hasher.transform(documents)
+        vocabulary = None
+    else:
+        # A vectorizer per call, as sessions vectorize their corpus concurrently
+        vectorizer = CountVectorizer(ngram_range=NGRAM_RANGE)
+        vector = vectorizer.fit_transform(documents)
+        vocabulary = vectorizer.vocabulary_
+    if settings['sublinear_tf']:
+        vector = vector.astype(np.float32 if settings['backend'] == 'hashed' else np.float64)
+        np.log(vector.data, out=vector.data)
+        vector.data += 1
+    return vector, vocabulary
+
+
+def vectorize_query(text: str, settings: dict=None, vocabulary: dict=None):
+    """
+    This function vectorizes a document that is not part of the corpus in \
+    the feature space of 'vectorize_documents', so it can be compared with \
+    the normalized document vectors.
+
+    Parameters:
+    -----------
+    - text: str
+        The text of the document.
+    - settings: dict, optional
+        The feature settings of the corpus (see 'vectorize_documents').
+    - vocabulary: dict, optional
+        The column of each n-gram of the corpus, required by the \
+        'vocabulary' backend (see 'load_vocabulary').
+
+    Returns:
+    --------
+    - vector: scipy.sparse._csr.csr_matrix
+        A single normalized row.
+
+    Notes:
+    ------
+    - N-grams missing from the corpus vocabulary have no column, but they \
+    still count in the norm of the query. Its dot product with a document \
+    vector is then the same cosine similarity the two documents would have \
+    if they were vectorized together.
+    """
+    settings = {**DEFAULT_FEATURES, **(settings or {})}
+    if settings['backend'] == 'hashed':
+        hasher = HashingVectorizer(ngram_range=NGRAM_RANGE, n_features=settings['n_features'],
+                                   alternate_sign=False, norm=None, dtype=np.float32)
+        vector = hasher.transform([text])
+        if settings['sublinear_tf']:
+            np.log(vector.data, out=vector.data)
+            vector.data += 1
+        return normalize(vector)
+
+    if vocabulary is None:
+        raise ValueError("The 'vocabulary' backend needs the vocabulary of the corpus.")
+    counts = Counter(CountVectorizer(ngram_range=NGRAM_RANGE).build_analyzer()(text))
+    values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    if settings['sublinear_tf']:
+        values = 1 + np.log(values)
+    norm = np.sqrt(np.sum(values ** 2))
+    columns = np.fromiter((vocabulary.get(term, -1) for term in counts), dtype=np.int64, count=len(counts))
+    known = columns >= 0
+    data = values[known] / norm if norm > 0 else values[known]
+    return scipy.sparse.csr_matrix((data, (np.zeros(known.sum(), dtype=np.int64), columns[known])),
+                                   shape=(1, len(vocabulary)))
+
+
+def describe_features(settings: dict=None):
+    """
+    This function describes the feature space of 'vectorize_documents', so \
+    results computed in it (e.g. the similarity graph) can tell when it changed.
+    """
+    settings = {**DEFAULT_FEATURES, **(settings or {})}
+    if settings['backend'] == 'vocabulary':
+        settings.pop('n_features')
+        settings['params'] = sorted(CountVectorizer(ngram_range=NGRAM_RANGE).get_params().items())
+    return str(sorted(settings.items()))
+
+
+def corpus_digest(data: pd.DataFrame, settings: dict=None):
+    """
+    This function summarizes a corpus and a feature space in a short digest. \
+    It changes whenever a document is added, removed, modified or extracted \
+    differently, or the feature settings change.
+    """
+    digest = hashlib.blake2b(describe_features(settings).encode('utf-8'), digest_size=16)
+    status = data['status'] if 'status' in data else [''] * len(data.index)
+    for filename, hash, state in zip(data['filename'], data['hash'], status):
+        digest.update(f'\0{filename}\0{hash}\0{state}'.encode('utf-8', errors='surrogatepass'))
+    return digest.hexdigest()
+
+
+def load_document_vectors(directory: str, data: pd.DataFrame, texts: TextStore, settings: dict=None, digest: str=None):
+    """
+    This function returns the normalized document vectors of a corpus. They \
+    are saved in the cache folder of the scanned folder the first time they \
+    are computed, together with the vocabulary of the 'vocabulary' backend, \
+    and loaded from there while the corpus and feature settings stay the same.
+
+    Parameters:
+    -----------
+    - directory: str
+        The scanned root folder.
+    - data: pd.DataFrame
+        A DataFrame with the 'filename', 'hash' and 'doc_id' of each document.
+    - texts: TextStore
+        The extracted text of the documents.
+    - settings: dict, optional
+        The feature settings (see 'vectorize_documents').
+    - digest: str, optional
+        The 'corpus_digest' of 'data' and 'settings', if already known.
+
+    Returns:
+    --------
+    - vector: scipy.sparse._csr.csr_matrix
+        A sparse matrix with one normalized row per row of 'data'.
+    - vocabulary: dict or None
+        The column of each n-gram of 'vector' (see 'vectorize_documents').
+    """
+    digest = digest or corpus_digest(data, settings)
+    path = os.path.join(directory, CACHE_DIR, f'vectors-{digest}.npz')
+    vocabulary_path = os.path.join(directory, CACHE_DIR, f'vocabulary-{digest}.txt')
+    uses_vocabulary = {**DEFAULT_FEATURES, **(settings or {})}['backend'] == 'vocabulary'
+    try:
+        vector = scipy.sparse.load_npz(path).tocsr()
+        vocabulary = load_vocabulary(directory, digest) if uses_vocabulary else None
+        if not uses_vocabulary or (vocabulary is not None and len(vocabulary) == vector.shape[1]):
+            return vector, vocabulary
+    except (OSError, ValueError):
+        pass
+
+    vector, vocabulary = vectorize_documents(data, texts, settings)
+    vector = normalize(vector)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # The vocabulary is written first, so saved vectors always have theirs
+        if vocabulary is not None:
+            save_vocabulary(vocabulary_path, vocabulary)
+        # Written under a temporary name so a half-written file is never loaded
+        partial = os.path.join(directory, CACHE_DIR, f'partial-{digest}.npz')
+        scipy.sparse.save_npz(partial, vector, compressed=False)
+        os.replace(partial, path)
+        remove_old_vectors(directory)
+    except OSError:
+        pass  # The folder is read-only, the vectors are computed every time
+    return vector, vocabulary
+
+
+def save_vocabulary(path: str, vocabulary: dict):
+    """
+    This function saves a vocabulary returned by 'vectorize_documents', one \
+    n-gram per line in column order. N-grams are made of word characters \
+    and spaces, so they never contain a line break.
+    """
+    terms = sorted(vocabulary, key=vocabulary.get)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(terms))
+    os.replace(path + '.tmp', path)
+
+
+def load_vocabulary(directory: str, digest: str):
+    """
+    This function loads the vocabulary saved by 'load_document_vectors', as \
+    a dictionary mapping each n-gram to its column, or None if it was not saved.
+    """
+    try:
+        with open(os.path.join(directory, CACHE_DIR, f'vocabulary-{digest}.txt'), encoding='utf-8') as f:
+            return {term: column for column, term in enumerate(f.read().split('\n'))}
+    except OSError:
+        return None
+
+
+def remove_old_vectors(directory: str):
+    files = sorted(glob.glob(os.path.join(directory, CACHE_DIR, 'vectors-*.npz')), key=os.path.getmtime, reverse=True)
+    for path in files[VECTOR_FILES_KEPT:]:
+        vocabulary = path.replace('vectors-', 'vocabulary-').replace('.npz', '.txt')
+        for old in [path, vocabulary]:
+            if os.path.exists(old):
+                os.remove(old)
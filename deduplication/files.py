@@ -1,137 +1,112 @@
 import streamlit as st
-import extract_msg
-import docx2txt
-from pptxer.presentations_text_extractor import __extract_presentation_texts_from_path__ as extract_pptx_text
-import PyPDF2
-import pandas as pd
 from time import perf_counter
 import os
-import hashlib
-import zipfile
 import shutil
 import platform
 import subprocess
+from walker import FileEntry, walk_files
+from extraction import extract_data, update_manifest, find_duplicates, drop_duplicates
 
 
 @st.cache_resource
-def get_data(files: list[str], directory: str, text_extensions: list[str]):
+def get_data(files: list[FileEntry], directory: str, text_extensions: list[str], workers: dict=None, algorithm: str='md5', limits: dict=None):
     """
-    This function takes in a list of file names, a directory path, and a list of \
+    This function takes in a list of files, a directory path, and a list of \
     file extensions as inputs. It reads the files in the directory with the specified \
-    extensions, extracts data from them using the 'get_data_from_text_file' function, \
-    and returns a pandas DataFrame with the extracted data.
+    extensions, extracts data from them using the 'extraction.extract_data' function while showing \
+    its progress, and returns a pandas DataFrame with the extracted data.
 
     Parameters:
     -----------
-    - files: list[str]
-        A list of file names to be processed.
+    - files: list[FileEntry]
+        A list of files to be processed, as returned by 'get_files'.
     - directory: str
         The path to the directory where the files are located.
     - text_extensions: list[str]
         A list of file extensions that are supported for text extraction.
+    - workers: dict, optional
+        A dictionary mapping a file extension to the number of worker processes \
+        used to extract files of that format. The 'default' entry applies to \
+        every other extension. Formats without workers are extracted in the \
+        app process, unless a 'timeout' is given. Default is None, which \
+        extracts every file in the app process when there is no timeout.
+    - algorithm: str, optional
+        The name of the hash algorithm (one of 'hashing.HASH_ALGORITHMS'). Default is 'md5'.
+    - limits: dict, optional
+        A dictionary with the 'timeout' in seconds, the 'max_pages' and the \
+        'max_bytes' allowed to extract a single text document. Missing or None \
+        entries are unlimited. With a timeout, every text format is extracted \
+        by at least one worker process, so a stuck parser can be stopped.
 
     Returns:
     --------
     - text_data: pandas DataFrame
-        A DataFrame containing the extracted filename, text, and hash from the specified files and extensions, with all duplicate entries removed.
+        A DataFrame containing the filename, hash, status and the 'doc_id' of the extracted text from the specified files and extensions.
+    - texts: TextStore
+        The extracted text of each document, looked up by its 'doc_id'.
     - image_data: pandas DataFrame
         A DataFrame containing the extracted filename, and hash from image files, with all duplicate entries removed.
     - generic_data: pandas DataFrame
         A DataFrame containing the extracted filename, and hash from the remaining files, with all duplicate entries removed.
+    - files_analyzed: int
+        The number of files analyzed.
+    - time: float
+        The number of seconds it took.
+
+    Notes:
+    ------
+    - Extracted data is kept in a persistent cache (see 'cache.open_cache') keyed \
+    by path, size, modification time and inode, so only new or changed files \
+    are read on later scans.
+    - Images and other files are only read when another file has the same size \
+    (see 'hashing.DuplicateIndex').
+    - Files flow through the walk, cache lookup, extraction and duplicate \
+    index one at a time: only a bounded number of files wait for a worker, \
+    and identical files are reported while the scan is still running.
+    - Text documents that fail or run out of time are kept with an empty text \
+    and a 'skipped' status. They are hashed in full, so they are still \
+    compared byte for byte with every other document. Their \
+    'status' is also 'partial' or 'skipped' when a page or size limit applied. \
+    Such records are only read back from the cache under the same limits.
+    - The extracted text is written to a memory-mapped 'textstore.TextStore' \
+    as documents arrive, rather than kept as Python strings in the DataFrame.
     """
-    text_data = []
-    image_data = []
-    generic_data = []
     progress_bar = st.empty()
+    live_duplicates = st.empty()
+    found = []
     start_time = perf_counter()
-    for i, file in enumerate(files):
-        if is_temp_file(file): continue
-
-        progress_bar.progress((i+1)/len(files), f'Loading {file.replace(directory, "")}')
-        ext = file.split('.')[-1].lower()
-        if is_text_document(ext, text_extensions):
-            text_data.append(get_data_from_text_file(file, ext))
-        elif is_image_document(ext):
-            image_data.append(get_data_from_generic_file(file))
-        else:
-            generic_data.append(get_data_from_generic_file(file))
-
-    
-    text_data = pd.DataFrame.from_records(text_data)
-    image_data = pd.DataFrame.from_records(image_data)
-    generic_data = pd.DataFrame.from_records(generic_data)
-
-    progress_bar.empty()
-
-    files_analyzed = len(text_data.index) + len(image_data.index) + len(generic_data.index)
 
-    return text_data, image_data, generic_data, files_analyzed, perf_counter() - start_time
+    def show_progress(fraction, text):
+        progress_bar.progress(fraction, text.replace(directory, ''))
 
-def is_temp_file(file):
-    filename = str(os.path.basename(file))
-    return filename.startswith('~$')
+    def show_duplicates(duplicates):
+        found.append(duplicates)
+        live_duplicates.info(f"{len(found)} groups of identical files found so far. "
+                             f"Latest: {' = '.join(d['filename'].replace(directory, '') for d in duplicates)}")
 
-def is_text_document(ext, text_extensions):
-    return ext in text_extensions
-
-def is_image_document(ext):
-    return ext in ['bmp', 'png', 'jpg', 'jpeg', 'gif', 'tiff']
+    text_data, texts, image_data, generic_data, failed = extract_data(
+        files, directory, text_extensions, workers, algorithm, limits, show_progress, show_duplicates)
 
+    progress_bar.empty()
+    live_duplicates.empty()
 
-@st.cache_data
-def get_data_from_generic_file(file):
-    """
-    This function takes in a file path as input. It reads the file \
-    and extracts the MD5 hash from the file's contents and returns \
-    a dictionary containing the file name and hash.
+    if failed:
+        with st.expander(f"{len(failed)} files could not be processed"):
+            for file, error in failed:
+                st.write(f"{file.replace(directory, '')}: {error!r}")
 
-    Parameters:
-    -----------
-    - file: str
-        The name of the file to be processed.
+    files_analyzed = len(text_data.index) + len(image_data.index) + len(generic_data.index)
 
-    Returns:
-    --------
-    - data: dict
-        A dictionary containing the file name and MD5 hash of the file's contents.
-    """
-    with open(file, 'rb') as f:  # Open the file in binary mode
-        contents = f.read()  # Read the contents as bytes
-    hash = hashlib.md5(contents).hexdigest()  # Calculate the hash of the file's contents
-    return {'filename': file, 'hash': hash}
+    return text_data, texts, image_data, generic_data, files_analyzed, perf_counter() - start_time
 
 
-@st.cache_data
-def get_data_from_text_file(file: str, ext: str):
+@st.cache_resource
+def get_changes(files: list[FileEntry], directory: str):
     """
-    This function takes in a file path and its extension as inputs. \
-    It reads the file and extracts the text data from it using the \
-    'get_text_from_file' function. It also calculates the MD5 hash of \
-    the file's contents and returns a dictionary containing the file \
-    name, text data, and hash.
-
-    Parameters:
-    -----------
-    - file: str
-        The name of the file to be processed.
-    - ext: str
-        The extension of the file to be processed.
-
-    Returns:
-    --------
-    - data: dict
-        A dictionary containing the file name, text data, and MD5 hash of the file's contents.
+    This function caches 'update_manifest' for the app, so the manifest is \
+    only updated once per scan rather than on every rerun.
     """
-
-    text = get_text_from_file(file, ext)
-    try:
-        with open(file, 'rb') as f:  # Open the file in binary mode
-            contents = f.read()  # Read the contents as bytes
-    except PermissionError:
-        st.error(f'Permission error. The file `{file}` cannot be opened. If this file is already open, close all applications that are interacting with it.')
-        st.stop()
-    hash = hashlib.md5(contents).hexdigest()  # Calculate the hash of the file's contents
-    return {'filename': file, 'text': text, 'hash': hash}
+    return update_manifest(files, directory)
 
 
 def remove_duplicates(files: list[str], directory: str):
@@ -157,20 +132,17 @@ def remove_duplicates(files: list[str], directory: str):
     - This function displays the list of duplicate files and their respective paths \
     in an expandable section using Streamlit.
     """
-    duplicates = files[files.duplicated(subset='hash', keep=False)]
+    groups = find_duplicates(files)
     all_duplicates = []
 
 
-    if duplicates.empty: return files, all_duplicates
+    if not groups: return files, all_duplicates
 
     all_duplicates = []
-    for i, hash_value in enumerate(duplicates['hash'].unique()):
+    for i, group in enumerate(groups):
 
         with st.expander(f"Duplicates {i+1}", expanded=True):
-            duplicate_filenames = [
-                filename.replace(directory, '')
-                for filename in duplicates[duplicates['hash'] == hash_value]['filename']
-            ]
+            duplicate_filenames = [filename.replace(directory, '') for filename in group]
             all_duplicates += duplicate_filenames
             for filename in duplicate_filenames:
                 path = filename.replace(directory, '')
@@ -183,55 +155,11 @@ def remove_duplicates(files: list[str], directory: str):
                 st.write("")
                 st.write("")
 
-    files = files.drop_duplicates(subset='hash', keep=False)
+    files = drop_duplicates(files)
 
     return files, all_duplicates
 
 
-def get_text_from_file(file: str, ext: str):
-    """
-    This function takes in a file name and its extension as inputs. It reads the \
-    file and extracts the text from it, depending on its extension. 
-
-    Parameters:
-    -----------
-    - file: str
-        A file name to be processed.
-    - ext: str
-        A file extension to be processed. Only files with these extensions are currently supported.
-
-    Returns:
-    --------
-    - text: str
-        A string containing the extracted text from the specified file.
-    """
-    if ext == 'pdf':
-        fileReader = PyPDF2.PdfReader(file)
-        text = '\n'.join([page.extract_text() for page in fileReader.pages])
-    elif ext == 'msg':
-        msg = extract_msg.Message(file)
-        text = msg.body
-    elif ext == 'docx':
-        try:
-            text = docx2txt.process(file)
-        except zipfile.BadZipFile:
-            st.error("Make sure all Word files are closed and refresh the page.")
-            st.stop()
-    elif ext == 'txt':
-        with open(file, 'r') as f:
-            text = f.read()
-    elif ext == 'pptx':
-        presentation = extract_pptx_text(file, False)
-        text = ''
-        for p in presentation:
-            for info in p['slides']:
-                text += info['bodyText'] + '\n'
-    else:
-        return ''
-
-    return text
-
-
 def copy_file(relative_path, directory, subfolder_name, root_folder_name):
     source_path = directory + relative_path
     destination_folder = os.path.join(directory,root_folder_name,subfolder_name)
@@ -303,7 +231,7 @@ def open_file_with_explorer(file_path):
         print('Unsupported operating system:', system)
 
 
-def get_files(directory):
+def get_files(directory: str, filters: dict=None, workers: int=1):
     """
     This function takes in a directory path as input and returns a list of files found \
     within the specified directory.
@@ -312,11 +240,17 @@ def get_files(directory):
     -----------
     - directory: str
         A directory path to be searched for files.
+    - filters: dict, optional
+        Keyword arguments passed to 'walker.walk_files' (include and exclude \
+        patterns, size limits and hidden/temporary file rules).
+    - workers: int, optional
+        The number of threads walking subfolders in parallel. Default is 1.
 
     Returns:
     --------
-    - files: list
-        A list of file paths found within the specified directory.
+    - files: list[FileEntry]
+        A list of the files found within the specified directory, sorted by \
+        path, with their size, modification time and inode.
     """
     if directory == '':
         st.stop()
@@ -329,7 +263,7 @@ def get_files(directory):
     start_time = perf_counter()
     try:
         with st.spinner("Gathering files"):
-            files = [os.path.join(root, file) for root, _, files in os.walk(directory) for file in files]
+            files = sorted(walk_files(directory, workers=workers, **(filters or {})))
     except Exception as e:
         st.warning("Could not access the specified folder path due to the following error:")
         st.error(e)
@@ -342,4 +276,4 @@ def get_files(directory):
     st.session_state['log_data']['files_found'] = len(files)
     st.session_state['log_data']['timer'][0] = perf_counter() - start_time
     
-    return files
\ No newline at end of file
+    return files
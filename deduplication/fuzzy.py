@@ -0,0 +1,164 @@
+import re
+import numpy as np
+from textindex import PositionalIndex, tokenize
+
+# Characters per gram, and the padding marking the start and end of a word
+GRAM_SIZE = 3
+PADDING = '\0' * (GRAM_SIZE - 1)
+
+
+def gram_keys(words: list[str]):
+    """
+    This function computes the character trigrams of each word, padded so \
+    the first and last characters appear in as many trigrams as the \
+    others. Each trigram is encoded as an integer made of the code \
+    points of its characters, so the trigrams of a whole vocabulary are \
+    computed with numpy at once.
+
+    Returns:
+    --------
+    - (words, keys): tuple[np.ndarray]
+        The position in 'words' and the key of each trigram, sorted by \
+        word. A trigram repeated in a word is repeated.
+    """
+    padded = ''.join(PADDING + word + PADDING for word in words)
+    codes = np.frombuffer(padded.encode('utf-32-le', errors='surrogatepass'), dtype=np.uint32).astype(np.int64)
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words)) + 2 * len(PADDING)
+    counts = lengths - GRAM_SIZE + 1
+    owners = np.repeat(np.arange(len(words)), counts)
+    # Offset in 'padded' of each trigram
+    starts = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(np.cumsum(lengths) - lengths, counts)
+    keys = np.zeros(len(starts), dtype=np.int64)
+    for i in range(GRAM_SIZE):
+        keys = (keys << 21) | codes[starts + i]  # Code points take 21 bits
+    return owners, keys
+
+
+def edit_distance(a: str, b: str, max_distance: int):
+    """
+    This function computes the Levenshtein distance between two words \
+    (insertions, deletions and substitutions of one character), stopping \
+    as soon as it is known to be larger than 'max_distance'.
+
+    Returns:
+    --------
+    - distance: int
+        The distance, or 'max_distance + 1' if it is larger than 'max_distance'.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, character in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, other in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (character != other))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+class TrigramIndex:
+    """
+    This class finds the words of a vocabulary within a few edits of a \
+    given word, e.g. the OCR-garbled or misspelled forms of a word in old \
+    documents, without computing the edit distance to every word.
+
+    Each edit changes at most 'GRAM_SIZE' of the distinct trigrams of a \
+    word, so a word within 'k' edits of the query shares at least \
+    'len(trigrams of query) - GRAM_SIZE * k' trigrams with it. The trigram \
+    postings give that count for every word at once, and the edit distance \
+    is only computed for the words reaching it.
+
+    Parameters:
+    -----------
+    - terms: list[str]
+        The vocabulary, e.g. the words of a 'PositionalIndex'.
+    """
+    def __init__(self, terms: list[str]):
+        self.terms = terms
+        self.lengths = np.fromiter(map(len, terms), dtype=np.int64, count=len(terms))
+        columns, keys = gram_keys(terms)
+        # A stable sort keeps the words of each trigram in vocabulary order
+        order = np.argsort(keys, kind='stable')
+        columns, keys = columns[order], keys[order]
+        # A trigram repeated in a word counts once
+        distinct = np.ones(len(keys), dtype=bool)
+        distinct[1:] = (keys[1:] != keys[:-1]) | (columns[1:] != columns[:-1])
+        columns, keys = columns[distinct], keys[distinct]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else np.empty(0, np.int64)
+        self.keys = keys[starts]
+        self.indptr = np.append(starts, len(keys)).astype(np.int64)
+        self.columns = columns
+
+    def similar_terms(self, word: str, max_distance: int):
+        """
+        This method finds the words of the vocabulary within 'max_distance' \
+        edits of 'word'.
+
+        Returns:
+        --------
+        - terms: dict or None
+            A dictionary mapping each word found to its distance, or None \
+            if 'word' is too short for trigrams to narrow the search at this \
+            distance.
+        """
+        keys = np.unique(gram_keys([word])[1])
+        threshold = len(keys) - GRAM_SIZE * max_distance
+        if threshold < 1:
+            return None
+        rows = np.searchsorted(self.keys, keys)
+        rows = rows[(rows < len(self.keys)) & (self.keys[np.minimum(rows, len(self.keys) - 1)] == keys)]
+        if len(rows) == 0:
+            return {}
+        postings = [self.columns[self.indptr[row]:self.indptr[row + 1]] for row in rows]
+        counts = np.bincount(np.concatenate(postings), minlength=len(self.terms))
+        candidates = np.flatnonzero((counts >= threshold) & (np.abs(self.lengths - len(word)) <= max_distance))
+        terms = {}
+        for column in candidates:
+            distance = edit_distance(word, self.terms[column], max_distance)
+            if distance <= max_distance:
+                terms[self.terms[column]] = distance
+        return terms
+
+
+def fuzzy_candidates(index: PositionalIndex, trigrams: TrigramIndex, query: str, max_distance: int):
+    """
+    This function finds the documents containing the words of a query in \
+    order, each word allowing up to 'max_distance' edits. Words too short \
+    for that many edits must match exactly.
+
+    Parameters:
+    -----------
+    - index: PositionalIndex
+        The positional index of the documents.
+    - trigrams: TrigramIndex
+        The trigram index of the words of 'index'.
+    - query: str
+        The query. Case and punctuation are ignored.
+    - max_distance: int
+        The largest number of edits allowed per word.
+
+    Returns:
+    --------
+    - rows: np.ndarray
+        The sorted rows of the matching documents.
+    - variants: list[list[str]]
+        The words of the documents matching each word of the query.
+    """
+    variants = []
+    for word in tokenize(query):
+        terms = trigrams.similar_terms(word, max_distance)
+        variants.append([word] if terms is None else sorted(terms, key=terms.get))
+    if not variants or not all(variants):
+        return np.empty(0, np.int64), variants
+    return index.phrase(list(enumerate(variants))), variants
+
+
+def variants_pattern(variants: list[list[str]]):
+    """
+    This function builds the regular expression matching the words found \
+    by 'fuzzy_candidates', so their occurrences can be highlighted.
+    """
+    words = ['(?:' + '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)) + ')' for terms in variants]
+    return r'\b' + r'\W+'.join(words) + r'\b'
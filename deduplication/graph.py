@@ -0,0 +1,246 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import scipy
+from scipy.sparse.csgraph import connected_components
+
+# Loosest similarity the 'Sensitivity' slider can ask for (sensitivity 1.0)
+MIN_SIMILARITY = 0.5
+
+
+def similarity_threshold(sensitivity: float):
+    """
+    This function converts a sensitivity into the cosine similarity two \
+    documents need to be linked. For normalized vectors, a DBSCAN 'eps' on \
+    the euclidean distance is the same as 'cosine similarity >= 1 - eps^2 / 2'.
+    """
+    return 1 - sensitivity ** 2 / 2
+
+
+def similar_pairs(vector: scipy.sparse._csr.csr_matrix, rows: list[int], min_similarity: float=MIN_SIMILARITY, chunk_size: int=256):
+    """
+    This function finds the pairs of documents whose cosine similarity is at \
+    least 'min_similarity', between the given rows and every row of the \
+    matrix. Rows are multiplied against the matrix a chunk at a time, so \
+    memory grows with the number of similar pairs rather than with the \
+    square of the number of documents.
+
+    Parameters:
+    -----------
+    - vector: scipy.sparse._csr.csr_matrix
+        A sparse matrix of normalized document vectors.
+    - rows: list[int]
+        The rows whose similar documents are wanted.
+    - min_similarity: float, optional
+        The smallest cosine similarity kept. Default is 'MIN_SIMILARITY'.
+    - chunk_size: int, optional
+        The number of rows multiplied at once. Default is 256.
+
+    Returns:
+    --------
+    - (first, second, similarities): tuple[np.ndarray]
+        The row indices of each pair and their cosine similarity. A document \
+        is never paired with itself.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    transposed = vector.T.tocsr()
+    first, second, similarities = [], [], []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        block = (vector[chunk] @ transposed).tocoo()
+        keep = (block.data >= min_similarity) & (chunk[block.row] != block.col)
+        first.append(chunk[block.row[keep]])
+        second.append(block.col[keep].astype(np.int64))
+        similarities.append(block.data[keep])
+    if not first:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    return np.concatenate(first), np.concatenate(second), np.concatenate(similarities)
+
+
+def update_similarity_graph(connection: sqlite3.Connection, data: pd.DataFrame, vector: scipy.sparse._csr.csr_matrix, features: str):
+    """
+    This function keeps a persistent graph of similar documents up to date. \
+    Only documents that are new or changed since the graph was last updated \
+    are compared against the corpus, and pairs involving deleted or changed \
+    documents are dropped.
+
+    Parameters:
+    -----------
+    - connection: sqlite3.Connection
+        A connection returned by 'cache.open_cache'.
+    - data: pd.DataFrame
+        A DataFrame with the 'filename' and 'hash' of each document, in the \
+        same order as the rows of 'vector'.
+    - vector: scipy.sparse._csr.csr_matrix
+        A sparse matrix of normalized document vectors.
+    - features: str
+        A description of the feature space of 'vector'. The graph is rebuilt \
+        from scratch when it changes.
+
+    Returns:
+    --------
+    - (first, second, similarities): tuple[np.ndarray]
+        The row indices in 'data' of every pair of documents with a cosine \
+        similarity of at least 'MIN_SIMILARITY', each pair listed once.
+    """
+    create_graph_tables(connection)
+    row = connection.execute("SELECT value FROM similarity_info WHERE key = 'features'").fetchone()
+    if row is None or row[0] != features:
+        connection.execute('DELETE FROM similarity_nodes')
+        connection.execute('DELETE FROM similarity_edges')
+        connection.execute("INSERT OR REPLACE INTO similarity_info VALUES ('features', ?)", (features,))
+
+    current = dict(zip(data['filename'], data['hash']))
+    covered = dict(connection.execute('SELECT path, hash FROM similarity_nodes'))
+    stale = [(path,) for path, hash in covered.items() if current.get(path) != hash]
+    connection.executemany('DELETE FROM similarity_nodes WHERE path = ?', stale)
+    connection.executemany('DELETE FROM similarity_edges WHERE first = ?', stale)
+    connection.executemany('DELETE FROM similarity_edges WHERE second = ?', stale)
+
+    filenames = data['filename'].tolist()
+    new_rows = [i for i, path in enumerate(filenames) if covered.get(path) != current[path]]
+    first, second, similarities = similar_pairs(vector, new_rows)
+    edges = {
+        (min(filenames[i], filenames[j]), max(filenames[i], filenames[j])): float(similarity)
+        for i, j, similarity in zip(first, second, similarities)
+    }
+    connection.executemany('INSERT OR REPLACE INTO similarity_edges VALUES (?, ?, ?)',
+                           [(a, b, similarity) for (a, b), similarity in edges.items()])
+    connection.executemany('INSERT OR REPLACE INTO similarity_nodes VALUES (?, ?)',
+                           [(filenames[i], current[filenames[i]]) for i in new_rows])
+    connection.commit()
+
+    index = {path: i for i, path in enumerate(filenames)}
+    first, second, similarities = [], [], []
+    for a, b, similarity in connection.execute('SELECT first, second, similarity FROM similarity_edges'):
+        if a in index and b in index:
+            first.append(index[a])
+            second.append(index[b])
+            similarities.append(similarity)
+    return np.array(first, dtype=np.int64), np.array(second, dtype=np.int64), np.array(similarities)
+
+
+def label_components(n_documents: int, first: np.ndarray, second: np.ndarray, similarities: np.ndarray, threshold: float):
+    """
+    This function groups documents linked by a similarity of at least \
+    'threshold' into clusters. It gives the same clusters as DBSCAN with \
+    'min_samples=2', since every document with a neighbor is a core point.
+
+    Returns:
+    --------
+    - nodes: np.ndarray
+        The cluster label of each document, -1 for documents without neighbors.
+    """
+    keep = similarities >= threshold
+    adjacency = scipy.sparse.csr_matrix(
+        (np.ones(keep.sum()), (first[keep], second[keep])), shape=(n_documents, n_documents))
+    _, labels = connected_components(adjacency, directed=False)
+    sizes = np.bincount(labels)
+    return np.where(sizes[labels] > 1, labels, -1)
+
+
+def similarity_graph(vector: scipy.sparse._csr.csr_matrix, data: pd.DataFrame, connection: sqlite3.Connection=None, features: str=None):
+    """
+    This function finds every pair of documents with a cosine similarity of \
+    at least 'MIN_SIMILARITY', the loosest the 'Sensitivity' slider can ask \
+    for. The clusters of any sensitivity are then a 'label_components' pass \
+    over these pairs, without comparing the documents again.
+
+    Parameters:
+    -----------
+    - vector: scipy.sparse._csr.csr_matrix
+        A sparse matrix of normalized document vectors.
+    - data: pd.DataFrame
+        A DataFrame with the 'filename' and 'hash' of each document, in the \
+        same order as the rows of 'vector'.
+    - connection: sqlite3.Connection, optional
+        A connection returned by 'cache.open_cache'. If given, the persistent \
+        similarity graph is updated and reused (see 'update_similarity_graph').
+    - features: str, optional
+        A description of the feature space of 'vector', needed with 'connection'.
+
+    Returns:
+    --------
+    - (first, second, similarities): tuple[np.ndarray]
+        The row indices of each pair and their cosine similarity.
+    """
+    if connection is not None:
+        # Only documents that changed since the last scan are compared against the corpus
+        return update_similarity_graph(connection, data, vector, features)
+    return similar_pairs(vector, range(vector.shape[0]))
+
+
+def cluster_similar_documents(vector: scipy.sparse._csr.csr_matrix, data: pd.DataFrame, sensitivity: float, connection: sqlite3.Connection=None, features: str=None):
+    """
+    This function groups similar documents into clusters.
+
+    Parameters:
+    -----------
+    - vector: scipy.sparse._csr.csr_matrix
+        A sparse matrix of normalized document vectors.
+    - data: pd.DataFrame
+        A DataFrame with the 'filename' and 'hash' of each document, in the \
+        same order as the rows of 'vector'.
+    - sensitivity: float
+        The largest euclidean distance between two linked documents, like \
+        the 'eps' of DBSCAN.
+    - connection: sqlite3.Connection, optional
+        A connection returned by 'cache.open_cache'. If given, the persistent \
+        similarity graph is updated and reused (see 'update_similarity_graph'), \
+        otherwise only the pairs similar enough for 'sensitivity' are computed.
+    - features: str, optional
+        A description of the feature space of 'vector', needed with 'connection'.
+
+    Returns:
+    --------
+    - nodes: np.ndarray
+        The cluster label of each document, -1 for documents without neighbors. \
+        They are the same clusters DBSCAN with 'min_samples=2' finds, but the \
+        matrix is never made dense: memory grows with its non-zero values and \
+        the number of similar pairs rather than with the size of the vocabulary.
+    """
+    threshold = similarity_threshold(sensitivity)
+    if connection is not None:
+        first, second, similarities = similarity_graph(vector, data, connection, features)
+    else:
+        # A single cut only needs the pairs above its own threshold
+        first, second, similarities = similar_pairs(vector, range(vector.shape[0]), threshold)
+    return label_components(len(data), first, second, similarities, threshold)
+
+
+def cluster_similarities(vectors: scipy.sparse._csr.csr_matrix):
+    """
+    This function computes how similar the documents of a cluster are. The \
+    rows are already normalized, so their cosine similarities are a single \
+    sparse product of the rows, and the averages are sums over it.
+
+    Parameters:
+    -----------
+    - vectors: scipy.sparse._csr.csr_matrix
+        The normalized vectors of the documents of the cluster, at least two.
+
+    Returns:
+    --------
+    - path_similarities: np.ndarray
+        The average similarity of each document with the others.
+    - average_similarity: float
+        The average similarity of all pairs of documents.
+    """
+    n_documents = vectors.shape[0]
+    similarities = (vectors @ vectors.T).toarray()
+    # Leave out the similarity of each document with itself
+    totals = similarities.sum(axis=1) - similarities.diagonal()
+    return totals / (n_documents - 1), float(totals.sum() / (n_documents * (n_documents - 1)))
+
+
+def create_graph_tables(connection: sqlite3.Connection):
+    connection.execute('CREATE TABLE IF NOT EXISTS similarity_info (key TEXT PRIMARY KEY, value)')
+    connection.execute('CREATE TABLE IF NOT EXISTS similarity_nodes (path TEXT PRIMARY KEY, hash TEXT)')
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS similarity_edges (
+            first TEXT,
+            second TEXT,
+            similarity REAL,
+            PRIMARY KEY (first, second)
+        )""")
+    connection.execute('CREATE INDEX IF NOT EXISTS similarity_edges_second ON similarity_edges (second)')
@@ -0,0 +1,180 @@
+import io
+import hashlib
+from collections import defaultdict
+
+HASH_ALGORITHMS = ['md5', 'blake2b']
+PARTIAL_HASH_BYTES = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file: str, algorithm: str='md5'):
+    """
+    This function calculates the hash of a file's contents, reading it in \
+    chunks so that large files are never loaded into memory at once.
+    """
+    hasher = hashlib.new(algorithm)
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def read_and_hash(file: str, algorithm: str='md5'):
+    """
+    This function reads a file once, hashing it chunk by chunk while the \
+    chunks are copied into an in-memory buffer, so the file's contents can \
+    be parsed without reading it from disk a second time.
+
+    Parameters:
+    -----------
+    - file: str
+        The name of the file to be read.
+    - algorithm: str, optional
+        The name of the hash algorithm (one of 'HASH_ALGORITHMS'). Default is 'md5'.
+
+    Returns:
+    --------
+    - buffer: io.BytesIO
+        The contents of the file, positioned at the start.
+    - hash: str
+        The hex digest of the file's contents.
+    """
+    hasher = hashlib.new(algorithm)
+    buffer = io.BytesIO()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            buffer.write(chunk)
+    buffer.seek(0)
+    return buffer, hasher.hexdigest()
+
+
+def partial_hash(file: str, size: int, algorithm: str='md5'):
+    """
+    This function calculates the hash of the first and last 64 KiB of a \
+    file. Files with different partial hashes cannot be identical.
+    """
+    hasher = hashlib.new(algorithm)
+    with open(file, 'rb') as f:
+        hasher.update(f.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES:
+            f.seek(max(PARTIAL_HASH_BYTES, size - PARTIAL_HASH_BYTES))
+            hasher.update(f.read(PARTIAL_HASH_BYTES))
+    return hasher.hexdigest()
+
+
+class DuplicateIndex:
+    """
+    This class finds byte-identical files as they are added one at a time, \
+    while reading as little of the files as possible:
+
+    1. Files with a unique size cannot have a duplicate and are not read.
+    2. Files sharing a size are told apart by the hash of their first and last 64 KiB.
+    3. Only files that still collide are hashed in full.
+
+    The first file of a size is only read once a second file of that size \
+    is added, so duplicates are reported as soon as both copies have been seen. \
+    Files that cannot be read (e.g. deleted or locked since they were \
+    listed) are left out of the index and kept in 'failed'.
+
+    Parameters:
+    -----------
+    - algorithm: str, optional
+        The name of the hash algorithm (one of 'HASH_ALGORITHMS'). Default is 'md5'.
+    """
+    def __init__(self, algorithm: str='md5'):
+        self.algorithm = algorithm
+        self.by_size = defaultdict(list)
+        self.by_partial = defaultdict(list)
+        self.by_hash = defaultdict(list)
+        self.failed = []
+
+    def add(self, record: dict, size: int):
+        """
+        This method adds a file to the index.
+
+        Parameters:
+        -----------
+        - record: dict
+            A dictionary with a 'filename' key. Records that already have a \
+            'hash' of the whole file (e.g. text documents, hashed while being \
+            extracted) skip the size and partial hash steps. Partial and full \
+            hashes already known (e.g. from the cache) can be given in the \
+            'partial_hash' and 'full_hash' keys, and newly calculated ones are \
+            stored there.
+        - size: int
+            The size of the file in bytes.
+
+        Returns:
+        --------
+        - duplicates: list[dict] or None
+            The records of every file identical to this one, itself included, \
+            or None if it has no duplicate so far.
+        """
+        if 'hash' in record:
+            return self.add_hashed(record, record['hash'])
+        group = self.by_size[size]
+        group.append(record)
+        if len(group) == 1:
+            return None
+        if len(group) == 2:
+            self.add_partial(group[0], size)
+        return self.add_partial(record, size)
+
+    def add_partial(self, record: dict, size: int):
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            # The partial hash would read the whole file anyway
+            return self.add_full(record)
+        if not self.read(record, 'partial_hash', partial_hash, size, self.algorithm):
+            return None
+        group = self.by_partial[(size, record['partial_hash'])]
+        group.append(record)
+        if len(group) == 1:
+            return None
+        if len(group) == 2:
+            self.add_full(group[0])
+        return self.add_full(record)
+
+    def add_full(self, record: dict):
+        if not self.read(record, 'full_hash', hash_file, self.algorithm):
+            return None
+        return self.add_hashed(record, record['full_hash'])
+
+    def add_hashed(self, record: dict, hash: str):
+        record['hash'] = hash
+        group = self.by_hash[hash]
+        group.append(record)
+        return group if len(group) > 1 else None
+
+    def read(self, record: dict, key: str, function, *args):
+        """
+        This method stores 'function(filename, *args)' in 'record[key]' if it \
+        is not known yet, and tells whether the file could be read.
+        """
+        if key not in record:
+            try:
+                record[key] = function(record['filename'], *args)
+            except OSError as error:
+                self.failed.append((record, error))
+                return False
+        return True
+
+    def finalize(self):
+        """
+        This method fills the 'dedup_key' of every record that could be \
+        read: two records have the same key only if their files are \
+        identical. It is the 'hash' of the files that were read in full, and \
+        a key made of the size and partial hash of the others, which are \
+        left without a 'hash'. 'files.remove_duplicates' can then group \
+        every file by its key, while only real hashes are compared with \
+        files outside of the index.
+        """
+        for hash, group in self.by_hash.items():
+            for record in group:
+                record['dedup_key'] = hash
+        for (size, partial), group in self.by_partial.items():
+            if len(group) == 1:
+                group[0]['dedup_key'] = f'partial:{size}:{partial}'
+        for size, group in self.by_size.items():
+            if len(group) == 1:
+                group[0]['dedup_key'] = f'size:{size}'
@@ -0,0 +1,79 @@
+import sqlite3
+from time import time
+from walker import FileEntry
+
+
+def load_manifest(connection: sqlite3.Connection):
+    """
+    This function loads the manifest of the previous scan of a folder, which \
+    lists every file that was found and its stat information at that time.
+
+    Parameters:
+    -----------
+    - connection: sqlite3.Connection
+        A connection returned by 'cache.open_cache'.
+
+    Returns:
+    --------
+    - manifest: dict
+        A dictionary mapping each file name to its FileEntry. It is empty if \
+        the folder was never scanned.
+    - scanned_at: float or None
+        The time of the previous scan, in seconds since the epoch.
+    """
+    create_manifest_tables(connection)
+    manifest = {
+        path: FileEntry(path, size, mtime_ns, inode)
+        for path, size, mtime_ns, inode in connection.execute('SELECT path, size, mtime_ns, inode FROM manifest')
+    }
+    row = connection.execute("SELECT value FROM manifest_info WHERE key = 'scanned_at'").fetchone()
+    return manifest, row[0] if row else None
+
+
+def save_manifest(connection: sqlite3.Connection, files: list[FileEntry]):
+    """
+    This function replaces the manifest of a folder with the files of the \
+    current scan.
+    """
+    create_manifest_tables(connection)
+    connection.execute('DELETE FROM manifest')
+    connection.executemany('INSERT INTO manifest VALUES (?, ?, ?, ?)', files)
+    connection.execute("INSERT OR REPLACE INTO manifest_info VALUES ('scanned_at', ?)", (time(),))
+    connection.commit()
+
+
+def diff_manifest(manifest: dict, files: list[FileEntry]):
+    """
+    This function compares the files of the current scan with the manifest \
+    of the previous one.
+
+    Parameters:
+    -----------
+    - manifest: dict
+        A dictionary mapping each file name to its FileEntry, as returned by 'load_manifest'.
+    - files: list[FileEntry]
+        The files found by the current scan.
+
+    Returns:
+    --------
+    - changes: dict
+        A dictionary with the 'added', 'modified' and 'deleted' lists of file \
+        names. A file is modified if its size, modification time or inode changed.
+    """
+    current = {entry.path: entry for entry in files}
+    return {
+        'added': [path for path in current if path not in manifest],
+        'modified': [path for path, entry in current.items() if path in manifest and manifest[path] != entry],
+        'deleted': [path for path in manifest if path not in current]
+    }
+
+
+def create_manifest_tables(connection: sqlite3.Connection):
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS manifest (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER
+        )""")
+    connection.execute('CREATE TABLE IF NOT EXISTS manifest_info (key TEXT PRIMARY KEY, value)')
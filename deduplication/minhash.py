@@ -0,0 +1,170 @@
+import re
+import zlib
+import base64
+import numpy as np
+from collections import defaultdict
+from graph import label_components
+
+# Number of hash functions of a signature, and words per shingle
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+MERSENNE_PRIME = (1 << 61) - 1
+# Shingles hashed at once, to bound the memory used by long documents
+BLOCK_SIZE = 4096
+
+# The same hash functions must be used in every process and every scan
+_random = np.random.RandomState(1)
+PERMUTATIONS_A = _random.randint(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+PERMUTATIONS_B = _random.randint(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+
+def get_signature(text: str):
+    """
+    This function calculates the MinHash signature of a document over its \
+    shingles of 'SHINGLE_SIZE' consecutive words. The share of equal values \
+    in the signatures of two documents estimates the Jaccard similarity of \
+    their sets of shingles.
+
+    Parameters:
+    -----------
+    - text: str
+        The text of the document.
+
+    Returns:
+    --------
+    - signature: str or None
+        The 'NUM_PERM' 32-bit values of the signature, base64 encoded so it \
+        can be stored with the rest of the extracted data. None if the \
+        document has no words.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    size = min(SHINGLE_SIZE, len(words))
+    hashes = np.fromiter(
+        {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)},
+        dtype=np.uint64)
+
+    signature = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(hashes), BLOCK_SIZE):
+        block = hashes[start:start + BLOCK_SIZE, np.newaxis]
+        values = (block * PERMUTATIONS_A + PERMUTATIONS_B) % MERSENNE_PRIME & 0xFFFFFFFF
+        signature = np.minimum(signature, values.min(axis=0))
+    return base64.b64encode(signature.astype('<u4').tobytes()).decode('ascii')
+
+
+def signature_matrix(signatures):
+    """
+    This function decodes the signatures returned by 'get_signature'.
+
+    Returns:
+    --------
+    - matrix: np.ndarray
+        One row of 'NUM_PERM' values per signature, zeros for missing ones.
+    - valid: np.ndarray
+        A boolean array telling which rows have a signature.
+    """
+    signatures = list(signatures)
+    matrix = np.zeros((len(signatures), NUM_PERM), dtype=np.uint32)
+    valid = np.zeros(len(signatures), dtype=bool)
+    for i, signature in enumerate(signatures):
+        if isinstance(signature, str):
+            matrix[i] = np.frombuffer(base64.b64decode(signature), dtype='<u4')
+            valid[i] = True
+    return matrix, valid
+
+
+def jaccard_threshold(sensitivity: float):
+    """
+    This function converts a sensitivity into the estimated Jaccard \
+    similarity two documents need to be linked. A sensitivity of 0.5 links \
+    documents sharing half of their shingles.
+    """
+    return max(1 - sensitivity, 0.05)
+
+
+def choose_bands(threshold: float, num_perm: int=NUM_PERM, recall: float=0.95):
+    """
+    This function chooses how to split signatures into bands for LSH. Two \
+    documents become candidates when all the rows of any band are equal, \
+    which happens with probability '1 - (1 - s^rows)^bands' for a Jaccard \
+    similarity 's'. The most rows per band (the fewest false candidates) \
+    are chosen such that documents at the threshold are still found with \
+    probability 'recall'.
+
+    Returns:
+    --------
+    - (bands, rows): tuple[int]
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+def near_duplicate_pairs(matrix: np.ndarray, valid: np.ndarray, threshold: float):
+    """
+    This function finds the pairs of documents whose estimated Jaccard \
+    similarity is at least 'threshold'. Candidate pairs come from a banded \
+    LSH index, so the work grows with the number of documents and candidates \
+    rather than with the number of pairs of documents.
+
+    Parameters:
+    -----------
+    - matrix: np.ndarray
+        The signatures returned by 'signature_matrix'.
+    - valid: np.ndarray
+        Which rows of 'matrix' have a signature.
+    - threshold: float
+        The smallest estimated Jaccard similarity kept.
+
+    Returns:
+    --------
+    - (first, second, similarities): tuple[np.ndarray]
+        The row indices of each pair and their estimated Jaccard similarity, \
+        each pair listed once.
+    """
+    bands, rows = choose_bands(threshold, matrix.shape[1])
+    documents = np.flatnonzero(valid)
+    candidates = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i in documents:
+            buckets[matrix[i, band * rows:(band + 1) * rows].tobytes()].append(i)
+        for bucket in buckets.values():
+            for a in range(len(bucket)):
+                for b in range(a + 1, len(bucket)):
+                    candidates.add((bucket[a], bucket[b]))
+
+    if not candidates:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    first, second = np.array(sorted(candidates), dtype=np.int64).T
+    similarities = (matrix[first] == matrix[second]).mean(axis=1)
+    keep = similarities >= threshold
+    return first[keep], second[keep], similarities[keep]
+
+
+def cluster_near_duplicates(signatures, sensitivity: float):
+    """
+    This function groups documents into clusters of near-duplicates, linking \
+    documents whose estimated Jaccard similarity is at least \
+    'jaccard_threshold(sensitivity)'.
+
+    Parameters:
+    -----------
+    - signatures: iterable[str or None]
+        The signature of each document, as returned by 'get_signature'.
+    - sensitivity: float
+        The sensitivity chosen by the user, from 0 to 1.
+
+    Returns:
+    --------
+    - nodes: np.ndarray
+        The cluster label of each document, -1 for documents without neighbors.
+    """
+    matrix, valid = signature_matrix(signatures)
+    threshold = jaccard_threshold(sensitivity)
+    first, second, similarities = near_duplicate_pairs(matrix, valid, threshold)
+    return label_components(len(matrix), first, second, similarities, threshold)
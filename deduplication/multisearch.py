@@ -0,0 +1,189 @@
+import re
+from collections import deque
+
+# Above these numbers of terms, a single pass of the automaton is faster
+# than the regular expression of all the terms, whose cost grows with each
+# term (and about four times faster without case)
+MAX_REGEX_TERMS = 100
+MAX_REGEX_TERMS_IGNORECASE = 20
+# Characters that 're.IGNORECASE' also treats as the same letter once
+# lowercased, each folded to the first character of its group
+CASE_EQUIVALENTS = str.maketrans({character: group[0] for group in [
+    'i\u0131', 's\u017f', '\u00b5\u03bc', '\u0345\u03b9\u1fbe', '\u0390\u1fd3', '\u03b0\u1fe3',
+    '\u03b2\u03d0', '\u03b5\u03f5', '\u03b8\u03d1', '\u03ba\u03f0', '\u03c0\u03d6', '\u03c1\u03f1',
+    '\u03c2\u03c3', '\u03c6\u03d5', '\u0432\u1c80', '\u0434\u1c81', '\u043e\u1c82', '\u0441\u1c83',
+    '\u0442\u1c84\u1c85', '\u044a\u1c86', '\u0463\u1c87', '\u1c88\ua64b', '\u1e61\u1e9b', '\ufb05\ufb06',
+] for character in group[1:]})
+
+
+def fold_case(text: str):
+    """
+    This function folds the case of a text without changing its length, so \
+    offsets found in the folded text are offsets in the original one. Two \
+    characters fold to the same one exactly when 're.IGNORECASE' matches \
+    them, so terms are found as the search of a single query finds them. \
+    The only character whose lowercase form is longer keeps its first character.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = ''.join(character.lower()[0] for character in text)
+    return lowered.translate(CASE_EQUIVALENTS)
+
+
+def is_word_character(character: str):
+    return character.isalnum() or character == '_'
+
+
+class TermMatcher:
+    """
+    This class finds every occurrence of many terms in a text in a single \
+    pass over the text, instead of one pass per term.
+
+    A few terms are looked for with a single regular expression, the \
+    alternation of the terms from the longest, inside a lookahead so an \
+    occurrence never hides the occurrences of other terms overlapping it.
+
+    Many terms are looked for with an automaton (Aho-Corasick), whose speed \
+    does not depend on the number of terms. The terms are stored in a trie \
+    of their characters. Each state also has a failure link to the longest \
+    suffix of its prefix that is a prefix of another term, so the scan never \
+    goes back in the text. The transitions that follow failure links are \
+    resolved the first time they are used and kept, so the automaton \
+    becomes a plain lookup table for the characters the texts actually contain.
+
+    Parameters:
+    -----------
+    - terms: list[str]
+        The terms to look for. Empty and repeated terms are ignored.
+    - case_sensitive: bool, optional
+        Whether the case of the terms must match. Default is True.
+    - exact_word: bool, optional
+        Whether the terms must match whole words, like the regular \
+        expression '\\bterm\\b'. Default is True.
+    """
+    def __init__(self, terms: list[str], case_sensitive: bool=True, exact_word: bool=True):
+        self.terms = list(dict.fromkeys(term for term in terms if term))
+        self.case_sensitive = case_sensitive
+        self.exact_word = exact_word
+        self.keys = [term if case_sensitive else fold_case(term) for term in self.terms]
+        self.pattern = None
+        if len(self.terms) <= (MAX_REGEX_TERMS if case_sensitive else MAX_REGEX_TERMS_IGNORECASE):
+            self.build_pattern()
+        else:
+            self.build_automaton()
+
+    def build_pattern(self):
+        alternatives = '|'.join(re.escape(term) for term in sorted(self.terms, key=len, reverse=True))
+        if self.exact_word:
+            alternatives = r'\b(?:' + alternatives + r')\b'
+        self.pattern = re.compile('(?=(' + alternatives + '))', 0 if self.case_sensitive else re.IGNORECASE)
+        # The regular expression only reports the longest term found at a
+        # position, the others found there are the terms it starts with
+        numbers = {}
+        for number, key in enumerate(self.keys):
+            numbers.setdefault(key, []).append(number)
+        self.prefixes = {key: [(len(other), numbers[other]) for other in numbers if key.startswith(other)] for key in numbers}
+
+    def build_automaton(self):
+        self.goto = [{}]
+        self.fail = [0]
+        # Terms ending at each state, including the ones reached through failure links
+        self.output = [[]]
+        for number, key in enumerate(self.keys):
+            state = 0
+            for character in key:
+                if character not in self.goto[state]:
+                    self.goto[state][character] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = self.goto[state][character]
+            self.output[state].append(number)
+
+        # Breadth first, so the failure link of a state is known before its children's
+        self.trie = [dict(transitions) for transitions in self.goto]
+        queue = deque(self.trie[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, child in self.trie[state].items():
+                queue.append(child)
+                if state != 0:
+                    link = self.fail[state]
+                    while link and character not in self.trie[link]:
+                        link = self.fail[link]
+                    self.fail[child] = self.trie[link].get(character, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def step(self, state: int, character: str):
+        following = self.goto[state].get(character)
+        if following is None:
+            link = state
+            while link and character not in self.trie[link]:
+                link = self.fail[link]
+            following = self.trie[link].get(character, 0)
+            self.goto[state][character] = following
+        return following
+
+    def find(self, text: str):
+        """
+        This method finds the occurrences of the terms in a text. Like \
+        're.finditer', the occurrences of the same term never overlap.
+
+        Returns:
+        --------
+        - matches: dict
+            A dictionary mapping the position in 'terms' of each term found \
+            to the start offsets of its occurrences, in the order of the text.
+        """
+        if not self.terms:
+            return {}
+        if self.pattern is not None:
+            return self.find_with_pattern(text)
+        scanned = text if self.case_sensitive else fold_case(text)
+        lengths = [len(term) for term in self.terms]
+        matches = {}
+        ends = {}
+        state = 0
+        goto, output = self.goto, self.output
+        for position, character in enumerate(scanned):
+            following = goto[state].get(character)
+            state = following if following is not None else self.step(state, character)
+            if not output[state]:
+                continue
+            end = position + 1
+            for number in output[state]:
+                start = end - lengths[number]
+                if start < ends.get(number, 0):
+                    continue
+                if self.exact_word and not (is_boundary(text, start) and is_boundary(text, end)):
+                    continue
+                matches.setdefault(number, []).append(start)
+                ends[number] = end
+        return matches
+
+    def find_with_pattern(self, text: str):
+        matches = {}
+        ends = {}
+        for match in self.pattern.finditer(text):
+            start = match.start()
+            found = match.group(1)
+            key = found if self.case_sensitive else fold_case(found)
+            for length, numbers in self.prefixes[key]:
+                end = start + length
+                if self.exact_word and length < len(key) and not is_boundary(text, end):
+                    continue
+                for number in numbers:
+                    if start < ends.get(number, 0):
+                        continue
+                    matches.setdefault(number, []).append(start)
+                    ends[number] = end
+        return matches
+
+
+def is_boundary(text: str, position: int):
+    """
+    This function tells whether there is a word boundary ('\\b') at a position of a text.
+    """
+    before = position > 0 and is_word_character(text[position - 1])
+    after = position < len(text) and is_word_character(text[position])
+    return before != after
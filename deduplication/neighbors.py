@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import scipy
+from features import vectorize_query
+
+
+class NeighborIndex:
+    """
+    This class finds the documents of a corpus most similar to any other \
+    document, without clustering the corpus again.
+
+    The normalized document vectors are kept transposed, one row per \
+    n-gram listing the documents it appears in, so a query only touches the \
+    rows of its own n-grams. The cosine similarities come from a single \
+    sparse product and the best ones are picked without sorting them all.
+
+    Parameters:
+    -----------
+    - vector: scipy.sparse._csr.csr_matrix
+        The normalized document vectors returned by 'load_document_vectors'.
+    - filenames: list[str]
+        The file name of each row of 'vector'.
+    - settings: dict, optional
+        The feature settings the vectors were computed with (see 'vectorize_documents').
+    - vocabulary: dict, optional
+        The column of each n-gram, required by the 'vocabulary' backend. It \
+        must be the one returned with 'vector'.
+    """
+    def __init__(self, vector: scipy.sparse._csr.csr_matrix, filenames: list[str], settings: dict=None, vocabulary: dict=None):
+        self.postings = vector.T.tocsr()
+        self.filenames = list(filenames)
+        self.settings = settings
+        self.vocabulary = vocabulary
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def scores(self, text: str):
+        """
+        This method returns the cosine similarity of 'text' with every \
+        document of the index, as a dense array.
+        """
+        query = vectorize_query(text, self.settings, self.vocabulary)
+        if query.shape[1] != self.postings.shape[0]:
+            raise ValueError('The query was vectorized in a different feature space than the index.')
+        scores = np.zeros(len(self.filenames))
+        product = (query @ self.postings).tocoo()
+        # Rounding can put identical documents slightly above 1
+        scores[product.col] = np.minimum(product.data, 1)
+        return scores
+
+    def query(self, text: str, k: int=10, exclude: str=None):
+        """
+        This method finds the 'k' documents most similar to 'text'.
+
+        Parameters:
+        -----------
+        - text: str
+            The text of the query document.
+        - k: int, optional
+            The number of documents returned. Default is 10.
+        - exclude: str, optional
+            A file name left out of the results, e.g. the query document \
+            itself when it is part of the corpus.
+
+        Returns:
+        --------
+        - neighbors: pd.DataFrame
+            The 'filename' and cosine 'similarity' of the most similar \
+            documents, sorted from the most similar. Documents that share no \
+            n-gram with the query are left out.
+        """
+        scores = self.scores(text)
+        if exclude is not None:
+            scores[[i for i, filename in enumerate(self.filenames) if filename == exclude]] = 0
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.int64)
+        best = best[np.argsort(-scores[best], kind='stable')]
+        best = best[scores[best] > 0]
+        return pd.DataFrame({
+            'filename': [self.filenames[i] for i in best],
+            'similarity': scores[best]
+        })
+
+    def pairs(self, texts, min_similarity: float, chunk_size: int=256):
+        """
+        This method finds every pair of a query document and an indexed \
+        document whose cosine similarity is at least 'min_similarity'. \
+        Queries are vectorized and multiplied against the index a chunk at \
+        a time, so no pair of indexed documents is ever compared.
+
+        Parameters:
+        -----------
+        - texts: iterable[str]
+            The text of each query document.
+        - min_similarity: float
+            The smallest cosine similarity kept.
+        - chunk_size: int, optional
+            The number of queries multiplied at once. Default is 256.
+
+        Returns:
+        --------
+        - (first, second, similarities): tuple[np.ndarray]
+            The position of the query in 'texts', the row of the indexed \
+            document and their cosine similarity.
+        """
+        first, second, similarities = [], [], []
+        chunk, offset = [], 0
+
+        def flush():
+            block = (scipy.sparse.vstack(chunk).tocsr() @ self.postings).tocoo()
+            keep = block.data >= min_similarity
+            first.append(block.row[keep].astype(np.int64) + offset)
+            second.append(block.col[keep].astype(np.int64))
+            similarities.append(np.minimum(block.data[keep], 1))
+
+        for text in texts:
+            chunk.append(vectorize_query(text, self.settings, self.vocabulary))
+            if len(chunk) == chunk_size:
+                flush()
+                chunk, offset = [], offset + chunk_size
+        if chunk:
+            flush()
+        if not first:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+        return np.concatenate(first), np.concatenate(second), np.concatenate(similarities)
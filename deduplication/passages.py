@@ -0,0 +1,207 @@
+import re
+import zlib
+import numpy as np
+import pandas as pd
+import scipy
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Words per shingle, and consecutive shingles per winnowing window. A passage
+# shared by two documents is always found once it is at least
+# SHINGLE_SIZE + WINDOW_SIZE - 1 words long.
+SHINGLE_SIZE = 5
+WINDOW_SIZE = 4
+# Fingerprints found in more documents than this are boilerplate (headers,
+# disclaimers...) and are not used to link documents
+MAX_DOCUMENT_FREQUENCY = 50
+
+
+def hash_shingles(words: list[str], table: dict=None):
+    """
+    This function hashes every shingle of 'SHINGLE_SIZE' consecutive words \
+    (fewer for shorter documents). Each distinct word is hashed once and \
+    the hashes of a shingle are combined with numpy, instead of hashing the \
+    text of every shingle. 'table' keeps the hash of the words already seen \
+    across calls.
+    """
+    table = {} if table is None else table
+    for word in set(words).difference(table):
+        table[word] = zlib.crc32(word.lower().encode('utf-8', errors='surrogatepass'))
+    hashes = np.fromiter(map(table.__getitem__, words), dtype=np.uint64, count=len(words))
+    size = min(SHINGLE_SIZE, len(words))
+    shingles = np.zeros(len(words) - size + 1, dtype=np.uint64)
+    for i in range(size):
+        shingles = shingles * np.uint64(0x100000001B3) + hashes[i:len(hashes) - size + 1 + i]
+    # Mix the bits so the smallest hashes are spread evenly over the text
+    shingles ^= shingles >> np.uint64(33)
+    shingles *= np.uint64(0xFF51AFD7ED558CCD)
+    shingles ^= shingles >> np.uint64(33)
+    return shingles
+
+
+def winnow(hashes: np.ndarray):
+    """
+    This function returns the positions of the rightmost smallest hash of \
+    every window of 'WINDOW_SIZE' consecutive hashes, each position once.
+    """
+    if len(hashes) <= WINDOW_SIZE:
+        return np.array([len(hashes) - 1 - np.argmin(hashes[::-1])])
+    windows = sliding_window_view(hashes, WINDOW_SIZE)
+    positions = np.arange(len(windows)) + WINDOW_SIZE - 1 - np.argmin(windows[:, ::-1], axis=1)
+    return np.unique(positions)
+
+
+def get_fingerprints(text: str, table: dict=None):
+    """
+    This function selects the winnowed fingerprints of a document. Each \
+    shingle of 'SHINGLE_SIZE' consecutive words is hashed, and the smallest \
+    hash of every window of 'WINDOW_SIZE' consecutive shingles is kept, so \
+    documents sharing a passage share its fingerprints wherever the passage is.
+
+    Parameters:
+    -----------
+    - text: str
+        The text of the document.
+    - table: dict, optional
+        The hash of the words already seen, shared by the documents of a corpus.
+
+    Returns:
+    --------
+    - hashes: np.ndarray
+        The hash of each fingerprint, in the order of the text.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return np.empty(0, np.uint64)
+    hashes = hash_shingles(words, table)
+    return hashes[winnow(hashes)]
+
+
+def locate_fingerprints(text: str):
+    """
+    This function selects the same fingerprints as 'get_fingerprints' along \
+    with where they are in the text. It is only used on the documents whose \
+    shared passages are shown, as finding the offsets of every word is slower.
+
+    Returns:
+    --------
+    - (hashes, starts, ends): tuple[np.ndarray]
+        The hash of each fingerprint and the character offsets in 'text' \
+        where its shingle starts and ends.
+    """
+    matches = list(re.finditer(r'\w+', text))
+    if not matches:
+        return np.empty(0, np.uint64), np.empty(0, np.int64), np.empty(0, np.int64)
+    hashes = hash_shingles([match.group() for match in matches])
+    positions = winnow(hashes)
+    size = min(SHINGLE_SIZE, len(matches))
+    starts = np.array([matches[i].start() for i in positions], dtype=np.int64)
+    ends = np.array([matches[i + size - 1].end() for i in positions], dtype=np.int64)
+    return hashes[positions], starts, ends
+
+
+def merge_spans(starts: np.ndarray, ends: np.ndarray):
+    """
+    This function merges overlapping character spans into passages.
+
+    Returns:
+    --------
+    - passages: list[tuple[int]]
+        The (start, end) offsets of each passage, in the order of the text.
+    """
+    passages = []
+    for start, end in sorted(zip(starts.tolist(), ends.tolist())):
+        if passages and start <= passages[-1][1]:
+            passages[-1][1] = max(passages[-1][1], end)
+        else:
+            passages.append([start, end])
+    return [tuple(passage) for passage in passages]
+
+
+class PassageIndex:
+    """
+    This class finds documents that contain part of other documents, e.g. \
+    a short document pasted into a long one, which whole-document \
+    similarity misses.
+
+    The winnowed fingerprints of every document are stored in an inverted \
+    index, a sparse matrix with one column per fingerprint. Pairs of \
+    documents are only counted through the fingerprints they share, so the \
+    work grows with the total length of the documents and the number of \
+    shared fingerprints, not with the number of pairs of documents.
+
+    Parameters:
+    -----------
+    - texts: iterable[str]
+        The text of each document.
+    - max_document_frequency: int, optional
+        Fingerprints found in more documents are ignored. Default is \
+        'MAX_DOCUMENT_FREQUENCY'.
+    """
+    def __init__(self, texts, max_document_frequency: int=MAX_DOCUMENT_FREQUENCY):
+        table = {}
+        hashes = [get_fingerprints(text, table) for text in texts]
+        lengths = [len(document) for document in hashes]
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        values, columns = np.unique(np.concatenate(hashes) if hashes else np.empty(0, np.uint64), return_inverse=True)
+        matrix = scipy.sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.int32), (rows, columns)), shape=(len(lengths), len(values)))
+        matrix.data[:] = 1  # A fingerprint repeated in a document counts once
+        self.sizes = np.diff(matrix.indptr)
+        frequencies = np.bincount(matrix.indices, minlength=matrix.shape[1])
+        matrix = matrix[:, np.flatnonzero(frequencies <= max_document_frequency)].tocsr()
+        # Number of fingerprints each pair of documents shares
+        self.shared = (matrix @ matrix.T).tocoo()
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def overlaps(self, min_containment: float):
+        """
+        This method finds the pairs of documents where one contains at \
+        least 'min_containment' of the other.
+
+        Returns:
+        --------
+        - overlaps: pd.DataFrame
+            The row of the 'container' document, the row of the 'contained' \
+            document, the number of 'shared' fingerprints and the share of \
+            the fingerprints of the contained document found in the \
+            container ('containment'), from the largest containment.
+        """
+        keep = self.shared.row != self.shared.col
+        container, contained, counts = self.shared.row[keep], self.shared.col[keep], self.shared.data[keep]
+        containment = counts / np.maximum(self.sizes[contained], 1)
+        keep = containment >= min_containment
+        overlaps = pd.DataFrame({
+            'container': container[keep].astype(np.int64),
+            'contained': contained[keep].astype(np.int64),
+            'shared': counts[keep],
+            'containment': containment[keep]
+        })
+        return overlaps.sort_values(['containment', 'shared'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+def shared_passages(container: str, contained: str):
+    """
+    This function locates the passages two documents share, e.g. a pair \
+    found by 'PassageIndex.overlaps'. Passages are made of the shingles of \
+    the shared fingerprints, so their first and last few words can be left out.
+
+    Parameters:
+    -----------
+    - container: str
+        The text of the document containing the passages.
+    - contained: str
+        The text of the other document.
+
+    Returns:
+    --------
+    - (container_passages, contained_passages): tuple[list[tuple[int]]]
+        The (start, end) character offsets of the shared passages in each text.
+    """
+    container_hashes, container_starts, container_ends = locate_fingerprints(container)
+    contained_hashes, contained_starts, contained_ends = locate_fingerprints(contained)
+    in_container = np.isin(container_hashes, contained_hashes)
+    in_contained = np.isin(contained_hashes, container_hashes)
+    return (merge_spans(container_starts[in_container], container_ends[in_container]),
+            merge_spans(contained_starts[in_contained], contained_ends[in_contained]))
@@ -1,120 +1,127 @@
 import streamlit as st
 import re
+import os
 import pandas as pd
-from files import open_file_with_default_app, open_file_with_explorer
+from files import open_file_with_default_app, open_file_with_explorer, get_data
+from extraction import drop_skipped
+from features import corpus_digest
+from graph import similarity_threshold
+from walker import walk_files
+from compare import compare_folders
+from textindex import PositionalIndex, load_search_index, tokenize
+from fuzzy import TrigramIndex, fuzzy_candidates, variants_pattern
+from multisearch import TermMatcher
+import numpy as np
+from clustering import get_neighbor_index
+from textstore import TextStore
 
-@st.cache_data
-def find_occurences(text: str, query: str, case_sensitive: bool=True, exact_word: bool=True):
+def query_pattern(query: str, case_sensitive: bool=True, exact_word: bool=True):
     """
-    This function takes in a text, a query, and optional parameters for \
-    case sensitivity and exact word matching. It finds occurrences of \
-    the query in the text and extracts excerpts around each occurrence.
+    This function compiles the regular expression of a search query.
+    """
+    pattern = re.escape(query)
+    if exact_word:
+        pattern = r"\b" + pattern + r"\b"
+    return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
 
-    Parameters:
-    -----------
-    - text: str
-        The text to search for occurrences of the query.
-    - query: str
-        The query to search for in the text.
-    - case_sensitive: bool, optional
-        Determines whether the search is case sensitive or not. Default is True.
-    - exact_word: bool, optional
-        Determines whether the query should match whole words only. Default is True.
+
+def excerpt_windows(matches: list[tuple[int]], text_length: int, max_excerpt_length: int=1000):
+    """
+    This function groups the matches of a text into the windows of the \
+    excerpts showing them: each excerpt starts around the first match not \
+    shown yet, and shows every match it contains.
 
     Returns:
     --------
-    - excerpts: list
-        A list of excerpts extracted from the text. Each excerpt contains \
-        the original text with the matched query highlighted using HTML tags.
-    """
-    excerpts = []
-    query_length = len(query)
-    max_excerpt_length = 1000
-
-    # Apply case sensitivity based on the setting
-    if not case_sensitive:
-        processed_text = text.lower()
-        query = query.lower()
-    else:
-        processed_text = text
-
-    # Build the regular expression pattern
-    if exact_word:
-        pattern = r"\b" + re.escape(query) + r"\b"
-    else:
-        pattern = re.escape(query)
-
-    # Find the indices of the matches in the text
-    match_indices = [m.start() for m in re.finditer(pattern, processed_text, re.IGNORECASE if not case_sensitive else 0)]
-
-    # Extract excerpts around each match index
-    last_end_index = 0
-    for index in match_indices:
-        # Check if the current index is within the previous excerpt
-        if index < last_end_index:
+    - windows: list[tuple]
+        The (start, end) offsets of each excerpt and the matches inside it.
+    """
+    windows = []
+    for start, end in matches:
+        if windows and start < windows[-1][1]:
+            windows[-1][2].append((start, min(end, windows[-1][1])))
             continue
+        windows.append((max(0, start - max_excerpt_length // 2),
+                        min(text_length, end + max_excerpt_length // 2),
+                        [(start, end)]))
+    return windows
 
-        # Extract fixed length excerpts
-        start_index = max(0, index - max_excerpt_length // 2)
-        end_index = min(len(text), index + query_length + max_excerpt_length // 2)
 
-        # Update the last_end_index value
-        last_end_index = end_index
+def render_excerpt(text: str, window: tuple):
+    """
+    This function highlights the matches of an excerpt window with HTML tags.
+    """
+    start, end, matches = window
+    parts, position = [], start
+    for match_start, match_end in matches:
+        parts.append(text[position:match_start])
+        parts.append(f"<span style='background-color: yellow'>{text[match_start:match_end]}</span>")
+        position = match_end
+    parts.append(text[position:end])
+    return ''.join(parts)
 
-        # Include the original text (with case sensitivity) in the excerpt
-        original_text = text[start_index:end_index]
 
-        # Wrap the matched text in an HTML tag
-        highlighted_excerpt = re.sub(pattern, r"<span style='background-color: yellow'>\g<0></span>", original_text, flags=re.IGNORECASE if not case_sensitive else 0)
-        excerpts.append(highlighted_excerpt)
+@st.cache_data(max_entries=16, show_spinner='Searching...')
+def rank_documents(digest, pattern, flags, _text_data, _texts, _rows=None):
+    """
+    This function counts the matches of a regular expression (its 'pattern' \
+    and 'flags') in each document, without building excerpts, and ranks the \
+    documents from the most matches. Only the 'rows' of '_text_data' are \
+    searched if given. The ranking is kept for the corpus 'digest', so \
+    changing page does not search again.
 
-    return excerpts
+    Returns:
+    --------
+    - ranking: pd.DataFrame
+        The 'filename', 'doc_id' and number of 'hits' of each matching document.
+    """
+    text_data = _text_data if _rows is None else _text_data.iloc[_rows]
+    pattern = re.compile(pattern, flags)
+    hits = [sum(1 for _ in pattern.finditer(text)) for text in _texts.texts(text_data['doc_id'])]
+    ranking = pd.DataFrame({'filename': text_data['filename'].to_numpy(), 'doc_id': text_data['doc_id'].to_numpy(), 'hits': hits})
+    ranking = ranking[ranking['hits'] > 0]
+    return ranking.sort_values('hits', ascending=False, kind='stable').reset_index(drop=True)
 
 
-def chunk_text(text: str, max_length: int=1000):
+@st.cache_data(max_entries=16, show_spinner='Searching...')
+def find_terms(digest, terms, case_sensitive, exact_word, _text_data, _texts, _rows=None):
     """
-    This function takes in a string containing text and splits it into \
-    chunks, where each chunk has a maximum length specified by the \
-    'max_length' parameter.
-
-    Parameters:
-    -----------
-    - text: str
-        The input text to be split into chunks.
-    - max_length: int, optional
-        The maximum length of each chunk. Defaults to 1000.
+    This function finds the occurrences of a list of terms in each document \
+    (see 'multisearch.TermMatcher') and ranks the documents from the most \
+    occurrences. Only the 'rows' of '_text_data' are searched if given. \
+    The results are kept for the corpus 'digest' and 'terms', so changing \
+    page or opening a document does not search again.
 
     Returns:
     --------
-    - split_paragraphs: list[str]
-        A list of strings, where each string is a chunk of the input text.
-    """
-    split_paragraphs = []
-    for paragraph in text.split("\n"):
-        if paragraph in [" \r", "\r", ""]: continue
-        # Split the paragraph until no parts are larger than the max length
-        first_section = True
-        while len(paragraph) > max_length:
-            split_index = paragraph.find('.\n', max_length)
-            # If there's no '.\n' after the max length, check for the next instance of '.['
-            if split_index == -1:
-                split_index = paragraph.find('.[', max_length)
-                # If there's no instance of '.[' after the max length, just split at the max length
-                if split_index == -1:
-                    split_index = max_length
-            split_paragraph = paragraph[:split_index]
-            # Indicate where strings were split with '(...)'
-            if not first_section:
-                split_paragraph = '(...)' + split_paragraph
-            split_paragraph = split_paragraph + '(...)'
-            split_paragraphs.append(split_paragraph)
-            paragraph = paragraph[split_index:]
-            first_section = False
-        split_paragraphs.append(paragraph)
-    return split_paragraphs
-
-
-def exact_search(text_data: pd.DataFrame, query: str, directory: str, case_sensitive: bool, exact_word: bool):
+    - results: list[tuple]
+        The filename, 'doc_id' and the start offsets of the occurrences of \
+        each term found (see 'TermMatcher.find') of each matching document.
+    """
+    text_data = _text_data if _rows is None else _text_data.iloc[_rows]
+    matcher = TermMatcher(list(terms), case_sensitive, exact_word)
+    results = []
+    for filename, doc_id, text in zip(text_data['filename'], text_data['doc_id'], _texts.texts(text_data['doc_id'])):
+        matches = matcher.find(text)
+        if matches:
+            results.append((filename, doc_id, matches))
+    results.sort(key=lambda result: -sum(len(starts) for starts in result[2].values()))
+    return results
+
+
+def paginate(count: int, page_size: int, key: str, label: str='Page'):
+    """
+    This function displays a page selector when 'count' items do not fit \
+    in one page, and returns the slice of the items of the selected page.
+    """
+    pages = max(1, -(-count // page_size))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f'{label} (of {pages})', min_value=1, max_value=pages, value=1, step=1, key=key)
+    return slice((page - 1) * page_size, page * page_size)
+
+
+def exact_search(text_data: pd.DataFrame, texts: TextStore, query: str, directory: str, case_sensitive: bool, exact_word: bool, index: PositionalIndex=None, page_size: int=20, excerpts_per_page: int=10):
     """
     This function performs an exact search on text data and displays matching results.
 
@@ -122,6 +129,8 @@ def exact_search(text_data: pd.DataFrame, query: str, directory: str, case_sensi
     -----------
     - text_data: pd.DataFrame
         A pandas DataFrame containing text data to be searched.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'text_data'.
     - query: str
         The search query to be matched against the text data.
     - directory: str
@@ -130,16 +139,241 @@ def exact_search(text_data: pd.DataFrame, query: str, directory: str, case_sensi
         A boolean value indicating whether the search should be case sensitive or not.
     - exact_word: bool
         A boolean value indicating whether the search should match exact words or not.
+    - index: PositionalIndex, optional
+        The positional index of the rows of 'text_data'. If given, only the \
+        documents containing the words of the query are searched.
+    - page_size: int, optional
+        The number of documents displayed per page. Default is 20.
+    - excerpts_per_page: int, optional
+        The number of excerpts displayed per page of a document. Default is 10.
+
+    Notes:
+    ------
+    - Documents are ranked by their number of matches, which are only \
+    counted. Excerpts are built for the documents of the displayed page \
+    only, so the page stays light however common the query is.
+    """
+    rows = index.candidates(query, exact_word) if index is not None else None
+    show_ranked_documents(text_data, texts, query_pattern(query, case_sensitive, exact_word), directory, rows, page_size, excerpts_per_page)
+
+
+def show_ranked_documents(text_data: pd.DataFrame, texts: TextStore, pattern: re.Pattern, directory: str, rows: np.ndarray=None, page_size: int=20, excerpts_per_page: int=10):
+    """
+    This function displays the documents matching a regular expression, \
+    from the most matches, one page at a time and with the excerpts of the \
+    displayed documents only. Only the 'rows' of 'text_data' are searched \
+    if given.
+    """
+    ranking = rank_documents(corpus_digest(text_data), pattern.pattern, pattern.flags, text_data, texts, rows)
+    if ranking.empty:
+        st.info("No document matches the query.")
+        return
+    st.write(f"{int(ranking['hits'].sum())} matches in {len(ranking.index)} documents.")
+
+    for file in ranking.iloc[paginate(len(ranking.index), page_size, f"search page {pattern.pattern}")].itertuples():
+        with st.expander(f"{file.filename.replace(directory, '')} ({file.hits} matches)"):
+            col1, col2, col3 = st.columns((1,1,6))
+            if col1.button('Open', key=f"{file.filename} 3", use_container_width=True):
+                open_file_with_default_app(file.filename)
+            if col2.button('Folder', key=f"{file.filename} 4", use_container_width=True):
+                open_file_with_explorer(file.filename)
+            text = texts[file.doc_id]
+            windows = excerpt_windows([match.span() for match in pattern.finditer(text)], len(text))
+            for window in windows[paginate(len(windows), excerpts_per_page, f"{file.filename} excerpts", 'Excerpts page')]:
+                st.divider()
+                st.write(render_excerpt(text, window), unsafe_allow_html=True)
+
+
+def fuzzy_search(text_data: pd.DataFrame, texts: TextStore, query: str, directory: str, max_distance: int, index: PositionalIndex, trigrams: TrigramIndex, page_size: int=20, excerpts_per_page: int=10):
     """
-    text_data['matches'] = text_data['text'].apply(lambda x: find_occurences(x, query, case_sensitive, exact_word))
-    for i, file in text_data.iterrows():
-        if len(file['matches']) > 0:
-            with st.expander(file['filename'].replace(directory, '')):
-                col1, col2, col3 = st.columns((1,1,6))
-                if col1.button('Open', key=f"{file['filename']} 3", use_container_width=True):
-                    open_file_with_default_app(file['filename'])
-                if col2.button('Folder', key=f"{file['filename']} 4", use_container_width=True):
-                    open_file_with_explorer(file['filename'])
-                for match in file['matches']:
-                    st.divider()
-                    st.write(match, unsafe_allow_html=True)
\ No newline at end of file
+    This function performs an approximate search, where each word of the \
+    query can be misspelled or garbled by OCR in the documents, and \
+    displays the matching results like 'exact_search'.
+
+    Parameters:
+    -----------
+    - text_data: pd.DataFrame
+        A pandas DataFrame containing text data to be searched.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'text_data'.
+    - query: str
+        The search query. Case and punctuation are ignored.
+    - directory: str
+        The directory path where the text files are located.
+    - max_distance: int
+        The largest number of edits (inserted, deleted or replaced \
+        characters) allowed in each word of the query.
+    - index: PositionalIndex
+        The positional index of the rows of 'text_data'.
+    - trigrams: TrigramIndex
+        The trigram index of the words of 'index'.
+
+    Notes:
+    ------
+    - The words of the corpus close to each word of the query are found \
+    through the trigram index, and only the documents containing them in \
+    order are searched. No document is scanned word by word.
+    """
+    rows, variants = fuzzy_candidates(index, trigrams, query, max_distance)
+    if not variants:
+        st.info("The query has no words.")
+        return
+    exact = [word for word, terms in zip(tokenize(query), variants) if terms == [word] and trigrams.similar_terms(word, max_distance) is None]
+    if exact:
+        st.caption(f"Too short for {max_distance} edits, matched exactly: {', '.join(exact)}")
+    with st.expander(f"Words matched ({sum(map(len, variants))})"):
+        st.write(' · '.join(', '.join(terms) if terms else '(none)' for terms in variants))
+    if len(rows) == 0:
+        st.info("No document matches the query.")
+        return
+    show_ranked_documents(text_data, texts, re.compile(variants_pattern(variants), re.IGNORECASE), directory, rows, page_size, excerpts_per_page)
+
+
+def folder_comparison(text_data: pd.DataFrame, texts: TextStore, other_data: list[pd.DataFrame], directory: str, settings: dict):
+    """
+    This function lets the user pick a reference folder, e.g. the main \
+    archive, and displays which files of the analyzed folder have an \
+    identical or similar copy in it. Only the pairs of an analyzed file and \
+    a reference file are compared.
+
+    Parameters:
+    -----------
+    - text_data: pd.DataFrame
+        A pandas DataFrame containing the text data of the analyzed documents.
+    - texts: TextStore
+        The extracted text of the analyzed documents.
+    - other_data: list[pd.DataFrame]
+        The image and generic data of the analyzed folder, only compared by hash.
+    - directory: str
+        The analyzed root folder.
+    - settings: dict
+        The sidebar settings: 'filters', 'walker_threads', 'text_extensions', \
+        'workers', 'algorithm', 'limits' and 'features'.
+
+    Notes:
+    ------
+    - The reference folder is extracted with its own cache, and its \
+    document vectors and index are kept like those of the analyzed folder, \
+    so comparing new drops with the same archive again is fast.
+    """
+    reference = st.text_input('Reference folder', help="Folder the analyzed folder is compared with, e.g. the archive an incoming folder is filed into. Files are not compared with other files of the same folder.")
+    sensitivity = st.slider('Sensitivity', min_value=0, max_value=100, value=50, step=5, key='comparison sensitivity', help="Like the sensitivity of 'Similarity clustering'. Identical files are always reported.")
+    if reference == '':
+        return
+    if not os.path.isdir(reference):
+        st.warning('Specified reference folder does not exist')
+        return
+    if os.path.normpath(reference) == os.path.normpath(directory):
+        st.warning('The reference folder is the analyzed folder. Use the "Duplicates" and "Similar documents" tabs instead.')
+        return
+
+    with st.spinner("Gathering reference files"):
+        files = sorted(walk_files(reference, workers=settings['walker_threads'], **settings['filters']))
+    reference_text, reference_texts, reference_images, reference_generic, _, _ = get_data(
+        files, reference, settings['text_extensions'], settings['workers'], settings['algorithm'], settings['limits'])
+    reference_data = drop_skipped(reference_text)
+    index = None
+    if not reference_data.empty:
+        digest = corpus_digest(reference_data, settings['features'])
+        index = get_neighbor_index(digest, reference, reference_data, reference_texts, settings['features'])
+
+    matches = compare_folders(
+        pd.concat([text_data] + other_data, ignore_index=True),
+        pd.concat([reference_text, reference_images, reference_generic], ignore_index=True),
+        drop_skipped(text_data), texts, index, similarity_threshold(max(sensitivity / 100, 0.001)), settings['algorithm'])
+    if matches.empty:
+        st.success("No file of the analyzed folder was found in the reference folder.")
+        return
+
+    st.write(f"{matches['filename'].nunique()} files found in the reference folder.")
+    for filename, group in matches.groupby('filename', sort=False):
+        with st.expander(filename.replace(directory, '')):
+            for match in group.itertuples():
+                col1, col2, col3 = st.columns((6,1,1))
+                label = 'identical' if match.match == 'identical' else f"{match.similarity:.0%}"
+                col1.markdown(f"{match.reference.replace(reference, '')} - <span style='color:green'>{label}</span>", unsafe_allow_html=True)
+                if col2.button('Open', key=f"{filename} {match.reference} 7", use_container_width=True):
+                    open_file_with_default_app(match.reference)
+                if col3.button('Folder', key=f"{filename} {match.reference} 8", use_container_width=True):
+                    open_file_with_explorer(match.reference)
+
+
+def batch_search(text_data: pd.DataFrame, texts: TextStore, terms: list[str], directory: str, case_sensitive: bool, exact_word: bool, index: PositionalIndex=None, page_size: int=20, excerpts_per_page: int=10):
+    """
+    This function searches the documents for a list of terms at once and \
+    displays how often each term was found, and where.
+
+    Parameters:
+    -----------
+    - text_data: pd.DataFrame
+        A pandas DataFrame containing text data to be searched.
+    - texts: TextStore
+        The extracted text of the documents, looked up by the 'doc_id' column of 'text_data'.
+    - terms: list[str]
+        The terms to search for.
+    - directory: str
+        The directory path where the text files are located.
+    - case_sensitive: bool
+        A boolean value indicating whether the search should be case sensitive or not.
+    - exact_word: bool
+        A boolean value indicating whether the search should match exact words or not.
+    - index: PositionalIndex, optional
+        The positional index of the rows of 'text_data'. If given, only the \
+        documents containing the words of at least one term are searched.
+    - page_size: int, optional
+        The number of documents displayed per page. Default is 20.
+    - excerpts_per_page: int, optional
+        The number of excerpts displayed per page of a document. Default is 10.
+
+    Notes:
+    ------
+    - The text of each document is scanned once for all the terms (see \
+    'multisearch.TermMatcher'), instead of once per term, and the \
+    occurrences are cached for the corpus and terms (see 'find_terms').
+    """
+    matcher = TermMatcher(terms, case_sensitive, exact_word)
+    if not matcher.terms:
+        return
+
+    rows = None
+    if index is not None:
+        candidates = [index.candidates(term, exact_word) for term in matcher.terms]
+        if all(found is not None for found in candidates):
+            rows = np.unique(np.concatenate(candidates))
+
+    results = find_terms(corpus_digest(text_data), tuple(matcher.terms), case_sensitive, exact_word, text_data, texts, rows)
+    hits = np.zeros(len(matcher.terms), dtype=np.int64)
+    documents = np.zeros(len(matcher.terms), dtype=np.int64)
+    for _, _, matches in results:
+        for number, starts in matches.items():
+            hits[number] += len(starts)
+            documents[number] += 1
+
+    summary = pd.DataFrame({'Term': matcher.terms, 'Hits': hits, 'Documents': documents})
+    st.write(f"{int((hits > 0).sum())} of {len(matcher.terms)} terms found in {len(results)} documents.")
+    st.dataframe(summary.sort_values('Hits', ascending=False, kind='stable').set_index('Term'), use_container_width=True)
+
+    for filename, doc_id, matches in results[paginate(len(results), page_size, 'batch search page')]:
+        with st.expander(f"{filename.replace(directory, '')} ({sum(len(starts) for starts in matches.values())} hits)"):
+            col1, col2, col3 = st.columns((1,1,6))
+            if col1.button('Open', key=f"{filename} 11", use_container_width=True):
+                open_file_with_default_app(filename)
+            if col2.button('Folder', key=f"{filename} 12", use_container_width=True):
+                open_file_with_explorer(filename)
+            st.write(', '.join(f"{matcher.terms[number]} ({len(starts)})" for number, starts in matches.items()))
+            text = texts[doc_id]
+            occurrences = sorted((start, start + len(matcher.terms[number])) for number, starts in matches.items() for start in starts)
+            windows = excerpt_windows(occurrences, len(text))
+            for window in windows[paginate(len(windows), excerpts_per_page, f"{filename} term excerpts", 'Excerpts page')]:
+                st.divider()
+                st.write(render_excerpt(text, window), unsafe_allow_html=True)
+
+
+@st.cache_resource(max_entries=4, show_spinner='Indexing the extracted text...')
+def get_search_index(digest, directory, _files, _texts):
+    return load_search_index(directory, _files, _texts, digest)
+
+
+@st.cache_resource(max_entries=4, show_spinner='Indexing the words of the corpus...')
+def get_trigram_index(digest, _index):
+    return TrigramIndex(_index.terms)
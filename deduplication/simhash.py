@@ -0,0 +1,193 @@
+import re
+import hashlib
+import numpy as np
+from collections import Counter
+from itertools import combinations
+from graph import label_components
+
+FINGERPRINT_BITS = 64
+# Largest number of differing bits the index looks for, and smallest number
+# of bits of its table keys. Narrower keys would each match a large share of
+# the corpus, and more differing bits need too many tables to keep them wide.
+MAX_DISTANCE = 8
+MIN_KEY_BITS = 16
+# Number of bits set in each byte value
+BYTE_BITS = np.array([bin(value).count('1') for value in range(256)], dtype=np.int64)
+# Words per feature, and features hashed at once
+SHINGLE_SIZE = 3
+BLOCK_SIZE = 4096
+
+
+def get_simhash(text: str):
+    """
+    This function calculates the 64-bit SimHash fingerprint of a document. \
+    Each shingle of 'SHINGLE_SIZE' consecutive words votes for the bits of \
+    its hash, weighted by how often it appears, and the fingerprint keeps \
+    the bits with a positive vote. Similar documents get fingerprints that \
+    differ in few bits.
+
+    Parameters:
+    -----------
+    - text: str
+        The text of the document.
+
+    Returns:
+    --------
+    - fingerprint: str or None
+        The fingerprint as 16 hexadecimal digits, or None if the document \
+        has no words.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    size = min(SHINGLE_SIZE, len(words))
+    counts = Counter(' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little') for shingle in counts],
+        dtype=np.uint64)
+    weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+
+    votes = np.zeros(FINGERPRINT_BITS)
+    positions = np.arange(FINGERPRINT_BITS, dtype=np.uint64)
+    for start in range(0, len(hashes), BLOCK_SIZE):
+        bits = (hashes[start:start + BLOCK_SIZE, np.newaxis] >> positions) & np.uint64(1)
+        votes += weights[start:start + BLOCK_SIZE] @ (2.0 * bits - 1)
+    fingerprint = sum(1 << int(bit) for bit in np.flatnonzero(votes > 0))
+    return f'{fingerprint:016x}'
+
+
+def table_masks(max_distance: int):
+    """
+    This function splits the fingerprint bits into blocks for 'SimHashIndex' \
+    and returns the mask of the bits of each of its tables: one table per \
+    choice of all the blocks but 'max_distance' of them. The fewest blocks \
+    are used such that every key keeps at least 'MIN_KEY_BITS' bits.
+    """
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f'SimHash distances are limited to {MAX_DISTANCE} bits.')
+    for blocks in range(max_distance + 1, FINGERPRINT_BITS + 1):
+        bounds = np.linspace(0, FINGERPRINT_BITS, blocks + 1).astype(int)
+        widths = np.diff(bounds)
+        if np.sort(widths)[:blocks - max_distance].sum() >= MIN_KEY_BITS:
+            break
+    return [sum(((1 << int(widths[block])) - 1) << int(bounds[block]) for block in kept)
+            for kept in combinations(range(blocks), blocks - max_distance)]
+
+
+def bit_count(values: np.ndarray):
+    """
+    This function counts the bits set in each value of an array of uint64.
+    """
+    return BYTE_BITS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class SimHashIndex:
+    """
+    This class finds the pairs of fingerprints that differ in at most \
+    'max_distance' bits without comparing every pair.
+
+    The 64 bits are split into blocks. Two fingerprints that differ in at \
+    most 'max_distance' bits are equal on all the blocks but \
+    'max_distance' of them, so there is one table per choice of those \
+    blocks, keyed by their bits. Only fingerprints with the same key in one \
+    of the tables are compared. There are enough blocks for every key to \
+    keep at least 'MIN_KEY_BITS' bits (see 'table_masks'), so a key only \
+    matches a small share of the corpus.
+
+    Each table is a sorted array of keys, and the fingerprints sharing a \
+    key are paired by comparing each key with the ones following it, so \
+    the work grows with the number of candidate pairs.
+
+    Parameters:
+    -----------
+    - fingerprints: np.ndarray
+        The fingerprints, as integers of type uint64.
+    - max_distance: int, optional
+        The largest number of differing bits to look for, at most \
+        'MAX_DISTANCE'. Default is 3.
+    """
+    def __init__(self, fingerprints: np.ndarray, max_distance: int=3):
+        self.fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        self.max_distance = max_distance
+        self.masks = table_masks(max_distance)
+
+    def candidates(self, mask: int):
+        """
+        This method returns the pairs of rows with the same key in the table of 'mask'.
+        """
+        keys = self.fingerprints & np.uint64(mask)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        first, second = [], []
+        # Rows whose key equals the key 'offset' rows further
+        positions = np.flatnonzero(keys[1:] == keys[:-1])
+        offset = 1
+        while len(positions):
+            first.append(order[positions])
+            second.append(order[positions + offset])
+            offset += 1
+            positions = positions[positions + offset < len(keys)]
+            positions = positions[keys[positions + offset] == keys[positions]]
+        if not first:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        return np.concatenate(first), np.concatenate(second)
+
+    def pairs(self):
+        """
+        This method finds the pairs of fingerprints within 'max_distance' bits.
+
+        Returns:
+        --------
+        - (first, second, distances): tuple[np.ndarray]
+            The rows of each pair, each pair listed once with 'first < second', \
+            and the number of bits they differ in.
+        """
+        size = len(self.fingerprints)
+        found = []
+        for mask in self.masks:
+            first, second = self.candidates(mask)
+            distances = bit_count(self.fingerprints[first] ^ self.fingerprints[second])
+            keep = distances <= self.max_distance
+            found.append(np.minimum(first[keep], second[keep]) * size + np.maximum(first[keep], second[keep]))
+        codes = np.unique(np.concatenate(found)) if found else np.empty(0, np.int64)
+        first, second = codes // max(size, 1), codes % max(size, 1)
+        return first, second, bit_count(self.fingerprints[first] ^ self.fingerprints[second])
+
+
+def near_duplicate_pairs(fingerprints, max_distance: int):
+    """
+    This function finds the pairs of documents whose fingerprints differ \
+    in at most 'max_distance' bits.
+
+    Parameters:
+    -----------
+    - fingerprints: iterable[str or None]
+        The fingerprint of each document, as returned by 'get_simhash'.
+    - max_distance: int
+        The largest number of differing bits, at most 'MAX_DISTANCE'.
+
+    Returns:
+    --------
+    - (first, second, similarities): tuple[np.ndarray]
+        The row indices of each pair, each pair listed once, and the share \
+        of their fingerprint bits that are equal.
+    """
+    rows = np.array([i for i, fingerprint in enumerate(fingerprints) if isinstance(fingerprint, str)], dtype=np.int64)
+    values = np.array([int(fingerprints[i], 16) for i in rows], dtype=np.uint64)
+    first, second, distances = SimHashIndex(values, max_distance).pairs()
+    return rows[first], rows[second], 1 - distances / FINGERPRINT_BITS
+
+
+def cluster_by_simhash(fingerprints, max_distance: int):
+    """
+    This function groups documents whose fingerprints differ in at most \
+    'max_distance' bits into clusters.
+
+    Returns:
+    --------
+    - nodes: np.ndarray
+        The cluster label of each document, -1 for documents without neighbors.
+    """
+    fingerprints = list(fingerprints)
+    first, second, similarities = near_duplicate_pairs(fingerprints, max_distance)
+    return label_components(len(fingerprints), first, second, similarities, 1 - max_distance / FINGERPRINT_BITS)
@@ -1,29 +1,168 @@
-def longest_common_substring(s1, s2):
+import re
+from bisect import bisect_left
+
+
+class SuffixAutomaton:
     """
-    This function currently is not used, but could be useful for displaying \
-    what parts of the documents overlap with one another. However, it might \
-    prove challenging to implement this in case there are multiple documents \
-    in a cluster.
+    This class builds the suffix automaton of a sequence (the characters of \
+    a string, or the words of a document): the smallest automaton accepting \
+    every substring of it. It has at most twice as many states as the \
+    sequence has items and is built in linear time, so the substrings \
+    another sequence shares with it are found in a single pass over the \
+    other sequence instead of comparing every pair of positions.
+
+    Parameters:
+    -----------
+    - sequence: sequence of hashable items
+        The sequence whose substrings are indexed.
     """
-    m = [[0] * (1 + len(s2)) for _ in range(1 + len(s1))]
-    longest, x_longest = 0, 0
-    for x in range(1, 1 + len(s1)):
-        for y in range(1, 1 + len(s2)):
-            if s1[x - 1] == s2[y - 1]:
-                m[x][y] = m[x - 1][y - 1] + 1
-                if m[x][y] > longest:
-                    longest = m[x][y]
-                    x_longest = x
+    def __init__(self, sequence):
+        # Transitions, suffix link, length of the longest substring and
+        # first end position in 'sequence' of each state
+        self.next = [{}]
+        self.link = [-1]
+        self.length = [0]
+        self.end = [-1]
+        last = 0
+        for position, item in enumerate(sequence):
+            last = self.extend(last, item, position)
+
+    def extend(self, last: int, item, position: int):
+        current = len(self.length)
+        self.next.append({})
+        self.link.append(0)
+        self.length.append(self.length[last] + 1)
+        self.end.append(position)
+        state = last
+        while state != -1 and item not in self.next[state]:
+            self.next[state][item] = current
+            state = self.link[state]
+        if state == -1:
+            return current
+
+        following = self.next[state][item]
+        if self.length[state] + 1 == self.length[following]:
+            self.link[current] = following
+            return current
+
+        clone = len(self.length)
+        self.next.append(dict(self.next[following]))
+        self.link.append(self.link[following])
+        self.length.append(self.length[state] + 1)
+        self.end.append(self.end[following])
+        while state != -1 and self.next[state].get(item) == following:
+            self.next[state][item] = clone
+            state = self.link[state]
+        self.link[following] = clone
+        self.link[current] = clone
+        return current
+
+    def __len__(self):
+        return len(self.length)
+
+    def match_lengths(self, sequence):
+        """
+        This method finds, for each state, the length of the longest of its \
+        substrings that also appears in 'sequence'.
+
+        Returns:
+        --------
+        - lengths: list[int]
+            The matched length of each state, 0 if none of its substrings \
+            appears in 'sequence'.
+        """
+        lengths = [0] * len(self.length)
+        state, length = 0, 0
+        for item in sequence:
+            while state != 0 and item not in self.next[state]:
+                state = self.link[state]
+                length = self.length[state]
+            if item in self.next[state]:
+                state = self.next[state][item]
+                length += 1
             else:
-                m[x][y] = 0
-    return s1[x_longest - longest: x_longest]
+                state, length = 0, 0
+            if length > lengths[state]:
+                lengths[state] = length
+
+        # A state matched by a string also matches all of its suffixes, held by its suffix links
+        for state in sorted(range(1, len(self.length)), key=self.length.__getitem__, reverse=True):
+            if lengths[state] > 0:
+                link = self.link[state]
+                lengths[link] = max(lengths[link], self.length[link])
+        return lengths
+
+
+def longest_common_substring(s1, s2):
+    """
+    This function finds the longest substring two strings share, in time \
+    linear in their lengths (see 'SuffixAutomaton').
+    """
+    automaton = SuffixAutomaton(s1)
+    lengths = automaton.match_lengths(s2)
+    state = max(range(len(automaton)), key=lambda state: (min(lengths[state], automaton.length[state]), -state))
+    longest = min(lengths[state], automaton.length[state])
+    end = automaton.end[state] + 1
+    return s1[end - longest:end]
+
+
+def common_passages(texts: list[str], min_words: int=8, max_passages: int=10):
+    """
+    This function finds the passages shared by every document of a group, \
+    e.g. the members of a cluster, in time linear in their total length. \
+    The suffix automaton of the words of the shortest document is matched \
+    against every other document, and each state keeps the shortest match \
+    across them.
+
+    Parameters:
+    -----------
+    - texts: list[str]
+        The text of each document.
+    - min_words: int, optional
+        The smallest number of words of a passage. Default is 8.
+    - max_passages: int, optional
+        The largest number of passages returned. Default is 10.
+
+    Returns:
+    --------
+    - base: int
+        The position in 'texts' of the document the passages are located in.
+    - passages: list[tuple[int]]
+        The (start, end) character offsets of each passage in 'texts[base]', \
+        from the longest. Passages never overlap, and words are compared \
+        without case, punctuation or spacing.
+    """
+    vocabulary = {}
+    documents = []
+    for text in texts:
+        matches = list(re.finditer(r'\w+', text))
+        documents.append((matches, [vocabulary.setdefault(match.group().lower(), len(vocabulary)) for match in matches]))
+    if not documents:
+        return 0, []
 
+    base = min(range(len(documents)), key=lambda i: len(documents[i][1]))
+    automaton = SuffixAutomaton(documents[base][1])
+    shared = list(automaton.length)
+    for i, (_, words) in enumerate(documents):
+        if i != base:
+            shared = [min(a, b) for a, b in zip(shared, automaton.match_lengths(words))]
 
-def find_reocurring_string(strings: list[str]):
-    common_substrings = set(strings[0])
+    # Longest passages first, each kept only if it does not overlap a passage already kept
+    candidates = sorted(
+        ((shared[state], automaton.end[state]) for state in range(1, len(automaton)) if shared[state] >= min_words),
+        key=lambda candidate: (-candidate[0], candidate[1]))
+    starts, ends = [], []
+    for length, end in candidates:
+        start = end - length + 1
+        i = bisect_left(starts, start)
+        if (i < len(starts) and starts[i] <= end) or (i > 0 and ends[i - 1] >= start):
+            continue
+        starts.insert(i, start)
+        ends.insert(i, end)
+        if len(starts) == max_passages:
+            break
 
-    for string in strings[1:]:
-        new_common_substrings = set()
-        for common_substring in common_substrings:
-            new_common_substrings.add(longest_common_substring(common_substring, string))
-        common_substrings = new_common_substrings
\ No newline at end of file
+    matches = documents[base][0]
+    passages = sorted(((matches[start].start(), matches[end].end()) for start, end in zip(starts, ends)),
+                      key=lambda passage: passage[0] - passage[1])
+    return base, passages
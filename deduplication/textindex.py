@@ -0,0 +1,225 @@
+import os
+import re
+import glob
+import numpy as np
+import pandas as pd
+from cache import CACHE_DIR
+from textstore import TextStore
+
+# Number of saved indexes kept in the cache folder of a scanned folder
+INDEX_FILES_KEPT = 4
+
+
+def tokenize(text: str):
+    """
+    This function splits a text into the lowercase words the index is made of.
+    """
+    return re.findall(r'\w+', text.lower())
+
+
+class PositionalIndex:
+    """
+    This class is a positional inverted index of the words of a corpus: for \
+    every word, the documents it appears in and its position among the \
+    words of each document. Queries then only look at the documents that \
+    contain all of their words, in the right order, instead of scanning \
+    the text of every document.
+
+    The postings of all words are kept in three flat arrays sorted by word, \
+    document and position, like a sparse matrix, so the index can be saved \
+    and loaded as a whole.
+
+    Parameters:
+    -----------
+    - terms: list[str]
+        The words of the index.
+    - indptr: np.ndarray
+        The postings of 'terms[i]' are at 'indptr[i]:indptr[i + 1]'.
+    - documents: np.ndarray
+        The row of the document of each posting.
+    - positions: np.ndarray
+        The position of the word in the document of each posting.
+    - size: int
+        The number of documents.
+    """
+    def __init__(self, terms: list[str], indptr: np.ndarray, documents: np.ndarray, positions: np.ndarray, size: int):
+        self.terms = terms
+        self.columns = {term: column for column, term in enumerate(terms)}
+        self.indptr = indptr
+        self.documents = documents
+        self.positions = positions
+        self.size = size
+
+    @classmethod
+    def build(cls, texts):
+        """
+        This method indexes the words of each text, in order.
+        """
+        vocabulary = {}
+        words, documents, positions = [], [], []
+        size = 0
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for token in set(tokens).difference(vocabulary):
+                vocabulary[token] = len(vocabulary)
+            words.append(np.fromiter(map(vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens)))
+            documents.append(np.full(len(tokens), row, dtype=np.int32))
+            positions.append(np.arange(len(tokens), dtype=np.int32))
+            size = row + 1
+        words = np.concatenate(words) if words else np.empty(0, np.int64)
+        # A stable sort keeps the postings of each word in document and position order
+        order = np.argsort(words, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(words, minlength=len(vocabulary)))]).astype(np.int64)
+        return cls(list(vocabulary), indptr,
+                   np.concatenate(documents)[order] if documents else np.empty(0, np.int32),
+                   np.concatenate(positions)[order] if positions else np.empty(0, np.int32),
+                   size)
+
+    def __len__(self):
+        return self.size
+
+    def postings(self, term: str):
+        """
+        This method returns the documents and positions of a word.
+        """
+        column = self.columns.get(term)
+        if column is None:
+            return np.empty(0, np.int32), np.empty(0, np.int32)
+        start, end = self.indptr[column], self.indptr[column + 1]
+        return self.documents[start:end], self.positions[start:end]
+
+    def alternatives(self, terms: list[str]):
+        """
+        This method returns the documents and positions of any of several words.
+        """
+        postings = [self.postings(term) for term in terms]
+        if len(postings) == 1:
+            return postings[0]
+        return (np.concatenate([documents for documents, _ in postings]),
+                np.concatenate([positions for _, positions in postings]))
+
+    def phrase(self, words: list[tuple[int, str]]):
+        """
+        This method finds the documents where the given words appear at the \
+        given offsets from each other.
+
+        Parameters:
+        -----------
+        - words: list[tuple[int, str or list[str]]]
+            The offset of each word from the first one and the word, or a \
+            list of words any of which can be at that offset.
+
+        Returns:
+        --------
+        - rows: np.ndarray
+            The sorted rows of the matching documents.
+        """
+        words = [(offset, [term] if isinstance(term, str) else term) for offset, term in words]
+        matches = None
+        # The rarest words first, so the intersections stay small
+        for offset, terms in sorted(words, key=lambda word: len(self.alternatives(word[1])[0])):
+            documents, positions = self.alternatives(terms)
+            # Where the first word of the phrase would start
+            keys = (documents.astype(np.int64) << 32) | (positions.astype(np.int64) - offset + (1 << 31))
+            matches = keys if matches is None else np.intersect1d(matches, keys, assume_unique=True)
+            if len(matches) == 0:
+                break
+        if matches is None:
+            return np.arange(self.size)
+        return np.unique(matches >> 32)
+
+    def candidates(self, query: str, exact_word: bool=True):
+        """
+        This method finds the documents that can contain 'query', with any \
+        case. Words of the query cut by its start or end (without \
+        'exact_word') can be part of a longer word, so only the complete \
+        ones are looked up.
+
+        Returns:
+        --------
+        - rows: np.ndarray or None
+            The sorted rows of the documents that can match, or None if the \
+            query has no complete word and every document must be scanned.
+        """
+        query = query.lower()
+        matches = list(re.finditer(r'\w+', query))
+        words = []
+        for i, match in enumerate(matches):
+            complete_start = exact_word or match.start() > 0
+            complete_end = exact_word or match.end() < len(query)
+            if complete_start and complete_end:
+                words.append((i, match.group()))
+        if not words:
+            return None
+        return self.phrase(words)
+
+    def save(self, path: str):
+        """
+        This method saves the index as an npz file, with its words in a \
+        text file next to it. Words never contain a line break.
+        """
+        # Written under a temporary name so a half-written file is never loaded
+        partial = os.path.join(os.path.dirname(path), 'partial-' + os.path.basename(path))
+        with open(partial + '.terms', 'w', encoding='utf-8', errors='surrogatepass') as f:
+            f.write('\n'.join(self.terms))
+        np.savez(partial, indptr=self.indptr, documents=self.documents, positions=self.positions, size=self.size)
+        os.replace(partial + '.terms', path + '.terms')
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as arrays:
+            indptr, documents, positions, size = arrays['indptr'], arrays['documents'], arrays['positions'], int(arrays['size'])
+        with open(path + '.terms', encoding='utf-8', errors='surrogatepass') as f:
+            terms = f.read().split('\n') if len(indptr) > 1 else []
+        if len(terms) != len(indptr) - 1:
+            raise ValueError('The words of the index do not match its postings.')
+        return cls(terms, indptr, documents, positions, size)
+
+
+def load_search_index(directory: str, data: pd.DataFrame, texts: TextStore, digest: str):
+    """
+    This function returns the positional index of the extracted text of a \
+    corpus. It is saved in the cache folder of the scanned folder the first \
+    time it is built, and loaded from there while the corpus stays the same.
+
+    Parameters:
+    -----------
+    - directory: str
+        The scanned root folder.
+    - data: pd.DataFrame
+        A DataFrame with the 'doc_id' of each document.
+    - texts: TextStore
+        The extracted text of the documents.
+    - digest: str
+        The 'features.corpus_digest' of 'data'.
+
+    Returns:
+    --------
+    - index: PositionalIndex
+        An index whose rows are the rows of 'data'.
+    """
+    path = os.path.join(directory, CACHE_DIR, f'search-{digest}.npz')
+    try:
+        index = PositionalIndex.load(path)
+        if len(index) == len(data.index):
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = PositionalIndex.build(texts.texts(data['doc_id']))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        index.save(path)
+        remove_old_indexes(directory)
+    except OSError:
+        pass  # The folder is read-only, the index is built every time
+    return index
+
+
+def remove_old_indexes(directory: str):
+    files = sorted(glob.glob(os.path.join(directory, CACHE_DIR, 'search-*.npz')), key=os.path.getmtime, reverse=True)
+    for path in files[INDEX_FILES_KEPT:]:
+        for old in [path, path + '.terms']:
+            if os.path.exists(old):
+                os.remove(old)
@@ -0,0 +1,68 @@
+import mmap
+import tempfile
+import numpy as np
+
+
+class TextStore:
+    """
+    This class keeps the extracted text of every document in a single UTF-8 \
+    blob on disk, memory-mapped once all documents are added, with an array \
+    of offsets marking where each document starts. Documents are referred to \
+    by the id returned by 'add', so DataFrames only need to hold the ids and \
+    the text is only decoded when a document is read.
+
+    The blob lives in an anonymous temporary file, which is deleted when the \
+    store is closed or garbage collected.
+    """
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.offsets = [0]
+        self.blob = None
+
+    def add(self, text: str):
+        """
+        This method appends a document to the store and returns its id.
+        """
+        if self.blob is not None:
+            raise ValueError('Documents cannot be added to a finalized store')
+        data = text.encode('utf-8', errors='surrogatepass')
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        return len(self.offsets) - 2
+
+    def finalize(self):
+        """
+        This method memory-maps the blob once every document has been added.
+        """
+        self.file.flush()
+        self.offsets = np.array(self.offsets, dtype=np.int64)
+        if self.offsets[-1] > 0:
+            self.blob = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.blob = b''  # An empty file cannot be memory-mapped
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def view(self, doc_id: int):
+        """
+        This method returns the UTF-8 bytes of a document as a memoryview of \
+        the blob, without copying them.
+        """
+        return memoryview(self.blob)[self.offsets[doc_id]:self.offsets[doc_id + 1]]
+
+    def __getitem__(self, doc_id: int):
+        return str(self.view(doc_id), 'utf-8', errors='surrogatepass')
+
+    def texts(self, doc_ids):
+        """
+        This method yields the text of the given documents one at a time, so \
+        only one decoded document is held in memory at once.
+        """
+        for doc_id in doc_ids:
+            yield self[doc_id]
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+        self.file.close()
@@ -0,0 +1,142 @@
+import os
+import stat
+from fnmatch import fnmatch
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from cache import CACHE_DIR
+
+FileEntry = namedtuple('FileEntry', ['path', 'size', 'mtime_ns', 'inode'])
+
+# Lock and temporary files created by Office applications
+TEMP_PATTERNS = ['~$*', '~*.tmp']
+
+
+def walk_files(directory: str,
+               include: list[str]=None,
+               exclude: list[str]=None,
+               min_size: int=None,
+               max_size: int=None,
+               skip_hidden: bool=True,
+               skip_temp: bool=True,
+               workers: int=1):
+    """
+    This function walks a directory tree with 'os.scandir' and yields every \
+    file that passes the filters, together with the stat information that \
+    'os.scandir' already gathered, so later stages never need to stat the \
+    files again.
+
+    Parameters:
+    -----------
+    - directory: str
+        The root folder to be walked.
+    - include: list[str], optional
+        Glob patterns (e.g. '*.pdf') matched against the file name and its \
+        path relative to 'directory'. If given, only matching files are yielded.
+    - exclude: list[str], optional
+        Glob patterns matched the same way. Matching files are skipped, and \
+        matching folders are not walked.
+    - min_size: int, optional
+        Files smaller than this number of bytes are skipped.
+    - max_size: int, optional
+        Files larger than this number of bytes are skipped.
+    - skip_hidden: bool, optional
+        Whether to skip hidden files and folders (dot files, and files with \
+        the hidden attribute on Windows). Default is True.
+    - skip_temp: bool, optional
+        Whether to skip lock and temporary files (see 'TEMP_PATTERNS'). Default is True.
+    - workers: int, optional
+        The number of threads walking subfolders in parallel. Default is 1.
+
+    Yields:
+    -------
+    - entry: FileEntry
+        A named tuple with the path, size, modification time (in nanoseconds) \
+        and inode of a file. Files are yielded in no particular order when \
+        'workers' is greater than 1.
+    """
+    filters = {
+        'include': include or [],
+        'exclude': exclude or [],
+        'min_size': min_size,
+        'max_size': max_size,
+        'skip_hidden': skip_hidden,
+        'skip_temp': skip_temp
+    }
+
+    if workers <= 1:
+        folders = [directory]
+        while folders:
+            entries, subfolders = scan_folder(folders.pop(), directory, filters)
+            folders += subfolders
+            yield from entries
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(scan_folder, directory, directory, filters)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entries, subfolders = future.result()
+                pending |= {executor.submit(scan_folder, folder, directory, filters) for folder in subfolders}
+                yield from entries
+
+
+def scan_folder(folder: str, directory: str, filters: dict):
+    """
+    This function lists a single folder and returns the files that pass the \
+    filters and the subfolders that should be walked next. Folders that \
+    cannot be read are skipped, like 'os.walk' does.
+    """
+    entries = []
+    subfolders = []
+    try:
+        with os.scandir(folder) as iterator:
+            for entry in iterator:
+                try:
+                    relative_path = os.path.relpath(entry.path, directory).replace(os.sep, '/')
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name == CACHE_DIR:
+                            continue
+                        if filters['skip_hidden'] and is_hidden(entry):
+                            continue
+                        if matches(entry.name, relative_path, filters['exclude']):
+                            continue
+                        subfolders.append(entry.path)
+                    elif entry.is_file():
+                        if filters['skip_temp'] and is_temp_file(entry.name):
+                            continue
+                        if filters['skip_hidden'] and is_hidden(entry):
+                            continue
+                        if filters['include'] and not matches(entry.name, relative_path, filters['include']):
+                            continue
+                        if matches(entry.name, relative_path, filters['exclude']):
+                            continue
+                        info = entry.stat()
+                        if filters['min_size'] is not None and info.st_size < filters['min_size']:
+                            continue
+                        if filters['max_size'] is not None and info.st_size > filters['max_size']:
+                            continue
+                        # DirEntry.stat() does not fill st_ino on Windows, inode() does
+                        entries.append(FileEntry(entry.path, info.st_size, info.st_mtime_ns, entry.inode()))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return entries, subfolders
+
+
+def matches(name: str, relative_path: str, patterns: list[str]):
+    return any(fnmatch(name, pattern) or fnmatch(relative_path, pattern) for pattern in patterns)
+
+
+def is_temp_file(filename: str):
+    return any(fnmatch(filename, pattern) for pattern in TEMP_PATTERNS)
+
+
+def is_hidden(entry: os.DirEntry):
+    if entry.name.startswith('.'):
+        return True
+    if os.name != 'nt':
+        return False
+    # The stat of a directory entry is free on Windows, it comes with the listing
+    return bool(entry.stat(follow_symlinks=False).st_file_attributes & stat.FILE_ATTRIBUTE_HIDDEN)
@@ -0,0 +1,230 @@
+import os
+import signal
+import queue
+import multiprocessing
+from collections import deque
+from time import monotonic
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+def run_in_pools(func, jobs, workers: dict, get_group, timeout: float=None):
+    """
+    This function runs 'func' over a stream of jobs using one process pool per \
+    group of jobs and yields the results as soon as each job finishes, in \
+    completion order.
+
+    Parameters:
+    -----------
+    - func: callable
+        A module level function (so it can be pickled) that is called as 'func(*job)'.
+    - jobs: iterable[tuple]
+        An iterable of argument tuples, one per job. It is consumed lazily: a \
+        new job is only taken when the pools have room for it, so a generator \
+        feeding this function never runs far ahead of the workers.
+    - workers: dict
+        A dictionary mapping a group name to the number of worker processes \
+        for that group. Jobs whose group is not listed use the 'default' entry. \
+        Jobs whose group has no workers are run in the calling process.
+    - get_group: callable
+        A function that takes the arguments of a job and returns its group \
+        name, or None to always run the job in the calling process.
+    - timeout: float, optional
+        The number of seconds a job may run in a worker process. A job that \
+        runs longer is reported with a TimeoutError and its worker is killed. \
+        Jobs run in the calling process have no time limit. Default is None.
+
+    Yields:
+    -------
+    - (job, result, error): tuple
+        The job arguments, the value returned by 'func' and the exception raised \
+        while running it. Either 'result' or 'error' is None.
+
+    Notes:
+    ------
+    - When a worker process dies (e.g. a parser segfaults), every job that was \
+    running in that pool is retried on its own in a single-worker pool. Only \
+    the job that crashes it again is reported as failed, the rest of the scan \
+    carries on with a fresh pool.
+    - With a timeout, each worker process of a group gets a pool of its own \
+    holding one job at a time, so a job starts running as soon as it is \
+    submitted, its deadline can be counted from then, and stopping it does \
+    not disturb the jobs running in the other workers.
+    """
+    jobs = iter(jobs)
+    exhausted = False
+    groups = {}
+    inline = deque()
+    # Jobs that were running when a pool broke are retried one at a time here
+    isolation = new_group(1, window=1)
+    all_groups = [isolation]
+    window = None if timeout is None else 1
+
+    try:
+        while True:
+            # Take new jobs only while nothing is waiting for a free slot
+            while not exhausted and not inline and not any(group['pending'] for group in all_groups):
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                name = get_group(*job)
+                if name is not None and workers.get(name, 0) < 1:
+                    name = 'default'
+                if name is None or workers.get(name, 0) < 1:
+                    inline.append(job)
+                    break
+                if name not in groups:
+                    if timeout is None:
+                        groups[name] = [new_group(workers[name])]
+                    else:
+                        # The single-worker pools of a group share its queue of jobs
+                        pending = deque()
+                        groups[name] = [new_group(1, window, pending) for _ in range(workers[name])]
+                    all_groups.extend(groups[name])
+                groups[name][0]['pending'].append(job)
+                for group in groups[name]:
+                    top_up(func, group, timeout)
+
+            if exhausted and not inline and not any(group['pending'] or group['in_flight'] for group in all_groups):
+                break
+
+            for group in all_groups:
+                top_up(func, group, timeout)
+
+            wait_timeout = None
+            if inline:
+                yield call(func, inline.popleft())
+                wait_timeout = 0
+
+            in_flight = {future: group for group in all_groups for future in group['in_flight']}
+            if not in_flight:
+                continue
+
+            if timeout is not None:
+                # Wake up in time to stop the next job that runs out of time
+                deadline = min(deadline for group in all_groups for deadline in group['deadlines'].values())
+                wait_timeout = max(0, min(deadline - monotonic(), wait_timeout if wait_timeout is not None else timeout))
+
+            done, _ = wait(in_flight, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                group = in_flight[future]
+                job = group['in_flight'].pop(future, None)
+                group['deadlines'].pop(future, None)
+                if job is None:
+                    continue  # Already handled when its pool broke
+                try:
+                    yield job, future.result(), None
+                except BrokenProcessPool as e:
+                    if group is isolation:
+                        yield job, None, e
+                    else:
+                        isolation['pending'].append(job)
+                    yield from drain_broken_group(group, isolation)
+                except Exception as e:
+                    yield job, None, e
+
+            if timeout is not None:
+                for group in all_groups:
+                    yield from expire_jobs(group, timeout)
+    finally:
+        for group in all_groups:
+            shutdown(group)
+
+
+def new_group(max_workers: int, window: int=None, pending: deque=None):
+    return {
+        'max_workers': max_workers,
+        'window': window or max_workers * 2,
+        'executor': None,
+        'pids': None,
+        'pending': deque() if pending is None else pending,
+        'in_flight': {},
+        'deadlines': {}}
+
+
+def top_up(func, group: dict, timeout: float=None):
+    """
+    This function submits pending jobs of a group until its window of jobs \
+    in flight is full (twice the number of workers by default), so workers \
+    never wait for work while the rest of the jobs stay queued in the parent \
+    process.
+    """
+    while group['pending'] and len(group['in_flight']) < group['window']:
+        if group['executor'] is None:
+            if timeout is None:
+                group['executor'] = ProcessPoolExecutor(max_workers=group['max_workers'])
+            else:
+                # The workers report their process id, so a job running out of time can be killed
+                group['pids'] = multiprocessing.Queue()
+                group['executor'] = ProcessPoolExecutor(max_workers=group['max_workers'], initializer=report_pid, initargs=(group['pids'],))
+        job = group['pending'].popleft()
+        try:
+            future = group['executor'].submit(func, *job)
+        except BrokenProcessPool:
+            # The jobs in flight will report the crash on the next wait
+            group['pending'].appendleft(job)
+            break
+        group['in_flight'][future] = job
+        if timeout is not None:
+            group['deadlines'][future] = monotonic() + timeout
+
+
+def report_pid(pids):
+    pids.put(os.getpid())
+
+
+def expire_jobs(group: dict, timeout: float):
+    """
+    This function stops the job of a group that ran out of time by killing \
+    its worker process, the only way to stop a running job.
+    """
+    now = monotonic()
+    expired = [future for future, deadline in group['deadlines'].items() if deadline <= now and not future.done()]
+    if not expired:
+        return
+    for future in expired:
+        job = group['in_flight'].pop(future)
+        yield job, None, TimeoutError(f'Took more than {timeout:g} seconds')
+
+    # Killing the whole pool is fine: with a timeout a pool has a single
+    # worker, which was running the expired job alone, and a
+    # ProcessPoolExecutor is broken by the death of any of its workers anyway
+    try:
+        os.kill(group['pids'].get(timeout=5), signal.SIGTERM)
+    except (queue.Empty, OSError):
+        pass  # The worker exited already
+    group['in_flight'].clear()
+    group['deadlines'].clear()
+    shutdown(group)
+
+
+def drain_broken_group(group: dict, isolation: dict):
+    """
+    This function collects the jobs of a broken pool. Jobs that finished \
+    before the pool broke are yielded, the others are sent to isolation.
+    """
+    for future, job in list(group['in_flight'].items()):
+        if future.done() and not future.cancelled() and future.exception() is None:
+            yield job, future.result(), None
+        else:
+            isolation['pending'].append(job)
+    group['in_flight'].clear()
+    group['deadlines'].clear()
+    shutdown(group)
+
+
+def shutdown(group: dict):
+    if group['executor'] is not None:
+        group['executor'].shutdown(wait=False, cancel_futures=True)
+        group['executor'] = None
+    if group['pids'] is not None:
+        group['pids'].close()
+        group['pids'] = None
+
+
+def call(func, job: tuple):
+    try:
+        return job, func(*job), None
+    except Exception as e:
+        return job, None, e
@@ -28,4 +28,9 @@ import re
 import ktrain
 from requests_ntlm import HttpNtlmAuth
 
+from multiprocessing import freeze_support
+
+# Extraction worker processes re-launch the frozen executable
+freeze_support()
+
 import launch
\ No newline at end of file
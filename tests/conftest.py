@@ -0,0 +1,20 @@
+import os
+import sys
+import pytest
+
+# The modules of the app import each other by their flat names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'deduplication'))
+
+
+@pytest.fixture
+def write(tmp_path):
+    """
+    This fixture writes a file under the temporary folder of a test, \
+    creating its folders, and returns its path.
+    """
+    def write(name: str, data: bytes):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return str(path)
+    return write
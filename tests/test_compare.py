@@ -0,0 +1,60 @@
+import os
+import pandas as pd
+from compare import compare_folders, identical_files
+from hashing import PARTIAL_HASH_BYTES, hash_file
+
+
+def frame(paths, hashes=None):
+    return pd.DataFrame({'filename': paths, 'hash': hashes or [None] * len(paths)})
+
+
+def pairs(matches):
+    return sorted(zip(matches['filename'], matches['reference']))
+
+
+def test_same_size_is_not_identical(write):
+    incoming = write('in/a.bin', b'a' * 100)
+    reference = write('ref/b.bin', b'b' * 100)
+    assert identical_files(frame([incoming]), frame([reference])).empty
+
+
+def test_copies_are_found_without_known_hashes(write):
+    contents = os.urandom(3 * PARTIAL_HASH_BYTES)
+    incoming = write('in/a.iso', contents)
+    copy = write('ref/a.iso', contents)
+    # Same size, start and end, but a different middle
+    changed = write('ref/b.iso', contents[:PARTIAL_HASH_BYTES] + b'x' + contents[PARTIAL_HASH_BYTES + 1:])
+    assert pairs(identical_files(frame([incoming]), frame([copy, changed]))) == [(incoming, copy)]
+
+
+def test_known_hashes_are_matched_with_unhashed_files(write):
+    incoming = write('in/a.txt', b'same text')
+    reference = write('ref/a.txt', b'same text')
+    other = write('ref/b.txt', b'other')
+    matches = identical_files(frame([incoming], [hash_file(incoming)]), frame([reference, other]))
+    assert pairs(matches) == [(incoming, reference)]
+
+
+def test_every_pair_of_copies_is_reported(write):
+    paths = [write(f'{folder}/{name}', b'copy') for folder in ['in', 'ref'] for name in ['a', 'b']]
+    matches = identical_files(frame(paths[:2]), frame(paths[2:]))
+    assert pairs(matches) == sorted((a, b) for a in paths[:2] for b in paths[2:])
+
+
+def test_missing_files_are_left_out(tmp_path, write):
+    incoming = write('in/a', b'abc')
+    reference = write('ref/a', b'abc')
+    missing = str(tmp_path / 'in' / 'gone')
+    assert pairs(identical_files(frame([incoming, missing]), frame([reference]))) == [(incoming, reference)]
+
+
+def test_empty_folders():
+    assert identical_files(frame([]), frame(['x'])).empty
+    assert list(identical_files(pd.DataFrame(), frame(['x'])).columns) == ['filename', 'reference']
+
+
+def test_compare_folders_without_text_index(write):
+    incoming = write('in/a', b'abc')
+    reference = write('ref/a', b'abc')
+    matches = compare_folders(frame([incoming]), frame([reference]), pd.DataFrame(), None, None, 0.9)
+    assert matches.to_dict('records') == [{'filename': incoming, 'reference': reference, 'match': 'identical', 'similarity': 1.0}]
@@ -0,0 +1,135 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.preprocessing import normalize
+from cache import CACHE_DIR
+from features import corpus_digest, load_document_vectors, load_vocabulary, vectorize_documents, vectorize_query
+from textstore import TextStore
+
+DOCUMENTS = [
+    'the quick brown fox jumps over the lazy dog',
+    'the quick brown fox sleeps under the old tree',
+    'a report on the annual budget of the city',
+    'the annual budget of the city was approved',
+]
+
+
+def corpus(documents):
+    texts = TextStore()
+    data = pd.DataFrame({
+        'filename': [f'/folder/{i}.txt' for i in range(len(documents))],
+        'hash': [f'hash{i}' for i in range(len(documents))],
+        'doc_id': [texts.add(text) for text in documents]})
+    texts.finalize()
+    return data, texts
+
+
+def test_vocabulary_matches_the_columns():
+    data, texts = corpus(DOCUMENTS)
+    vector, vocabulary = vectorize_documents(data, texts)
+    assert len(vocabulary) == vector.shape[1]
+    assert vector[0, vocabulary['quick brown fox']] == 1
+    assert vector[2, vocabulary['quick brown fox']] == 0
+    assert vector[0, vocabulary['the']] == 2
+
+
+def test_concurrent_fits_keep_their_own_vocabulary():
+    corpora = [corpus(DOCUMENTS[:2]), corpus(DOCUMENTS[2:]), corpus(DOCUMENTS)]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lambda args: vectorize_documents(*args), corpora * 5))
+    for (data, texts), (vector, vocabulary) in zip(corpora * 5, results):
+        expected, expected_vocabulary = vectorize_documents(data, texts)
+        assert vocabulary == expected_vocabulary
+        assert (vector != expected).nnz == 0
+
+
+def test_vectors_and_vocabulary_are_saved_and_loaded(tmp_path):
+    data, texts = corpus(DOCUMENTS)
+    directory = str(tmp_path)
+    digest = corpus_digest(data)
+    vector, vocabulary = load_document_vectors(directory, data, texts)
+    assert os.path.exists(os.path.join(directory, CACHE_DIR, f'vectors-{digest}.npz'))
+    assert load_vocabulary(directory, digest) == vocabulary
+    # Loaded from the cache folder, the texts are not read again
+    loaded, loaded_vocabulary = load_document_vectors(directory, data, None)
+    assert (loaded != vector).nnz == 0 and loaded_vocabulary == vocabulary
+    assert (vector != normalize(vectorize_documents(data, texts)[0])).nnz == 0
+
+
+def test_missing_vocabulary_is_fitted_again(tmp_path):
+    data, texts = corpus(DOCUMENTS)
+    directory = str(tmp_path)
+    digest = corpus_digest(data)
+    _, vocabulary = load_document_vectors(directory, data, texts)
+    os.remove(os.path.join(directory, CACHE_DIR, f'vocabulary-{digest}.txt'))
+    assert load_vocabulary(directory, digest) is None
+    assert load_document_vectors(directory, data, texts)[1] == vocabulary
+
+
+def test_query_scores_are_the_corpus_similarities():
+    data, texts = corpus(DOCUMENTS)
+    vector, vocabulary = vectorize_documents(data, texts)
+    vector = normalize(vector)
+    query = vectorize_query(DOCUMENTS[1], vocabulary=vocabulary)
+    assert (query @ vector.T).toarray().ravel() == pytest.approx((vector[1] @ vector.T).toarray().ravel())
+    with pytest.raises(ValueError):
+        vectorize_query(DOCUMENTS[1])
+
+
+def test_digest_follows_the_corpus_and_settings():
+    data, _ = corpus(DOCUMENTS)
+    digest = corpus_digest(data)
+    assert corpus_digest(data) == digest
+    assert corpus_digest(data, {'sublinear_tf': True}) != digest
+    changed = data.assign(hash=['hash0', 'hash1', 'hash2', 'other'])
+    assert corpus_digest(changed) != digest
+
+
+def test_hashed_backend_keeps_no_vocabulary():
+    data, texts = corpus(DOCUMENTS)
+    vector, vocabulary = vectorize_documents(data, texts, {'backend': 'hashed', 'n_features': 2 ** 16})
+    assert vocabulary is None
+    assert vector.shape == (len(DOCUMENTS), 2 ** 16) and vector.dtype == np.float32
+    # Every n-gram is counted, as with the vocabulary backend
+    counts, _ = vectorize_documents(data, texts)
+    assert vector.sum(axis=1) == pytest.approx(counts.sum(axis=1))
+
+
+def test_hashed_similarities_are_close_to_the_vocabulary_ones():
+    data, texts = corpus(DOCUMENTS)
+    exact = normalize(vectorize_documents(data, texts)[0])
+    hashed = normalize(vectorize_documents(data, texts, {'backend': 'hashed', 'n_features': 2 ** 20})[0])
+    assert (hashed @ hashed.T).toarray() == pytest.approx((exact @ exact.T).toarray(), abs=1e-3)
+
+
+@pytest.mark.parametrize('backend', ['vocabulary', 'hashed'])
+def test_sublinear_counts(backend):
+    data, texts = corpus(DOCUMENTS)
+    settings = {'backend': backend, 'n_features': 2 ** 16}
+    counts, _ = vectorize_documents(data, texts, settings)
+    sublinear, _ = vectorize_documents(data, texts, {**settings, 'sublinear_tf': True})
+    counts, sublinear = counts.toarray(), sublinear.toarray()
+    assert np.array_equal(counts > 0, sublinear > 0)
+    assert sublinear[counts > 0] == pytest.approx(1 + np.log(counts[counts > 0]))
+
+
+def test_hashed_query_scores_are_the_corpus_similarities():
+    data, texts = corpus(DOCUMENTS)
+    settings = {'backend': 'hashed', 'n_features': 2 ** 16, 'sublinear_tf': True}
+    vector = normalize(vectorize_documents(data, texts, settings)[0])
+    query = vectorize_query(DOCUMENTS[2], settings)
+    assert (query @ vector.T).toarray().ravel() == pytest.approx((vector[2] @ vector.T).toarray().ravel(), abs=1e-6)
+
+
+def test_hashed_vectors_are_saved_without_vocabulary(tmp_path):
+    data, texts = corpus(DOCUMENTS)
+    settings = {'backend': 'hashed', 'n_features': 2 ** 12}
+    directory = str(tmp_path)
+    vector, vocabulary = load_document_vectors(directory, data, texts, settings)
+    assert vocabulary is None
+    assert load_vocabulary(directory, corpus_digest(data, settings)) is None
+    loaded, _ = load_document_vectors(directory, data, None, settings)
+    assert (loaded != vector).nnz == 0
+    assert corpus_digest(data, settings) != corpus_digest(data, {**settings, 'n_features': 2 ** 13})
@@ -0,0 +1,80 @@
+import re
+import random
+import numpy as np
+from fuzzy import TrigramIndex, edit_distance, fuzzy_candidates, gram_keys, variants_pattern, GRAM_SIZE
+from textindex import PositionalIndex
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, character in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (character != other)))
+        previous = current
+    return previous[-1]
+
+
+def random_word(generator, alphabet='abcde'):
+    return ''.join(generator.choice(alphabet) for _ in range(generator.randint(1, 10)))
+
+
+def test_edit_distance_matches_levenshtein():
+    generator = random.Random(0)
+    for _ in range(500):
+        a, b = random_word(generator), random_word(generator)
+        for max_distance in range(4):
+            assert edit_distance(a, b, max_distance) == min(levenshtein(a, b), max_distance + 1)
+
+
+def test_gram_keys():
+    owners, keys = gram_keys(['ab', 'é', ''])
+    # Each word has len + 2 * (GRAM_SIZE - 1) - GRAM_SIZE + 1 trigrams
+    assert np.bincount(owners).tolist() == [4, 3, 2]
+    assert len(set(keys[owners == 0])) == 4
+    assert len(gram_keys([])[1]) == 0
+
+
+def test_similar_terms_are_the_ones_within_the_distance():
+    generator = random.Random(1)
+    vocabulary = list(dict.fromkeys(random_word(generator) for _ in range(400)))
+    index = TrigramIndex(vocabulary)
+    for _ in range(100):
+        word = random_word(generator)
+        for max_distance in range(3):
+            terms = index.similar_terms(word, max_distance)
+            keys = set(gram_keys([word])[1].tolist())
+            if len(keys) - GRAM_SIZE * max_distance < 1:
+                assert terms is None
+                continue
+            expected = {term: levenshtein(word, term) for term in vocabulary if levenshtein(word, term) <= max_distance}
+            assert terms == expected, (word, max_distance)
+
+
+def test_similar_terms_of_garbled_words():
+    index = TrigramIndex(['government', 'govemment', 'gouvernment', 'department', 'governed'])
+    assert index.similar_terms('government', 2) == {'government': 0, 'govemment': 2, 'gouvernment': 1}
+    assert index.similar_terms('xyzzyxyzzy', 1) == {}
+    assert index.similar_terms('a', 1) is None
+
+
+def test_fuzzy_candidates():
+    texts = ['the govemment budget', 'the government budgets', 'a budget of the government', 'nothing here']
+    index = PositionalIndex.build(texts)
+    trigrams = TrigramIndex(index.terms)
+    rows, variants = fuzzy_candidates(index, trigrams, 'Government budget', 2)
+    assert rows.tolist() == [0, 1]
+    assert variants[0][0] == 'government' and set(variants[0]) == {'government', 'govemment'}
+    assert set(variants[1]) == {'budget', 'budgets'}
+
+
+def test_fuzzy_candidates_without_matches():
+    index = PositionalIndex.build(['some text'])
+    trigrams = TrigramIndex(index.terms)
+    assert fuzzy_candidates(index, trigrams, 'unrelated words', 1)[0].tolist() == []
+    assert fuzzy_candidates(index, trigrams, '...', 1)[0].tolist() == []
+
+
+def test_variants_pattern():
+    pattern = re.compile(variants_pattern([['gov', 'government'], ['budget']]), re.IGNORECASE)
+    assert [match.group() for match in pattern.finditer('The Government, budget and gov budgets')] == ['Government, budget']
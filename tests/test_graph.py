@@ -0,0 +1,165 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+import scipy
+from sklearn.cluster import DBSCAN
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+from cache import open_cache
+from graph import MIN_SIMILARITY, cluster_similar_documents, cluster_similarities, label_components, similar_pairs, similarity_graph, similarity_threshold, update_similarity_graph
+
+
+def random_vectors(n_documents, seed=0, n_features=30):
+    """
+    Documents made of a few shared topics plus noise, so some pairs are \
+    close and others are not.
+    """
+    generator = np.random.default_rng(seed)
+    topics = generator.random((4, n_features)) * (generator.random((4, n_features)) < 0.3)
+    weights = generator.random((n_documents, 4)) ** 4
+    noise = generator.random((n_documents, n_features)) * (generator.random((n_documents, n_features)) < 0.1)
+    return normalize(scipy.sparse.csr_matrix(weights @ topics + noise))
+
+
+def same_partition(first, second):
+    """
+    Two labelings are the same clustering when they differ only by the \
+    names of their clusters, and leave out the same documents.
+    """
+    first, second = np.asarray(first), np.asarray(second)
+    if not np.array_equal(first == -1, second == -1):
+        return False
+    pairs = set(zip(first[first != -1].tolist(), second[second != -1].tolist()))
+    return len(pairs) == len({a for a, _ in pairs}) == len({b for _, b in pairs})
+
+
+def test_threshold_is_the_euclidean_distance():
+    vector = random_vectors(20)
+    for sensitivity in [0.1, 0.5, 0.9]:
+        distances = np.sqrt(np.maximum(2 - 2 * (vector @ vector.T).toarray(), 0))
+        similarities = (vector @ vector.T).toarray()
+        close = distances <= sensitivity
+        assert np.array_equal(close, similarities >= similarity_threshold(sensitivity) - 1e-12)
+
+
+def test_similar_pairs_match_brute_force():
+    vector = random_vectors(50, seed=1)
+    dense = (vector @ vector.T).toarray()
+    first, second, similarities = similar_pairs(vector, range(50), chunk_size=7)
+    expected = {(i, j) for i in range(50) for j in range(50) if i != j and dense[i, j] >= MIN_SIMILARITY}
+    assert set(zip(first.tolist(), second.tolist())) == expected
+    assert similarities == pytest.approx(dense[first, second])
+
+
+def test_similar_pairs_of_some_rows():
+    vector = random_vectors(30, seed=2)
+    first, second, _ = similar_pairs(vector, [3, 7], 0.1)
+    assert set(first.tolist()) <= {3, 7} and 3 not in second[first == 3]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('sensitivity', [0.2, 0.5, 0.8])
+def test_clusters_are_the_dbscan_clusters(seed, sensitivity):
+    vector = random_vectors(60, seed)
+    expected = DBSCAN(eps=sensitivity, min_samples=2, metric='euclidean').fit(vector.toarray()).labels_
+    nodes = cluster_similar_documents(vector, [None] * 60, sensitivity)
+    assert same_partition(nodes, expected)
+
+
+def test_label_components():
+    first, second = np.array([0, 1, 3]), np.array([1, 2, 4])
+    nodes = label_components(6, first, second, np.array([0.9, 0.6, 0.9]), 0.8)
+    assert nodes[0] == nodes[1] != nodes[3] == nodes[4]
+    assert nodes[2] == nodes[5] == -1
+    assert (label_components(3, first[:0], second[:0], np.empty(0), 0.5) == -1).all()
+
+
+def double_loop_similarities(vector, indices):
+    """
+    The similarities of a cluster as 'get_cluster_info' computed them before \
+    'cluster_similarities', one pair of documents at a time.
+    """
+    similarities, path_similarities = [], []
+    for index1 in indices:
+        row = [cosine_similarity(vector[index1], vector[index2])[0, 0] for index2 in indices if index2 != index1]
+        similarities += row
+        path_similarities.append(sum(row) / len(row))
+    return path_similarities, sum(similarities) / len(similarities)
+
+
+@pytest.mark.parametrize('size', [2, 3, 17])
+def test_cluster_similarities_match_the_double_loop(size):
+    vector = random_vectors(40, seed=size)
+    indices = np.array(random.Random(size).sample(range(40), size))
+    path_similarities, average_similarity = cluster_similarities(vector[indices])
+    expected_paths, expected_average = double_loop_similarities(vector, indices)
+    assert path_similarities == pytest.approx(expected_paths)
+    assert average_similarity == pytest.approx(expected_average)
+    assert isinstance(average_similarity, float)
+
+
+def edges(data, first, second, similarities):
+    """
+    The edges of a graph by file names, each pair once.
+    """
+    filenames = data['filename'].tolist()
+    return {tuple(sorted((filenames[i], filenames[j]))): round(float(similarity), 9) for i, j, similarity in zip(first, second, similarities)}
+
+
+def rescan(documents):
+    """
+    The 'data' and vectors of a scan, from the (filename, hash, vector) of \
+    each document.
+    """
+    data = pd.DataFrame({'filename': [d[0] for d in documents], 'hash': [d[1] for d in documents]})
+    return data, scipy.sparse.vstack([d[2] for d in documents]).tocsr()
+
+
+def test_incremental_graph_is_the_rebuilt_graph(tmp_path):
+    vector = random_vectors(90, seed=7)
+    documents = [(f'/folder/{i}.txt', f'hash{i}', vector[i]) for i in range(50)]
+    connection = open_cache(str(tmp_path / 'incremental'))
+    update_similarity_graph(connection, *rescan(documents), 'features')
+
+    # Some documents are deleted, some changed and some added
+    documents = documents[5:]
+    for i in [0, 10, 20]:
+        filename, _, _ = documents[i]
+        documents[i] = (filename, f'changed{i}', vector[60 + i])
+    documents += [(f'/folder/{i}.txt', f'hash{i}', vector[i]) for i in range(50, 60)]
+    data, matrix = rescan(documents)
+
+    incremental = edges(data, *update_similarity_graph(connection, data, matrix, 'features'))
+    rebuilt = edges(data, *update_similarity_graph(open_cache(str(tmp_path / 'rebuilt')), data, matrix, 'features'))
+    first, second, similarities = similar_pairs(matrix, range(matrix.shape[0]))
+    assert incremental == rebuilt == edges(data, first, second, similarities)
+    assert len(incremental) > 0
+    connection.close()
+
+
+def test_graph_is_rebuilt_when_the_features_change(tmp_path):
+    vector = random_vectors(40, seed=8)
+    data = pd.DataFrame({'filename': [f'/folder/{i}.txt' for i in range(40)], 'hash': ['same'] * 40})
+    connection = open_cache(str(tmp_path))
+    update_similarity_graph(connection, data, vector, 'first')
+    other = random_vectors(40, seed=9)
+    # The hashes did not change, only the feature space did
+    result = edges(data, *update_similarity_graph(connection, data, other, 'second'))
+    assert result == edges(data, *similar_pairs(other, range(40)))
+    connection.close()
+
+
+def test_clusters_from_the_graph_are_the_direct_clusters(tmp_path):
+    vector = random_vectors(60, seed=3)
+    data = pd.DataFrame({'filename': [f'/folder/{i}.txt' for i in range(60)], 'hash': [f'hash{i}' for i in range(60)]})
+    connection = open_cache(str(tmp_path))
+    graph = similarity_graph(vector, data)
+    stored = similarity_graph(vector, data, connection, 'features')
+    for sensitivity in [0.2, 0.5, 0.8, 1.0]:
+        direct = cluster_similar_documents(vector, data, sensitivity)
+        threshold = similarity_threshold(sensitivity)
+        assert same_partition(label_components(60, *graph, threshold), direct)
+        assert same_partition(label_components(60, *stored, threshold), direct)
+        assert same_partition(cluster_similar_documents(vector, data, sensitivity, connection, 'features'), direct)
+    connection.close()
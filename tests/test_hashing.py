@@ -0,0 +1,95 @@
+import os
+import pytest
+from hashing import DuplicateIndex, PARTIAL_HASH_BYTES, hash_file
+
+
+def add_all(index, paths):
+    records = [{'filename': path} for path in paths]
+    for record in records:
+        index.add(record, os.path.getsize(record['filename']))
+    index.finalize()
+    return records
+
+
+def test_unique_sizes_are_not_read(write):
+    paths = [write('a', b'a'), write('b', b'bb')]
+    records = add_all(DuplicateIndex(), paths)
+    assert [record['dedup_key'] for record in records] == ['size:1', 'size:2']
+    assert all('hash' not in record and 'full_hash' not in record for record in records)
+
+
+def test_same_size_different_content(write):
+    paths = [write('a', b'ab'), write('b', b'ba')]
+    records = add_all(DuplicateIndex(), paths)
+    assert records[0]['dedup_key'] != records[1]['dedup_key']
+    # Small files skip the partial hash and are hashed in full
+    assert [record['hash'] for record in records] == [hash_file(path) for path in paths]
+
+
+def test_identical_files_are_reported(write):
+    paths = [write(name, b'same contents') for name in 'abc']
+    index = DuplicateIndex()
+    found = []
+    for path in paths:
+        duplicates = index.add({'filename': path}, os.path.getsize(path))
+        found.append(None if duplicates is None else [record['filename'] for record in duplicates])
+    index.finalize()
+    assert found == [None, paths[:2], paths]
+    assert len(index.by_hash) == 1
+
+
+def test_large_files_are_told_apart_by_partial_hash(write):
+    size = 3 * PARTIAL_HASH_BYTES
+    first = write('a', b'a' * size)
+    second = write('b', b'b' + b'a' * (size - 1))
+    third = write('c', b'a' * (size - 1) + b'c')
+    # Same start and end as the first file, only the middle differs
+    fourth = write('d', b'a' * PARTIAL_HASH_BYTES + b'd' + b'a' * (size - PARTIAL_HASH_BYTES - 1))
+    records = add_all(DuplicateIndex(), [first, second, third, fourth])
+    assert records[1]['dedup_key'].startswith('partial:') and 'hash' not in records[1]
+    assert records[2]['dedup_key'].startswith('partial:') and 'hash' not in records[2]
+    assert records[0]['hash'] == hash_file(first) and records[3]['hash'] == hash_file(fourth)
+    assert len({record['dedup_key'] for record in records}) == 4
+
+
+def test_known_hashes_are_not_read_again(write):
+    paths = [write('a', b'xy'), write('b', b'xy')]
+    records = [{'filename': paths[0], 'full_hash': 'cached'}, {'filename': paths[1], 'full_hash': 'cached'}]
+    index = DuplicateIndex()
+    for record in records:
+        index.add(record, 2)
+    index.finalize()
+    assert [record['dedup_key'] for record in records] == ['cached', 'cached']
+
+
+def test_hashed_records_skip_the_tiers():
+    index = DuplicateIndex()
+    assert index.add({'filename': 'missing-a', 'hash': 'h'}, 10) is None
+    assert len(index.add({'filename': 'missing-b', 'hash': 'h'}, 10)) == 2
+    assert not index.by_size and not index.failed
+
+
+def test_deleted_files_are_reported_as_failed(write):
+    first = write('a', b'12')
+    second = write('b', b'34')
+    index = DuplicateIndex()
+    index.add({'filename': first}, 2)
+    os.remove(first)
+    # Adding a second file of the same size reads the first one
+    index.add({'filename': second}, 2)
+    index.finalize()
+    assert [(record['filename'], type(error)) for record, error in index.failed] == [(first, FileNotFoundError)]
+    assert index.by_hash[hash_file(second)][0]['dedup_key'] == hash_file(second)
+
+
+@pytest.mark.parametrize('size', [10, 3 * PARTIAL_HASH_BYTES])
+def test_every_readable_file_gets_a_key(write, size):
+    paths = [write(name, bytes([i]) * size) for i, name in enumerate('abc')]
+    os.remove(paths[1])
+    index = DuplicateIndex()
+    records = [{'filename': path} for path in paths]
+    for record in records:
+        index.add(record, size)
+    index.finalize()
+    assert 'dedup_key' in records[0] and 'dedup_key' in records[2]
+    assert 'dedup_key' not in records[1]
@@ -0,0 +1,50 @@
+import random
+import numpy as np
+from minhash import NUM_PERM, choose_bands, cluster_near_duplicates, get_signature, near_duplicate_pairs, signature_matrix
+
+
+def text(words: int, seed: int):
+    rng = random.Random(seed)
+    return ' '.join(f'w{rng.randrange(100000)}' for _ in range(words))
+
+
+def test_signature_round_trip():
+    matrix, valid = signature_matrix([get_signature('a b c d e f'), None, get_signature('')])
+    assert matrix.shape == (3, NUM_PERM)
+    assert valid.tolist() == [True, False, False]
+    assert not matrix[1].any()
+
+
+def test_same_shingles_same_signature():
+    assert get_signature('One two three four five six') == get_signature('one, TWO three four five six')
+
+
+def test_chosen_bands_reach_the_recall():
+    for threshold in [0.3, 0.5, 0.8, 0.95]:
+        bands, rows = choose_bands(threshold)
+        assert bands * rows <= NUM_PERM
+        assert 1 - (1 - threshold ** rows) ** bands >= 0.95
+        # One more row per band would miss documents at the threshold
+        more = NUM_PERM // (rows + 1)
+        assert rows == NUM_PERM or 1 - (1 - threshold ** (rows + 1)) ** more < 0.95
+
+
+def test_banding_finds_the_pairs_of_a_full_scan():
+    base = text(400, 0).split()
+    documents = [' '.join(base[:400 - 20 * i] + text(20 * i, i).split()) for i in range(8)] + [text(400, 100 + i) for i in range(8)]
+    matrix, valid = signature_matrix(get_signature(document) for document in documents)
+    threshold = 0.5
+    first, second, similarities = near_duplicate_pairs(matrix, valid, threshold)
+    assert (first < second).all() and (similarities >= threshold).all()
+    estimated = (matrix[:, None, :] == matrix[None, :, :]).mean(axis=2)
+    expected = {(a, b) for a in range(len(documents)) for b in range(a + 1, len(documents)) if estimated[a, b] >= 0.7}
+    assert expected <= set(zip(first.tolist(), second.tolist()))
+    np.testing.assert_allclose(similarities, estimated[first, second])
+
+
+def test_clusters_of_near_duplicates():
+    original = text(300, 1)
+    edited = original.replace(original.split()[150], 'changed')
+    nodes = cluster_near_duplicates([get_signature(original), get_signature(text(300, 2)), get_signature(edited), None], 0.5)
+    assert nodes[0] == nodes[2] != -1
+    assert nodes[1] == -1 and nodes[3] == -1
@@ -0,0 +1,97 @@
+import re
+import random
+import pytest
+import multisearch
+from multisearch import TermMatcher, fold_case, is_boundary
+
+
+@pytest.fixture(params=['regex', 'automaton'])
+def search_method(request, monkeypatch):
+    if request.param == 'automaton':
+        monkeypatch.setattr(multisearch, 'MAX_REGEX_TERMS', 0)
+        monkeypatch.setattr(multisearch, 'MAX_REGEX_TERMS_IGNORECASE', 0)
+    return request.param
+
+
+def regex_matches(terms, text, case_sensitive, exact_word):
+    matches = {}
+    for number, term in enumerate(terms):
+        pattern = re.escape(term)
+        if exact_word:
+            pattern = r'\b' + pattern + r'\b'
+        starts = [match.start() for match in re.finditer(pattern, text, 0 if case_sensitive else re.IGNORECASE)]
+        if starts:
+            matches[number] = starts
+    return matches
+
+
+def test_matches_are_the_ones_of_regular_expressions(search_method):
+    generator = random.Random(0)
+    alphabet = 'abAB _.'
+    for _ in range(300):
+        terms = list(dict.fromkeys(''.join(generator.choice('abAB ') for _ in range(generator.randint(1, 4))) for _ in range(5)))
+        text = ''.join(generator.choice(alphabet) for _ in range(generator.randint(0, 60)))
+        for case_sensitive in [True, False]:
+            for exact_word in [True, False]:
+                matcher = TermMatcher(terms, case_sensitive, exact_word)
+                assert (matcher.pattern is not None) == (search_method == 'regex')
+                assert matcher.find(text) == regex_matches(matcher.terms, text, case_sensitive, exact_word), (terms, text)
+
+
+def test_terms_starting_with_other_terms(search_method):
+    terms = ['new', 'new york', 'york', 'new york city', 'yorkshire']
+    text = 'new york, new yorkshire and new york city'
+    for case_sensitive in [True, False]:
+        for exact_word in [True, False]:
+            matcher = TermMatcher(terms, case_sensitive, exact_word)
+            assert matcher.find(text) == regex_matches(terms, text, case_sensitive, exact_word)
+
+
+def test_case_is_ignored_like_regular_expressions(search_method):
+    # Characters that 're.IGNORECASE' matches although their lowercase forms differ
+    terms = ['kiss', 'σοφος', 'µ', 'ϐeta']
+    text = 'KIſS kıss \u212aISS ΣΟΦΟΣ σοφοσ ςοφος μ Μ βeta'
+    matcher = TermMatcher(terms, case_sensitive=False)
+    assert matcher.find(text) == regex_matches(terms, text, False, True)
+    assert sorted(matcher.find(text)) == [0, 1, 2, 3]
+
+
+def test_case_folding_matches_regular_expressions():
+    generator = random.Random(0)
+    characters = [chr(code) for code in generator.sample(range(0x3000), 3000)] + ['ſ', 'ı', 'ς', 'ϑ', 'ᲀ', 'ﬆ']
+    for first in characters:
+        folded = fold_case(first)
+        for second in characters[:100] + [first.upper(), first.lower()[0]]:
+            same = re.fullmatch(re.escape(first), second, re.IGNORECASE) is not None
+            assert (folded == fold_case(second)) == same, (first, second)
+
+
+def test_terms_that_are_parts_of_other_terms(search_method):
+    matcher = TermMatcher(['he', 'she', 'his', 'hers'], exact_word=False)
+    assert matcher.find('ushers') == {0: [2], 1: [1], 3: [2]}
+
+
+def test_occurrences_of_a_term_do_not_overlap(search_method):
+    assert TermMatcher(['aa'], exact_word=False).find('aaaaa') == {0: [0, 2]}
+
+
+def test_whole_words(search_method):
+    matcher = TermMatcher(['cat', 'the cat'])
+    assert matcher.find('The cat concatenates the cat_') == {0: [4]}
+    assert TermMatcher(['cat', 'the cat'], case_sensitive=False).find('The cat') == {0: [4], 1: [0]}
+
+
+def test_empty_and_repeated_terms_are_ignored():
+    matcher = TermMatcher(['', 'term', 'term'])
+    assert matcher.terms == ['term']
+    assert TermMatcher([]).find('anything') == {}
+
+
+def test_case_folding_keeps_offsets(search_method):
+    text = 'İstanbul and ISTANBUL'
+    assert len(fold_case(text)) == len(text)
+    assert TermMatcher(['istanbul'], case_sensitive=False).find(text) == {0: [0, 13]}
+
+
+def test_is_boundary():
+    assert [is_boundary('ab c', position) for position in range(5)] == [True, False, True, True, True]
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import load_document_vectors
+from neighbors import NeighborIndex
+from textstore import TextStore
+
+DOCUMENTS = [
+    'the quick brown fox jumps over the lazy dog',
+    'the quick brown fox sleeps under the old tree',
+    'a report on the annual budget of the city',
+    'the annual budget of the city was approved',
+    'nothing in common here',
+]
+
+
+def index_of(directory, settings=None):
+    texts = TextStore()
+    data = pd.DataFrame({
+        'filename': [f'/folder/{i}.txt' for i in range(len(DOCUMENTS))],
+        'hash': [f'hash{i}' for i in range(len(DOCUMENTS))],
+        'doc_id': [texts.add(text) for text in DOCUMENTS]})
+    texts.finalize()
+    vector, vocabulary = load_document_vectors(directory, data, texts, settings)
+    return NeighborIndex(vector, data['filename'], settings, vocabulary), vector
+
+
+@pytest.mark.parametrize('settings', [None, {'backend': 'hashed', 'n_features': 2 ** 12}])
+def test_scores_are_the_corpus_similarities(tmp_path, settings):
+    index, vector = index_of(str(tmp_path), settings)
+    for row, text in enumerate(DOCUMENTS):
+        assert index.scores(text) == pytest.approx(np.minimum((vector[row] @ vector.T).toarray().ravel(), 1), abs=1e-6)
+
+
+def test_query_from_the_saved_vocabulary(tmp_path):
+    index_of(str(tmp_path))
+    # The second index loads the vectors and vocabulary saved by the first
+    index, _ = index_of(str(tmp_path))
+    neighbors = index.query('the annual budget of the city', k=2)
+    assert neighbors['filename'].tolist() == ['/folder/3.txt', '/folder/2.txt']
+    assert neighbors['similarity'].is_monotonic_decreasing
+
+
+def test_query_excludes_and_drops_unrelated_documents(tmp_path):
+    index, _ = index_of(str(tmp_path))
+    neighbors = index.query(DOCUMENTS[0], k=10, exclude='/folder/0.txt')
+    assert neighbors['filename'].iloc[0] == '/folder/1.txt'
+    assert '/folder/0.txt' not in neighbors['filename'].tolist()
+    assert '/folder/4.txt' not in neighbors['filename'].tolist()
+    assert index.query('zebra', k=3).empty
+
+
+def test_pairs_match_the_scores(tmp_path):
+    index, _ = index_of(str(tmp_path))
+    queries = ['the quick brown fox', 'the annual budget', 'zebra']
+    first, second, similarities = index.pairs(queries, 0.2, chunk_size=2)
+    expected = {(i, j): score for i, text in enumerate(queries) for j, score in enumerate(index.scores(text)) if score >= 0.2}
+    assert dict(zip(zip(first.tolist(), second.tolist()), similarities)) == pytest.approx(expected)
@@ -0,0 +1,85 @@
+import random
+import numpy as np
+from passages import PassageIndex, get_fingerprints, locate_fingerprints, merge_spans, shared_passages, winnow, SHINGLE_SIZE, WINDOW_SIZE
+
+WORDS = [f'word{i}' for i in range(500)]
+
+
+def text(seed, length):
+    generator = random.Random(seed)
+    return ' '.join(generator.choice(WORDS) for _ in range(length))
+
+
+def test_winnow_keeps_the_smallest_hash_of_every_window():
+    hashes = np.array(random.Random(0).sample(range(10**6), 100), dtype=np.uint64)
+    positions = winnow(hashes)
+    for start in range(len(hashes) - WINDOW_SIZE + 1):
+        window = hashes[start:start + WINDOW_SIZE]
+        assert any(start <= position < start + WINDOW_SIZE and hashes[position] == window.min() for position in positions)
+
+
+def test_located_fingerprints_are_the_indexed_ones():
+    document = text(1, 200)
+    hashes, starts, ends = locate_fingerprints(document)
+    assert np.array_equal(hashes, get_fingerprints(document))
+    assert (starts < ends).all()
+
+
+def test_shared_passages_are_always_fingerprinted():
+    # Any passage of SHINGLE_SIZE + WINDOW_SIZE - 1 words holds a full window
+    passage = text(2, SHINGLE_SIZE + WINDOW_SIZE - 1)
+    first, second = text(3, 100) + ' ' + passage, passage + ' ' + text(4, 100)
+    assert np.isin(get_fingerprints(passage), get_fingerprints(first)).any()
+    assert np.intersect1d(get_fingerprints(first), get_fingerprints(second)).size > 0
+
+
+def test_pasted_document_is_fully_contained():
+    short, other = text(5, 60), text(6, 300)
+    long = text(7, 200) + '\n' + short + '\n' + text(8, 200)
+    overlaps = PassageIndex([long, short, other]).overlaps(0.5)
+    assert len(overlaps.index) == 1
+    overlap = overlaps.iloc[0]
+    assert (overlap.container, overlap.contained) == (0, 1)
+    assert overlap.containment == 1.0
+
+
+def test_overlaps_are_sorted_by_containment():
+    base = text(9, 200)
+    half = base[:len(base) // 2] + ' ' + text(10, 100)
+    overlaps = PassageIndex([base, half, base]).overlaps(0.1)
+    assert overlaps['containment'].is_monotonic_decreasing
+    assert not ((overlaps['container'] == overlaps['contained']).any())
+    identical = overlaps[(overlaps['container'] == 0) & (overlaps['contained'] == 2)]
+    assert identical['containment'].tolist() == [1.0]
+
+
+def test_boilerplate_is_ignored():
+    footer = text(11, 40)
+    documents = [text(12 + i, 100) + ' ' + footer for i in range(4)]
+    assert not PassageIndex(documents).overlaps(0.1).empty
+    assert PassageIndex(documents, max_document_frequency=3).overlaps(0.1).empty
+
+
+def test_empty_documents():
+    index = PassageIndex(['', 'short', text(13, 50)])
+    assert len(index) == 3
+    assert index.overlaps(0.5).empty
+    assert len(PassageIndex([])) == 0
+
+
+def test_shared_passages_offsets():
+    passage = text(14, 40)
+    container = text(15, 100) + ' ' + passage + ' ' + text(16, 100)
+    contained = passage + ' ' + text(17, 50)
+    container_passages, contained_passages = shared_passages(container, contained)
+    assert len(container_passages) == len(contained_passages) == 1
+    (start, end), = container_passages
+    found = container[start:end]
+    assert found in passage and len(found.split()) >= len(passage.split()) - 2 * SHINGLE_SIZE
+    (start, end), = contained_passages
+    assert contained[start:end] == found
+
+
+def test_merge_spans():
+    assert merge_spans(np.array([10, 0, 3, 20]), np.array([15, 5, 8, 25])) == [(0, 8), (10, 15), (20, 25)]
+    assert merge_spans(np.empty(0, np.int64), np.empty(0, np.int64)) == []
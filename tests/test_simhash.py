@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from simhash import FINGERPRINT_BITS, MAX_DISTANCE, MIN_KEY_BITS, SimHashIndex, bit_count, cluster_by_simhash, get_simhash, table_masks
+
+
+@pytest.mark.parametrize('max_distance', range(MAX_DISTANCE + 1))
+def test_table_keys_stay_wide(max_distance):
+    masks = table_masks(max_distance)
+    assert min(bin(mask).count('1') for mask in masks) >= min(MIN_KEY_BITS, FINGERPRINT_BITS)
+    # Flipping any 'max_distance' bits leaves the key of at least one table unchanged
+    rng = np.random.default_rng(max_distance)
+    for _ in range(200):
+        flipped = sum(1 << int(bit) for bit in rng.choice(FINGERPRINT_BITS, max_distance, replace=False))
+        assert any(not mask & flipped for mask in masks)
+
+
+def test_distance_is_capped():
+    with pytest.raises(ValueError):
+        table_masks(MAX_DISTANCE + 1)
+
+
+def test_bit_count():
+    values = np.array([0, 1, 0xFF, 2**64 - 1, 0x8000000000000001], dtype=np.uint64)
+    assert bit_count(values).tolist() == [0, 1, 8, 64, 2]
+
+
+@pytest.mark.parametrize('max_distance', [0, 3, 6, 8])
+def test_index_finds_the_pairs_of_a_full_scan(max_distance):
+    rng = np.random.default_rng(max_distance)
+    base = rng.integers(0, 2**63, 300, dtype=np.uint64)
+    near = base.copy()
+    for i in range(len(near)):
+        for bit in rng.choice(63, rng.integers(0, max_distance + 3), replace=False):
+            near[i] ^= np.uint64(1) << np.uint64(bit)
+    fingerprints = np.concatenate([base, near, base[:10]])
+    first, second, distances = SimHashIndex(fingerprints, max_distance).pairs()
+    all_distances = bit_count((fingerprints[:, None] ^ fingerprints[None, :]).ravel()).reshape(len(fingerprints), -1)
+    expected = set(zip(*(rows.tolist() for rows in np.nonzero(np.triu(all_distances <= max_distance, 1)))))
+    assert set(zip(first.tolist(), second.tolist())) == expected
+    assert len(first) == len(expected)
+    assert (distances == all_distances[first, second]).all()
+
+
+def test_near_copies_get_close_fingerprints():
+    text = ' '.join(f'word{i % 97} item{i}' for i in range(400))
+    edited = text.replace('item200', 'changed', 1)
+    distance = (int(get_simhash(text), 16) ^ int(get_simhash(edited), 16)).bit_count()
+    assert distance <= 6
+    assert get_simhash('') is None
+
+
+def test_clusters_skip_missing_fingerprints():
+    fingerprints = ['00000000000000ff', None, '00000000000000fe', 'ffffffffffffffff']
+    nodes = cluster_by_simhash(fingerprints, 2)
+    assert nodes[0] == nodes[2] != -1
+    assert nodes[1] == -1 and nodes[3] == -1
@@ -0,0 +1,81 @@
+import random
+from strings import SuffixAutomaton, common_passages, longest_common_substring
+
+
+def substrings(s):
+    return {s[i:j] for i in range(len(s)) for j in range(i + 1, len(s) + 1)}
+
+
+def brute_force_lcs_length(s1, s2):
+    shared = substrings(s1) & substrings(s2)
+    return max(map(len, shared), default=0)
+
+
+def test_automaton_accepts_exactly_the_substrings():
+    text = 'abcbcabbca'
+    automaton = SuffixAutomaton(text)
+    accepted = set()
+
+    def walk(state, prefix):
+        for item, following in automaton.next[state].items():
+            accepted.add(prefix + item)
+            walk(following, prefix + item)
+    walk(0, '')
+    assert accepted == substrings(text)
+    assert len(automaton) <= 2 * len(text)
+
+
+def test_longest_common_substring_matches_brute_force():
+    generator = random.Random(0)
+    for _ in range(200):
+        s1 = ''.join(generator.choice('abc') for _ in range(generator.randint(1, 15)))
+        s2 = ''.join(generator.choice('abc') for _ in range(generator.randint(1, 15)))
+        found = longest_common_substring(s1, s2)
+        assert found in s1 and found in s2
+        assert len(found) == brute_force_lcs_length(s1, s2)
+
+
+def test_longest_common_substring_examples():
+    assert longest_common_substring('the quick brown fox', 'a quick brown dog') == ' quick brown '
+    assert longest_common_substring('abc', 'xyz') == ''
+    assert longest_common_substring(['a', 'b', 'c'], ['b', 'c', 'd']) == ['b', 'c']
+
+
+def test_match_lengths_of_the_whole_string():
+    automaton = SuffixAutomaton('banana')
+    lengths = automaton.match_lengths('banana')
+    assert lengths == automaton.length
+
+
+def test_common_passages_are_shared_by_every_document():
+    passage = 'the committee approved the annual budget for the next fiscal year'
+    texts = [
+        'Minutes. ' + passage + '. Other business was postponed.',
+        'Summary: ' + passage.upper() + ', as expected.',
+        'In the end, ' + passage + ' after a long debate about the roads.',
+    ]
+    base, passages = common_passages(texts)
+    assert base == 1
+    assert [texts[base][start:end] for start, end in passages] == [passage.upper()]
+
+
+def test_common_passages_need_min_words():
+    texts = ['one two three four five six seven', 'one two three four five six seven eight']
+    assert common_passages(texts)[1] == []
+    assert common_passages(texts, min_words=7)[1] == [(0, len(texts[0]))]
+
+
+def test_common_passages_do_not_overlap():
+    words = [f'w{i}' for i in range(60)]
+    first = ' '.join(words[:20] + ['x'] + words[20:40] + ['y'] + words[40:])
+    second = ' '.join(words[40:] + ['z'] + words[:20] + ['z'] + words[20:40])
+    base, passages = common_passages([first, second], min_words=8, max_passages=2)
+    assert len(passages) == 2
+    assert all(end - start > 0 for start, end in passages)
+    (s1, e1), (s2, e2) = sorted(passages)
+    assert e1 <= s2
+
+
+def test_common_passages_of_nothing():
+    assert common_passages([]) == (0, [])
+    assert common_passages(['', 'some words']) == (0, [])
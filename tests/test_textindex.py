@@ -0,0 +1,110 @@
+import os
+import re
+import random
+import numpy as np
+import pandas as pd
+from cache import CACHE_DIR
+from textindex import PositionalIndex, load_search_index, tokenize
+from textstore import TextStore
+
+DOCUMENTS = [
+    'The quick brown fox jumps over the lazy dog.',
+    'A quick fox, then a brown dog.',
+    'Brown fox? Quick! The quick brown fox again.',
+    '',
+    'the dog sleeps',
+]
+
+
+def brute_force(query, exact_word=True):
+    pattern = re.escape(query)
+    if exact_word:
+        pattern = r'\b' + pattern + r'\b'
+    return [row for row, text in enumerate(DOCUMENTS) if re.search(pattern, text, re.IGNORECASE)]
+
+
+def test_postings_are_sorted_by_document_and_position():
+    index = PositionalIndex.build(DOCUMENTS)
+    documents, positions = index.postings('fox')
+    assert documents.tolist() == [0, 1, 2, 2]
+    assert positions.tolist() == [3, 2, 1, 6]
+    assert [len(part) for part in index.postings('missing')] == [0, 0]
+    assert len(index) == len(DOCUMENTS)
+
+
+def test_phrase_needs_the_words_in_order():
+    index = PositionalIndex.build(DOCUMENTS)
+    assert index.phrase([(0, 'quick'), (1, 'brown'), (2, 'fox')]).tolist() == [0, 2]
+    assert index.phrase([(0, 'brown'), (1, 'fox')]).tolist() == [0, 2]
+    assert index.phrase([(0, 'fox'), (1, 'brown')]).tolist() == []
+    # Offsets can skip words
+    assert index.phrase([(0, 'a'), (4, 'a')]).tolist() == [1]
+    assert index.phrase([(0, 'quick'), (2, 'fox')]).tolist() == [0, 2]
+    assert index.phrase([]).tolist() == list(range(len(DOCUMENTS)))
+
+
+def test_phrase_with_alternatives():
+    index = PositionalIndex.build(DOCUMENTS)
+    assert index.phrase([(0, ['lazy', 'brown']), (1, 'dog')]).tolist() == [0, 1]
+    assert index.phrase([(0, ['missing', 'the']), (1, 'dog')]).tolist() == [4]
+
+
+def test_candidates_match_a_scan_of_the_documents():
+    index = PositionalIndex.build(DOCUMENTS)
+    for query in ['quick brown fox', 'The quick', 'brown dog', 'dog', 'fox again', 'fox jumps over']:
+        assert index.candidates(query).tolist() == brute_force(query)
+
+
+def test_candidates_of_partial_words():
+    index = PositionalIndex.build(DOCUMENTS)
+    # 'uick' and 'fo' can be part of longer words, only 'brown' is looked up
+    rows = index.candidates('uick brown fo', exact_word=False)
+    assert rows.tolist() == [0, 1, 2]
+    assert set(brute_force('uick brown fo', False)) <= set(rows.tolist())
+    assert index.candidates('row', exact_word=False) is None
+    assert index.candidates('...') is None
+
+
+def test_random_phrases_match_brute_force():
+    generator = random.Random(0)
+    words = ['a', 'b', 'c', 'd']
+    texts = [' '.join(generator.choice(words) for _ in range(generator.randint(0, 30))) for _ in range(50)]
+    index = PositionalIndex.build(texts)
+    for _ in range(100):
+        query = [generator.choice(words) for _ in range(generator.randint(1, 4))]
+        expected = [row for row, text in enumerate(texts) if ' ' + ' '.join(query) + ' ' in ' ' + text + ' ']
+        assert index.phrase(list(enumerate(query))).tolist() == expected
+
+
+def test_save_and_load(tmp_path):
+    index = PositionalIndex.build(DOCUMENTS)
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    loaded = PositionalIndex.load(path)
+    assert loaded.terms == index.terms and len(loaded) == len(index)
+    for term in index.terms:
+        assert all(np.array_equal(a, b) for a, b in zip(loaded.postings(term), index.postings(term)))
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('partial-')]
+
+
+def test_save_and_load_an_empty_index(tmp_path):
+    path = str(tmp_path / 'index.npz')
+    PositionalIndex.build(['', '']).save(path)
+    loaded = PositionalIndex.load(path)
+    assert loaded.terms == [] and len(loaded) == 2
+
+
+def test_search_index_is_cached(tmp_path):
+    texts = TextStore()
+    data = pd.DataFrame({'doc_id': [texts.add(text) for text in DOCUMENTS]})
+    texts.finalize()
+    directory = str(tmp_path)
+    index = load_search_index(directory, data, texts, 'digest')
+    assert os.path.exists(os.path.join(directory, CACHE_DIR, 'search-digest.npz'))
+    cached = load_search_index(directory, data, texts, 'digest')
+    assert cached.terms == index.terms
+    texts.close()
+
+
+def test_tokenize():
+    assert tokenize("Don't STOP-me now") == ['don', 't', 'stop', 'me', 'now']
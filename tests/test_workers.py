@@ -0,0 +1,77 @@
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from workers import run_in_pools
+
+
+def work(name: str, group: str='a'):
+    if name == 'raise':
+        raise ValueError(name)
+    if name.startswith('sleep'):
+        time.sleep(30)
+    if name == 'crash':
+        os._exit(1)
+    return name.upper()
+
+
+def run(names, workers, timeout=None):
+    results = run_in_pools(work, [(name,) for name in names], workers, lambda name, group='a': group, timeout)
+    return {job[0]: (result, error) for job, result, error in results}
+
+
+def test_every_job_is_run_once():
+    names = [f'job{i}' for i in range(20)]
+    results = run(names, {'default': 2})
+    assert results == {name: (name.upper(), None) for name in names}
+
+
+def test_groups_without_workers_run_in_process():
+    results = run_in_pools(work, [('x', 'a'), ('y', 'b')], {'a': 0, 'b': 1}, lambda name, group: group)
+    assert sorted((job[0], result) for job, result, _ in results) == [('x', 'X'), ('y', 'Y')]
+
+
+def test_errors_are_reported_per_job():
+    results = run(['one', 'raise', 'two'], {'default': 2})
+    assert results['one'] == ('ONE', None) and results['two'] == ('TWO', None)
+    assert results['raise'][0] is None and isinstance(results['raise'][1], ValueError)
+
+
+def test_crashing_job_is_isolated():
+    names = ['one', 'crash', 'two', 'three']
+    results = run(names, {'default': 2})
+    assert isinstance(results['crash'][1], BrokenProcessPool)
+    assert all(results[name] == (name.upper(), None) for name in names if name != 'crash')
+
+
+def test_jobs_running_out_of_time_are_stopped():
+    start = time.monotonic()
+    results = run(['one', 'sleep', 'two', 'three'], {'default': 2}, timeout=2)
+    assert time.monotonic() - start < 20
+    assert isinstance(results['sleep'][1], TimeoutError)
+    assert all(results[name] == (name.upper(), None) for name in ['one', 'two', 'three'])
+
+
+def logged_work(log: str, name: str, seconds: float):
+    with open(log, 'a') as f:
+        f.write(name + '\n')
+    time.sleep(seconds)
+    return name
+
+
+def test_timeouts_do_not_restart_other_jobs(tmp_path):
+    log = str(tmp_path / 'log')
+    jobs = [(log, 'stuck', 30)] + [(log, f'job{i}', 0.3) for i in range(12)]
+    results = {job[1]: (result, error) for job, result, error in run_in_pools(logged_work, jobs, {'default': 2}, lambda *job: 'a', timeout=2)}
+    assert isinstance(results['stuck'][1], TimeoutError)
+    assert all(results[f'job{i}'] == (f'job{i}', None) for i in range(12))
+    with open(log) as f:
+        started = f.read().split()
+    # Each job started once: the jobs of the other worker were never killed
+    assert sorted(started) == sorted(job[1] for job in jobs)
+
+
+def test_two_jobs_running_out_of_time_at_once():
+    start = time.monotonic()
+    results = run(['sleep', 'one', 'sleep2', 'two'], {'default': 2}, timeout=2)
+    assert time.monotonic() - start < 15
+    assert results['one'] == ('ONE', None) and results['two'] == ('TWO', None)